@@ -0,0 +1,66 @@
+import json
+from typing import Any, Dict, Union
+
+from .config import settings
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib codec is used instead
+    orjson = None
+
+
+class JsonCodec:
+    """Standard library json"""
+
+    name = "json"
+
+    def dumps(self, value: Any) -> str:
+        return json.dumps(value, default=str)
+
+    def dumps_bytes(self, value: Any) -> bytes:
+        return self.dumps(value).encode()
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    """orjson: same JSON text format, several times faster (compact separators)"""
+
+    name = "orjson"
+
+    def dumps(self, value: Any) -> str:
+        return self.dumps_bytes(value).decode()
+
+    def dumps_bytes(self, value: Any) -> bytes:
+        try:
+            return orjson.dumps(value, default=str)
+        except orjson.JSONEncodeError:
+            # e.g. lone surrogates in program output, which json escapes
+            return super().dumps_bytes(value)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+
+CODECS: Dict[str, type] = {"json": JsonCodec, "orjson": OrjsonCodec}
+
+
+def select_codec(name: str) -> JsonCodec:
+    """Codec for Redis values, pub/sub payloads, upstream bodies and API responses.
+
+    Both codecs produce interchangeable JSON text, so switching never strands stored
+    records. Binary formats such as msgpack are not offered: the Redis client
+    decodes responses as text and the upstream API only accepts JSON (see
+    benchmarks/codec_benchmark.py for how they compare).
+    """
+    if name not in CODECS:
+        raise ValueError(f"Unknown serialization codec: '{name}'. Available: {', '.join(CODECS)}")
+    if name == "orjson" and orjson is None:
+        print("orjson is not installed, falling back to the json codec")
+        name = "json"
+    return CODECS[name]()
+
+
+# Global codec instance
+codec = select_codec(settings.serialization_codec)
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import Optional
+from typing import Optional, Dict, List
 
 
 class Settings(BaseSettings):
@@ -21,6 +21,135 @@ class Settings(BaseSettings):
     
     # Execution tracking TTL (seconds)
     execution_ttl: int = 3600  # 1 hour
+    
+    # Upstream HTTP client pool (shared across all submissions)
+    upstream_max_connections: int = 100
+    upstream_max_keepalive_connections: int = 20
+    upstream_keepalive_expiry: float = 30.0  # seconds
+    upstream_http2: bool = False
+    upstream_connect_timeout: float = 5.0
+    upstream_read_timeout: float = 30.0
+    upstream_write_timeout: float = 10.0
+    upstream_pool_timeout: float = 5.0
+    
+    # Upstream retries (connect errors and 503 only; 502/504 may hide an accepted submission) with jittered exponential backoff
+    upstream_max_retries: int = 2
+    upstream_retry_base_delay: float = 0.2  # seconds
+    upstream_retry_max_delay: float = 2.0  # seconds
+    
+    # Upstream circuit breaker (state shared through Redis)
+    circuit_failure_threshold: int = 5  # failures within the window that open the circuit
+    circuit_failure_window: int = 30  # seconds
+    circuit_slow_call_threshold: float = 10.0  # seconds; slower successful calls count as failures
+    circuit_open_seconds: int = 30  # fail fast this long before probing again
+    
+    # /execute-immediate waits on a pushed completion signal; this bounds the fallback poll
+    completion_fallback_poll_interval: float = 5.0  # seconds
+    
+    # Content-addressed result cache for identical (code, compiler, input) submissions (opt-in)
+    result_cache_enabled: bool = False
+    result_cache_ttl: int = 86400  # 1 day
+    result_cache_max_entries: int = 10000
+    
+    # Single-flight: identical concurrent submissions share one upstream execution
+    single_flight_enabled: bool = True
+    single_flight_ttl: int = 120  # seconds an in-flight leader lock is held at most
+    
+    # /execute job queue (Redis Stream + consumer group worker pool)
+    job_queue_enabled: bool = True
+    job_queue_workers: int = 8
+    job_queue_block_ms: int = 5000
+    job_queue_claim_idle_ms: int = 60000  # reclaim entries idle this long (worker crashed; running jobs are re-claimed by their worker)
+    job_queue_maxlen: int = 100000
+    
+    # Webhook ingestion: acknowledge at once, apply from a Redis Stream in batches
+    webhook_queue_enabled: bool = True
+    webhook_queue_workers: int = 4
+    webhook_queue_batch_size: int = 50
+    webhook_queue_block_ms: int = 1000
+    webhook_queue_claim_idle_ms: int = 30000  # reclaim callbacks idle this long (failed batch or crashed worker)
+    webhook_queue_maxlen: int = 100000
+    
+    # Admission control for /execute and /execute-immediate (token buckets + concurrency cap).
+    # Off by default: the routes still attribute every request to one stub user, so the
+    # per-user limits would cap the whole service (enable once requests carry real identities)
+    rate_limit_enabled: bool = False
+    user_rate_limit_per_minute: float = 30
+    user_rate_limit_burst: int = 10
+    global_rate_limit_per_minute: float = 1200
+    global_rate_limit_burst: int = 200
+    max_concurrent_executions_per_user: int = 5
+    inflight_slot_ttl: int = 300  # seconds before an unfinished execution stops counting
+    
+    # Execution backends: "http" (third-party API) or "local" (subprocess sandbox)
+    default_execution_backend: str = "http"
+    execution_backend_routes: Dict[str, str] = {}  # language -> backend, e.g. {"python": "local"}
+    
+    # Local sandbox limits
+    local_sandbox_cpu_seconds: int = 5
+    local_sandbox_wall_seconds: float = 10.0
+    local_sandbox_memory_mb: int = 256
+    local_sandbox_output_limit: int = 65536  # bytes per stream; also caps files written
+    local_sandbox_max_processes: int = 64  # RLIMIT_NPROC for the sandbox uid (shared by concurrent runs)
+    local_sandbox_compile_seconds: int = 30
+    local_sandbox_artifact_limit_mb: int = 64  # largest file a compiler may write
+    local_sandbox_max_concurrency: int = 4
+    local_sandbox_scratch_dir: str = "/dev/shm"  # tmpfs
+    local_sandbox_use_namespaces: bool = True
+    # Submissions see only these host paths (read-only), their scratch dir at /sandbox and a private /tmp
+    local_sandbox_readonly_paths: List[str] = [
+        "/usr", "/bin", "/sbin", "/lib", "/lib32", "/lib64",
+        "/etc/alternatives", "/etc/ld.so.cache", "/etc/java-11-openjdk",
+    ]
+    local_sandbox_tmp_mb: int = 64
+    local_sandbox_uid: int = 61000  # dedicated unprivileged uid/gid for submissions; must own nothing on the host
+    local_sandbox_gid: int = 61000
+    # Without working isolation the local backend is not routed to, unless this is set (trusted code only)
+    local_sandbox_allow_unsafe: bool = False
+    
+    # Warm Python worker pool (local backend, python-3.9.7)
+    python_pool_enabled: bool = True
+    python_pool_size: int = 4
+    python_pool_max_runs_per_worker: int = 200  # recycle policy
+    python_pool_acquire_timeout: float = 2.0  # max queue wait before a cold start
+    
+    # Compiled-artifact cache (local backend; keyed by source, compiler and command)
+    artifact_cache_enabled: bool = True
+    artifact_cache_dir: str = "~/.cache/code-execution-artifacts"  # service-private; never inside the sandbox jail
+    artifact_cache_max_mb: int = 512  # LRU eviction by total bytes
+    
+    # Incremental stdout/stderr delivery (Redis Stream per execution, SSE and WebSocket)
+    output_streaming_enabled: bool = True
+    output_stream_chunk_bytes: int = 4096  # flush once this much output is buffered
+    output_stream_flush_interval: float = 0.05  # seconds; flush at least this often while output arrives
+    output_stream_max_bytes: int = 1048576  # total streamed output kept per execution
+    output_stream_block_ms: int = 15000  # SSE read block (a keep-alive is sent after each idle block)
+    
+    # WebSocket fan-out across workers through per-user Redis pub/sub channels
+    websocket_pubsub_enabled: bool = True
+    # Per-connection outbound queues (each drained by its own writer task)
+    websocket_send_queue_size: int = 100
+    websocket_send_timeout: float = 5.0  # seconds a single send may take before the client is dropped
+    websocket_slow_consumer_policy: str = "disconnect"  # "disconnect" or "drop_oldest" when a queue is full
+    # Execution updates carry only changed fields; updates within this window are merged (0 disables)
+    websocket_coalesce_window: float = 0.05
+    
+    # Serialization for Redis values, pub/sub payloads, upstream bodies and responses: "orjson" or "json"
+    serialization_codec: str = "orjson"
+    
+    # Execution record size in Redis
+    execution_compress_min_bytes: int = 1024  # longer field values are stored zlib-compressed (0 disables)
+    execution_compress_level: int = 6
+    execution_output_max_bytes: int = 4194304  # output/error_output are cut here, with a truncation marker
+    execution_output_inline_bytes: int = 65536  # the record keeps this much; the rest goes to chunked side keys
+    execution_output_chunk_bytes: int = 262144
+    
+    # Prometheus text-format metrics at GET /metrics (per worker process)
+    metrics_enabled: bool = True
+    
+    # /batch multi-test-case execution
+    batch_max_cases: int = 100
+    batch_max_concurrency: int = 8  # upper bound; a request's max_concurrency can only lower it
 
 
 settings = Settings()
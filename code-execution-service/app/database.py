@@ -1,9 +1,211 @@
 import redis.asyncio as redis
+import base64
 import json
-from typing import Optional, Dict, Any
+import zlib
+from typing import Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 
 from .config import settings
+from .codec import codec
+from .metrics import REDIS_LATENCY
+
+
+# Time-ordered index of all executions (score: created_at timestamp)
+GLOBAL_INDEX_KEY = "executions:index"
+
+# Statuses after which an execution record no longer changes
+TERMINAL_STATUSES = ("completed", "error")
+
+# Program output fields: capped, and split into side keys beyond the inline prefix
+OUTPUT_FIELDS = ("output", "error_output")
+
+# Marks a value stored as base64 zlib-compressed JSON (JSON text never starts with "z")
+COMPRESSED_PREFIX = "z:"
+
+# Record fields copied into the compact summary (execution_summary:{id}) read by list endpoints;
+# summaries also carry has_output/has_error flags instead of the output itself
+SUMMARY_FIELDS = (
+    "execution_id", "user_id", "language", "status",
+    "created_at", "updated_at", "completed_at", "execution_time"
+)
+
+# Release an execution's per-user in-flight slot (user_id is stored JSON-encoded)
+RELEASE_INFLIGHT_SNIPPET = """
+local function release_inflight(execution_key, execution_id)
+    local encoded_user = redis.call('HGET', execution_key, 'user_id')
+    if encoded_user then
+        local ok, user_id = pcall(cjson.decode, encoded_user)
+        if ok and type(user_id) == 'string' then
+            redis.call('ZREM', 'executions:inflight:' .. user_id, execution_id)
+        end
+    end
+end
+"""
+
+# Mirror updated (JSON-encoded) record fields into an existing summary hash
+UPDATE_SUMMARY_SNIPPET = """
+local summary_fields = {%s}
+local function update_summary(summary_key, args, first, ttl)
+    if redis.call('EXISTS', summary_key) == 0 then
+        return
+    end
+    for i = first, #args, 2 do
+        local field, value = args[i], args[i + 1]
+        if summary_fields[field] then
+            redis.call('HSET', summary_key, field, value)
+        elseif field == 'output' or field == 'error_output' then
+            local flag = (value ~= 'null' and value ~= '""') and 'true' or 'false'
+            redis.call('HSET', summary_key, field == 'output' and 'has_output' or 'has_error', flag)
+        end
+    end
+    redis.call('EXPIRE', summary_key, ttl)
+end
+""" % ", ".join(f"['{field}'] = true" for field in SUMMARY_FIELDS)
+
+# KEYS: [execution hash, completion signal list, summary hash]
+# ARGV: [ttl, allow_terminal_overwrite, is_terminal, raw status, execution_id, field1, value1, ...]
+# Returns the record's new version if applied, 0 if the record is missing, -1 if rejected (already terminal)
+UPDATE_EXECUTION_SCRIPT = RELEASE_INFLIGHT_SNIPPET + UPDATE_SUMMARY_SNIPPET + """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if ARGV[2] == '0' then
+    local current = redis.call('HGET', KEYS[1], 'status')
+    if current == '%s' or current == '%s' then
+        return -1
+    end
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 6))
+local version = redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+update_summary(KEYS[3], ARGV, 6, ARGV[1])
+if ARGV[3] == '1' then
+    redis.call('RPUSH', KEYS[2], ARGV[4])
+    redis.call('EXPIRE', KEYS[2], ARGV[1])
+    release_inflight(KEYS[1], ARGV[5])
+end
+return version
+""" % tuple(json.dumps(status) for status in TERMINAL_STATUSES)
+
+# Statuses an upstream (webhook) result may be applied to
+WEBHOOK_SOURCE_STATUSES = ("pending", "running", "waiting")
+
+# error_source of a terminal error we generated after a lost upstream response; the
+# upstream may still have run the code, so its webhook result replaces that error
+TRANSPORT_ERROR_SOURCE = "transport"
+
+# Apply an upstream result delivered by webhook in one step.
+# KEYS: [execution hash, completion signal list, summary hash]
+# ARGV: [ttl, raw status, execution_id, delivery digest (JSON-encoded), field1, value1, ...]
+# Returns {outcome, version, user_id, submission_key, shared_with, language} (the last four JSON-encoded);
+# outcome is applied, duplicate (this delivery was already applied), rejected or missing
+APPLY_WEBHOOK_RESULT_SCRIPT = RELEASE_INFLIGHT_SNIPPET + UPDATE_SUMMARY_SNIPPET + """
+local current = redis.call('HGET', KEYS[1], 'status')
+if not current then
+    return {'missing', 0}
+end
+local transport_error = current == %s and redis.call('HGET', KEYS[1], 'error_source') == %s
+if current ~= %s and current ~= %s and current ~= %s and not transport_error then
+    if redis.call('HGET', KEYS[1], 'webhook_digest') == ARGV[4] then
+        return {'duplicate', 0}
+    end
+    return {'rejected', 0}
+end
+redis.call('HDEL', KEYS[1], 'error_source')
+redis.call('HSET', KEYS[1], 'webhook_digest', ARGV[4], unpack(ARGV, 5))
+local version = redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+update_summary(KEYS[3], ARGV, 5, ARGV[1])
+redis.call('RPUSH', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+release_inflight(KEYS[1], ARGV[3])
+local function field(name)
+    return redis.call('HGET', KEYS[1], name) or 'null'
+end
+return {'applied', version, field('user_id'), field('submission_key'), field('shared_with'), field('language')}
+""" % tuple("'%s'" % json.dumps(value) for value in ("error", TRANSPORT_ERROR_SOURCE, *WEBHOOK_SOURCE_STATUSES))
+
+# Single-flight: attach to the in-flight leader for a submission, or become the leader.
+# KEYS: [inflight lock, followers set]  ARGV: [execution_id, ttl]
+# Returns the leader's execution_id, or nil if the caller is now the leader
+JOIN_INFLIGHT_SCRIPT = """
+local leader = redis.call('GET', KEYS[1])
+if leader then
+    redis.call('SADD', KEYS[2], ARGV[1])
+    redis.call('EXPIRE', KEYS[2], ARGV[2])
+    return leader
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return false
+"""
+
+# Single-flight: release the leader's lock and apply its result to every follower.
+# KEYS: [inflight lock, followers set]
+# ARGV: [leader execution_id, record ttl, raw status, field1, value1, ...]
+# Returns a flat list [follower_id, user_id, version, ...] of resolved followers
+RESOLVE_INFLIGHT_SCRIPT = RELEASE_INFLIGHT_SNIPPET + UPDATE_SUMMARY_SNIPPET + """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+local followers = redis.call('SMEMBERS', KEYS[2])
+redis.call('DEL', KEYS[2])
+local resolved = {}
+for _, follower in ipairs(followers) do
+    local key = 'execution:' .. follower
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('HSET', key, unpack(ARGV, 4))
+        local version = redis.call('HINCRBY', key, 'version', 1)
+        redis.call('EXPIRE', key, ARGV[2])
+        update_summary('execution_summary:' .. follower, ARGV, 4, ARGV[2])
+        redis.call('RPUSH', 'execution_done:' .. follower, ARGV[3])
+        redis.call('EXPIRE', 'execution_done:' .. follower, ARGV[2])
+        release_inflight(key, follower)
+        table.insert(resolved, follower)
+        table.insert(resolved, redis.call('HGET', key, 'user_id') or 'null')
+        table.insert(resolved, version)
+    end
+end
+return resolved
+"""
+
+
+# Commands that wait server-side for data; their duration is not Redis latency
+BLOCKING_COMMANDS = ("BLPOP", "BRPOP", "BRPOPLPUSH", "BLMOVE", "BZPOPMIN", "BZPOPMAX")
+
+
+class TimedPipeline(redis.client.Pipeline):
+    """Pipeline observing each execute() round trip in REDIS_LATENCY (operation "pipeline")"""
+    
+    async def execute(self, raise_on_error: bool = True):
+        with REDIS_LATENCY.time(operation="pipeline"):
+            return await super().execute(raise_on_error)
+
+
+class TimedRedis(redis.Redis):
+    """Redis client observing every command in REDIS_LATENCY, labeled by command name.
+    
+    Timing the client covers every caller (queues, rate limiter, result cache, pub/sub
+    publishes, scripts as EVALSHA), and failed commands raise inside the timer, so they
+    are counted with outcome "error". Blocking reads are not timed.
+    """
+    
+    @staticmethod
+    def _word(arg: Any) -> str:
+        # redis-py passes command names and keywords as str or bytes (e.g. XREADGROUP's b"BLOCK")
+        return (arg.decode(errors="replace") if isinstance(arg, bytes) else str(arg)).upper()
+    
+    async def execute_command(self, *args, **options):
+        command = self._word(args[0])
+        if command in BLOCKING_COMMANDS or (
+            command in ("XREAD", "XREADGROUP")
+            and any(isinstance(arg, (str, bytes)) and len(arg) == 5 and self._word(arg) == "BLOCK" for arg in args[1:])
+        ):
+            return await super().execute_command(*args, **options)
+        with REDIS_LATENCY.time(operation=command):
+            return await super().execute_command(*args, **options)
+    
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> TimedPipeline:
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
 
 
 class RedisManager:
@@ -12,11 +214,15 @@ class RedisManager:
     def __init__(self):
         self.redis_url = settings.redis_url
         self._redis = None
+        self._update_script = None
+        self._apply_webhook_script = None
+        self._join_inflight_script = None
+        self._resolve_inflight_script = None
     
     async def get_redis(self) -> redis.Redis:
         """Get Redis connection"""
         if self._redis is None:
-            self._redis = redis.from_url(
+            self._redis = TimedRedis.from_url(
                 self.redis_url,
                 encoding="utf8",
                 decode_responses=True
@@ -29,52 +235,389 @@ class RedisManager:
             await self._redis.close()
     
     async def set_execution_data(self, execution_id: str, data: Dict[str, Any]) -> bool:
-        """Store execution data temporarily"""
+        """Store execution data temporarily (as a hash, one JSON-encoded value per field),
+        together with its summary record.
+        
+        Every write bumps the record's version (new records start at 1).
+        """
         try:
             redis_client = await self.get_redis()
             key = f"execution:{execution_id}"
-            serialized_data = json.dumps(data, default=str)
-            await redis_client.setex(key, settings.execution_ttl, serialized_data)
+            summary_key = f"execution_summary:{execution_id}"
+            fields, chunks = self._bound_output_fields(execution_id, data)
+            async with redis_client.pipeline(transaction=True) as pipe:
+                for chunk_key, chunk in chunks.items():
+                    pipe.set(chunk_key, chunk, ex=settings.execution_ttl)
+                pipe.delete(key, summary_key)
+                pipe.hset(key, mapping=self._encode_fields({**fields, "version": data.get("version", 0) + 1}))
+                pipe.expire(key, settings.execution_ttl)
+                pipe.hset(summary_key, mapping=self._encode_fields(self._summary(data)))
+                pipe.expire(summary_key, settings.execution_ttl)
+                
+                # Maintain the global and per-user indexes (by created_at), trimmed by TTL
+                created_score = self._created_at_score(data.get("created_at"))
+                index_keys = [GLOBAL_INDEX_KEY]
+                if data.get("user_id"):
+                    index_keys.append(f"executions:user:{data['user_id']}")
+                for index_key in index_keys:
+                    pipe.zadd(index_key, {execution_id: created_score})
+                    pipe.zremrangebyscore(index_key, "-inf", created_score - settings.execution_ttl)
+                    pipe.expire(index_key, settings.execution_ttl)
+                
+                # Records written directly in a terminal status (e.g. cache hits) free their slot
+                if data.get("user_id") and data.get("status") in TERMINAL_STATUSES:
+                    pipe.zrem(f"executions:inflight:{data['user_id']}", execution_id)
+                await pipe.execute()
             return True
         except Exception as e:
             print(f"Redis set error: {e}")
             return False
     
-    async def get_execution_data(self, execution_id: str) -> Optional[Dict[str, Any]]:
-        """Get execution data"""
+    async def get_execution_data(self, execution_id: str, full_output: bool = False) -> Optional[Dict[str, Any]]:
+        """Get execution data (with output beyond the inline prefix only when full_output)"""
         try:
             redis_client = await self.get_redis()
             key = f"execution:{execution_id}"
-            data = await redis_client.get(key)
+            data = await redis_client.hgetall(key)
             if data:
-                return json.loads(data)
+                data = self._decode_fields(data)
+                return await self.load_output_chunks(data) if full_output else data
             return None
         except Exception as e:
             print(f"Redis get error: {e}")
             return None
     
-    async def update_execution_status(self, execution_id: str, status: str, **kwargs) -> bool:
-        """Update execution status and additional data"""
+    async def get_many_execution_data(
+        self, execution_ids: list[str], raise_errors: bool = False
+    ) -> list[Optional[Dict[str, Any]]]:
+        """Load several executions in one pipelined round trip.
+        
+        Results are aligned with execution_ids; missing/expired records are None.
+        """
+        if not execution_ids:
+            return []
+        try:
+            redis_client = await self.get_redis()
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for execution_id in execution_ids:
+                    pipe.hgetall(f"execution:{execution_id}")
+                results = await pipe.execute()
+            return [self._decode_fields(data) if data else None for data in results]
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"Redis batch get error: {e}")
+            return [None] * len(execution_ids)
+    
+    async def get_many_execution_summaries(
+        self, execution_ids: list[str], raise_errors: bool = False
+    ) -> list[Optional[Dict[str, Any]]]:
+        """Load several executions' summary records in one pipelined round trip.
+        
+        Records stored before summaries existed are summarized from the full record.
+        Results are aligned with execution_ids; missing/expired executions are None.
+        """
+        if not execution_ids:
+            return []
         try:
-            existing_data = await self.get_execution_data(execution_id)
-            if existing_data:
-                existing_data.update({
+            redis_client = await self.get_redis()
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for execution_id in execution_ids:
+                    pipe.hgetall(f"execution_summary:{execution_id}")
+                results = await pipe.execute()
+            summaries = [self._decode_fields(data) if data else None for data in results]
+            
+            missing = [execution_id for execution_id, summary in zip(execution_ids, summaries) if summary is None]
+            if missing:
+                records = dict(zip(missing, await self.get_many_execution_data(missing, raise_errors=True)))
+                summaries = [
+                    summary if summary is not None
+                    else (self._summary(records[execution_id]) if records[execution_id] else None)
+                    for execution_id, summary in zip(execution_ids, summaries)
+                ]
+            return summaries
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"Redis batch summary get error: {e}")
+            return [None] * len(execution_ids)
+    
+    async def update_execution_status(
+        self, execution_id: str, status: str, allow_terminal_overwrite: bool = False, **kwargs
+    ) -> int:
+        """Atomically update execution status and additional fields.
+        
+        Runs server-side in one round trip. Returns the record's new version, or 0
+        if the record does not exist or is already in a terminal status (unless
+        allow_terminal_overwrite). Waiters are signalled in the same script when a
+        terminal status is applied.
+        """
+        try:
+            redis_client = await self.get_redis()
+            if self._update_script is None:
+                self._update_script = redis_client.register_script(UPDATE_EXECUTION_SCRIPT)
+            
+            fields, chunks = self._bound_output_fields(execution_id, {
+                'status': status,
+                'updated_at': datetime.utcnow().isoformat(),
+                **kwargs
+            })
+            if chunks:
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    for chunk_key, chunk in chunks.items():
+                        pipe.set(chunk_key, chunk, ex=settings.execution_ttl)
+                    await pipe.execute()
+            fields = self._encode_fields(fields)
+            args = [
+                settings.execution_ttl,
+                "1" if allow_terminal_overwrite else "0",
+                "1" if status in TERMINAL_STATUSES else "0",
+                status,
+                execution_id,
+            ]
+            for field, value in fields.items():
+                args.extend([field, value])
+            
+            result = await self._update_script(
+                keys=[f"execution:{execution_id}", f"execution_done:{execution_id}", f"execution_summary:{execution_id}"],
+                args=args,
+                client=redis_client,
+            )
+            return max(int(result), 0)
+        except Exception as e:
+            print(f"Redis update error: {e}")
+            return 0
+    
+    async def apply_webhook_results(
+        self, deliveries: list[Tuple[str, str, str, Dict[str, Any]]]
+    ) -> list[Dict[str, Any]]:
+        """Apply upstream results, each atomically, in one pipelined round trip.
+        
+        deliveries are (execution_id, status, delivery digest, result fields). Only
+        pending/running/waiting executions accept a result, plus errors we recorded
+        after losing the upstream's response (error_source TRANSPORT_ERROR_SOURCE). A redelivery of an applied
+        result (same digest) reports "duplicate" without changing anything. Returns
+        {"outcome", "version", "user_id", "submission_key", "shared_with", "language",
+        "updated_at"} per delivery. Redis errors propagate so the deliveries are retried.
+        """
+        if not deliveries:
+            return []
+        redis_client = await self.get_redis()
+        if self._apply_webhook_script is None:
+            self._apply_webhook_script = redis_client.register_script(APPLY_WEBHOOK_RESULT_SCRIPT)
+        
+        now = datetime.utcnow().isoformat()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for execution_id, status, digest, result_fields in deliveries:
+                fields, chunks = self._bound_output_fields(execution_id, {
                     'status': status,
-                    'updated_at': datetime.utcnow().isoformat(),
-                    **kwargs
+                    'updated_at': now,
+                    **result_fields
                 })
-                return await self.set_execution_data(execution_id, existing_data)
-            return False
+                for chunk_key, chunk in chunks.items():
+                    pipe.set(chunk_key, chunk, ex=settings.execution_ttl)
+                args = [settings.execution_ttl, status, execution_id, self.encode_value(digest)]
+                for field, value in self._encode_fields(fields).items():
+                    args.extend([field, value])
+                await self._apply_webhook_script(
+                    keys=[f"execution:{execution_id}", f"execution_done:{execution_id}", f"execution_summary:{execution_id}"],
+                    args=args,
+                    client=pipe,
+                )
+            results = await pipe.execute()
+        
+        outcomes = []
+        for result in results:
+            if not isinstance(result, list):
+                continue  # chunk writes
+            outcome = {"outcome": result[0], "version": int(result[1])}
+            if outcome["outcome"] == "applied":
+                outcome.update(zip(
+                    ("user_id", "submission_key", "shared_with", "language"), map(self.decode_value, result[2:])
+                ))
+                outcome["updated_at"] = now
+            outcomes.append(outcome)
+        return outcomes
+    
+    @staticmethod
+    def encode_value(value: Any) -> str:
+        """JSON-encode a stored value, zlib-compressed when it is long enough to pay off"""
+        encoded = codec.dumps(value)
+        if 0 < settings.execution_compress_min_bytes < len(encoded):
+            compressed = COMPRESSED_PREFIX + base64.b64encode(
+                zlib.compress(encoded.encode(), settings.execution_compress_level)
+            ).decode()
+            if len(compressed) < len(encoded):
+                return compressed
+        return encoded
+    
+    @staticmethod
+    def decode_value(value: str) -> Any:
+        """Inverse of encode_value (plain JSON values are read as-is)"""
+        if value.startswith(COMPRESSED_PREFIX):
+            return codec.loads(zlib.decompress(base64.b64decode(value[len(COMPRESSED_PREFIX):])))
+        return codec.loads(value)
+    
+    @classmethod
+    def _encode_fields(cls, data: Dict[str, Any]) -> Dict[str, str]:
+        """Encode each record field as JSON so None and non-string values round-trip"""
+        return {field: cls.encode_value(value) for field, value in data.items()}
+    
+    @staticmethod
+    def _summary(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Compact list-view record of an execution"""
+        summary = {field: data.get(field) for field in SUMMARY_FIELDS}
+        summary["has_output"] = bool(data.get("output"))
+        summary["has_error"] = bool(data.get("error_output"))
+        return summary
+    
+    @classmethod
+    def update_changes(cls, execution_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """What a WebSocket delta carries for a write of data: the fields as stored, with
+        the output text replaced by has_output/has_error and its {field}_chunks metadata
+        (clients read the output from its stream or with full_output=true)"""
+        changes, _ = cls._bound_output_fields(execution_id, data)
+        for field, flag in zip(OUTPUT_FIELDS, ("has_output", "has_error")):
+            if field in changes:
+                changes[flag] = bool(changes.pop(field))
+        return changes
+    
+    @classmethod
+    def _bound_output_fields(
+        cls, execution_id: str, data: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """Cap output fields and move what exceeds the inline prefix to chunk keys.
+        
+        Returns the fields to store and the encoded chunks by key. A chunked field
+        keeps its prefix in the record plus {field}_chunks = {"key", "count", "length"}
+        (None otherwise); load_output_chunks puts the full text back together.
+        """
+        fields = dict(data)
+        chunks = {}
+        for field in OUTPUT_FIELDS:
+            text = data.get(field)
+            if not isinstance(text, str):
+                continue
+            if len(text) > settings.execution_output_max_bytes:
+                omitted = len(text) - settings.execution_output_max_bytes
+                text = text[:settings.execution_output_max_bytes] + f"\n[output truncated: {omitted} characters omitted]"
+            
+            inline = settings.execution_output_inline_bytes
+            fields[f"{field}_chunks"] = None
+            if len(text) > inline:
+                key = f"execution:{execution_id}:{field}"
+                rest = text[inline:]
+                size = settings.execution_output_chunk_bytes
+                for index, start in enumerate(range(0, len(rest), size)):
+                    chunks[f"{key}:{index}"] = cls.encode_value(rest[start:start + size])
+                fields[f"{field}_chunks"] = {"key": key, "count": -(-len(rest) // size), "length": len(text)}
+                text = text[:inline]
+            fields[field] = text
+        return fields, chunks
+    
+    async def load_output_chunks(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """A record with its chunked output fields read back in full (one MGET)"""
+        refs = [(field, data.get(f"{field}_chunks")) for field in OUTPUT_FIELDS]
+        refs = [(field, ref) for field, ref in refs if ref]
+        if not refs:
+            return data
+        
+        redis_client = await self.get_redis()
+        values = await redis_client.mget([
+            f"{ref['key']}:{index}" for _, ref in refs for index in range(ref["count"])
+        ])
+        data = dict(data)
+        position = 0
+        for field, ref in refs:
+            parts = values[position:position + ref["count"]]
+            position += ref["count"]
+            if any(part is None for part in parts):
+                print(f"Output chunks missing for {ref['key']}, returning the inline prefix")
+                continue
+            data[field] = (data.get(field) or "") + "".join(self.decode_value(part) for part in parts)
+            data[f"{field}_chunks"] = None
+        return data
+    
+    @staticmethod
+    def _created_at_score(created_at: Optional[str]) -> float:
+        """Sorted-set score for an execution's ISO created_at timestamp"""
+        if created_at:
+            try:
+                return datetime.fromisoformat(str(created_at)).timestamp()
+            except ValueError:
+                pass
+        return datetime.utcnow().timestamp()
+    
+    @classmethod
+    def _decode_fields(cls, data: Dict[str, str]) -> Dict[str, Any]:
+        """Decode a hash read back from Redis into an execution record"""
+        return {field: cls.decode_value(value) for field, value in data.items()}
+    
+    async def join_inflight_execution(self, submission_key: str, execution_id: str) -> Optional[str]:
+        """Attach to an identical in-flight execution; returns its id, or None if we lead"""
+        try:
+            redis_client = await self.get_redis()
+            if self._join_inflight_script is None:
+                self._join_inflight_script = redis_client.register_script(JOIN_INFLIGHT_SCRIPT)
+            return await self._join_inflight_script(
+                keys=[f"inflight:{submission_key}", f"inflight:{submission_key}:followers"],
+                args=[execution_id, settings.single_flight_ttl],
+                client=redis_client,
+            )
         except Exception as e:
-            print(f"Redis update error: {e}")
-            return False
+            print(f"Redis single-flight join error: {e}")
+            return None
+    
+    async def resolve_inflight_followers(
+        self, submission_key: str, leader_id: str, status: str, **kwargs
+    ) -> list[Tuple[str, Optional[str], int]]:
+        """Fan a leader's terminal result out to all attached executions in one pass.
+        
+        Returns (execution_id, user_id, new version) for each resolved follower.
+        """
+        try:
+            redis_client = await self.get_redis()
+            if self._resolve_inflight_script is None:
+                self._resolve_inflight_script = redis_client.register_script(RESOLVE_INFLIGHT_SCRIPT)
+            
+            args = [leader_id, settings.execution_ttl, status]
+            # Followers reference the leader's output chunks, written by its own update
+            fields, _ = self._bound_output_fields(leader_id, {'status': status, **kwargs})
+            for field, value in self._encode_fields(fields).items():
+                args.extend([field, value])
+            
+            resolved = await self._resolve_inflight_script(
+                keys=[f"inflight:{submission_key}", f"inflight:{submission_key}:followers"],
+                args=args,
+                client=redis_client,
+            )
+            return [
+                (resolved[i], codec.loads(resolved[i + 1]), int(resolved[i + 2]))
+                for i in range(0, len(resolved), 3)
+            ]
+        except Exception as e:
+            print(f"Redis single-flight resolve error: {e}")
+            return []
+    
+    async def wait_for_execution_completion(self, execution_id: str, timeout: float) -> Optional[str]:
+        """Block until completion is signalled or timeout elapses; returns the terminal status"""
+        try:
+            redis_client = await self.get_redis()
+            key = f"execution_done:{execution_id}"
+            result = await redis_client.blpop([key], timeout=timeout)
+            if result:
+                return result[1]
+            return None
+        except Exception as e:
+            print(f"Redis completion wait error: {e}")
+            return None
     
     async def delete_execution_data(self, execution_id: str) -> bool:
         """Delete execution data"""
         try:
             redis_client = await self.get_redis()
             key = f"execution:{execution_id}"
-            await redis_client.delete(key)
+            await redis_client.delete(key, f"execution_summary:{execution_id}")
             return True
         except Exception as e:
             print(f"Redis delete error: {e}")
@@ -101,53 +644,69 @@ class RedisManager:
             print(f"WebSocket get error: {e}")
             return None
     
-    async def list_all_executions(self, limit: int = 100) -> list[Dict[str, Any]]:
-        """List all executions stored in Redis"""
+    async def list_all_executions(
+        self, limit: int = 100, before: Optional[float] = None
+    ) -> Tuple[list[Dict[str, Any]], Optional[float]]:
+        """List a page of all executions' summaries (newest first) via the global index"""
         try:
-            redis_client = await self.get_redis()
-            
-            # Get all execution keys
-            keys = await redis_client.keys("execution:*")
-            
-            # Limit the results
-            if len(keys) > limit:
-                keys = keys[:limit]
-            
-            executions = []
-            for key in keys:
-                data = await redis_client.get(key)
-                if data:
-                    try:
-                        execution_data = json.loads(data)
-                        executions.append(execution_data)
-                    except json.JSONDecodeError:
-                        print(f"Failed to decode execution data for key: {key}")
-                        continue
-            
-            # Sort by created_at (newest first)
-            executions.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-            
-            return executions
+            return await self._list_from_index(GLOBAL_INDEX_KEY, limit, before)
         except Exception as e:
             print(f"List executions error: {e}")
-            return []
+            return [], None
     
-    async def list_executions_by_user(self, user_id: str, limit: int = 50) -> list[Dict[str, Any]]:
-        """List executions for a specific user"""
+    async def list_executions_by_user(
+        self, user_id: str, limit: int = 50, before: Optional[float] = None
+    ) -> Tuple[list[Dict[str, Any]], Optional[float]]:
+        """List a page of a user's execution summaries (newest first) via the per-user index"""
         try:
-            all_executions = await self.list_all_executions(limit * 2)  # Get more to filter
-            
-            # Filter by user_id
-            user_executions = [
-                execution for execution in all_executions 
-                if execution.get("user_id") == user_id
-            ]
-            
-            # Limit results
-            return user_executions[:limit]
+            return await self._list_from_index(f"executions:user:{user_id}", limit, before)
         except Exception as e:
             print(f"List user executions error: {e}")
-            return []
+            return [], None
+    
+    async def _list_from_index(
+        self, index_key: str, limit: int, before: Optional[float]
+    ) -> Tuple[list[Dict[str, Any]], Optional[float]]:
+        """Keyset-paginate a created_at index; returns (execution summaries, next_cursor).
+        
+        The cursor is the created_at score of the last returned execution; pass it
+        back as `before` to get the next page.
+        """
+        redis_client = await self.get_redis()
+        max_score = f"({before}" if before is not None else "+inf"
+        executions = []
+        last_score = None
+        
+        # Refill the page when expired records were dropped from the index
+        while len(executions) < limit:
+            wanted = limit - len(executions)
+            entries = await redis_client.zrevrangebyscore(
+                index_key, max_score, "-inf", start=0, num=wanted, withscores=True
+            )
+            if not entries:
+                break
+            
+            results = await self.get_many_execution_summaries(
+                [execution_id for execution_id, _ in entries], raise_errors=True
+            )
+            
+            expired_ids = []
+            for (execution_id, score), data in zip(entries, results):
+                if data:
+                    executions.append(data)
+                    last_score = score
+                else:
+                    expired_ids.append(execution_id)
+            
+            # Lazily drop index entries whose record has expired
+            if expired_ids:
+                await redis_client.zrem(index_key, *expired_ids)
+            if len(entries) < wanted:
+                break
+            max_score = f"({entries[-1][1]}"
+        
+        next_cursor = last_score if len(executions) == limit else None
+        return executions, next_cursor
 
 # Global Redis manager instance
 redis_manager = RedisManager()
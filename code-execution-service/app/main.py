@@ -4,7 +4,9 @@ from contextlib import asynccontextmanager
 from fastapi.openapi.utils import get_openapi
 from .config import settings
 from .database import redis_manager
-from .routes import code_execution, health, content_ml_helper
+from .services.code_execution import code_execution_service
+from .services.websocket import websocket_manager
+from .routes import code_execution, health, content_ml_helper, metrics
 
 
 @asynccontextmanager
@@ -16,9 +18,24 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"Redis connection failed: {e}")
     
+    # Start the execution backends and queue workers (the workers wait for Redis themselves)
+    try:
+        await code_execution_service.startup()
+        print("Execution backends and queue workers started")
+    except Exception as e:
+        print(f"Execution service startup error: {e}")
+    
     yield
     
-    # Cleanup
+    # Cleanup (queue workers first: they still use Redis while stopping)
+    await websocket_manager.stop()
+    
+    try:
+        await code_execution_service.shutdown()
+        print("Upstream HTTP client pool closed")
+    except Exception as e:
+        print(f"Upstream HTTP client cleanup error: {e}")
+    
     try:
         await redis_manager.close()
         print("Redis connection closed")
@@ -49,3 +66,5 @@ app.add_middleware(
 app.include_router(health.router, prefix="/health", tags=["health"])
 app.include_router(code_execution.router, prefix="/api/v1/executions", tags=["code-execution"])
 app.include_router(content_ml_helper.router, prefix="/api/v1/content_ml_helper", tags=["content-ml-helper"])
+if settings.metrics_enabled:
+    app.include_router(metrics.router, tags=["metrics"])
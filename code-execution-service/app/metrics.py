@@ -0,0 +1,294 @@
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+# Seconds; covers upstream calls and end-to-end waits
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Seconds; single Redis round trips
+REDIS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+# Status checks per /execute-immediate request
+POLL_BUCKETS = (1, 2, 3, 5, 8, 13, 21)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    """A metric family: one value per combination of label values"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(key)} {_format_value(value)}" for key, value in self._values.items()]
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+            *self.samples(),
+        ]
+
+
+class Counter(Metric):
+    """Monotonic count; exposed as <name>_total"""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}_total{self._labels(key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(Metric):
+    """Current value; either set directly or read from a callback at scrape time"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Report function() instead of stored values (unlabeled gauges only)"""
+        self._function = function
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                return [f"{self.name} {_format_value(self._function())}"]
+            except Exception as e:
+                print(f"Metrics gauge {self.name} error: {e}")
+                return []
+        return super().samples()
+
+
+class Timer:
+    """Context manager observing the elapsed time of its block into a histogram.
+
+    An "outcome" label that was not given up front is set to "error" when the
+    block raises and "ok" otherwise; set() fills in labels known only inside it.
+    """
+
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: "Histogram", labels: Dict[str, Any]):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+
+    def set(self, **labels) -> "Timer":
+        self.labels.update(labels)
+        return self
+
+    def __enter__(self) -> "Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        if "outcome" in self.histogram.labelnames and "outcome" not in self.labels:
+            self.labels["outcome"] = "error" if exc_type else "ok"
+        self.histogram.observe(elapsed, **self.labels)
+        return False
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, plus their sum and count"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # per-bucket counts (the last one is +Inf), sum
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def time(self, **labels) -> Timer:
+        """with histogram.time(compiler=...) as timer: ..."""
+        return Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text exposition format.
+
+    Values live in this worker process only (no locking: they are updated from
+    the event loop), so each worker is scraped on its own. Label values must come
+    from small fixed sets (compiler names, outcomes, operations), never ids.
+    Collectors are awaited before each scrape to refresh values that live
+    elsewhere (e.g. queue depths in Redis) for gauges to report.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Awaitable[Any]]] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Awaitable[Any]]):
+        self._collectors.append(collector)
+
+    async def collect(self):
+        """Run every collector; a failing one leaves its gauges at their last values"""
+        results = await asyncio.gather(*(collector() for collector in self._collectors), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Metrics collector error: {result}")
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global metrics registry
+metrics = MetricsRegistry()
+
+SUBMISSION_LATENCY = metrics.histogram(
+    "code_execution_submission_seconds",
+    "Time to accept a submission (cache lookup, store, queue or upstream submit)",
+    ("compiler", "outcome"),
+)
+UPSTREAM_REQUEST_LATENCY = metrics.histogram(
+    "code_execution_upstream_request_seconds",
+    "Round trip of each call to the third-party execution API",
+    ("compiler", "outcome"),
+)
+WEBHOOK_TO_COMPLETION = metrics.histogram(
+    "code_execution_webhook_to_completion_seconds",
+    "Time from receiving a result webhook until it is applied and notified",
+    ("compiler", "outcome"),
+)
+IMMEDIATE_POLLS = metrics.histogram(
+    "code_execution_immediate_polls",
+    "Status checks made while an /execute-immediate request waits",
+    ("compiler", "outcome"),
+    buckets=POLL_BUCKETS,
+)
+IMMEDIATE_WAIT = metrics.histogram(
+    "code_execution_immediate_wait_seconds",
+    "Time an /execute-immediate request waits for its result",
+    ("compiler", "outcome"),
+)
+REDIS_LATENCY = metrics.histogram(
+    "code_execution_redis_seconds",
+    "Latency of Redis commands (operation: command name) and pipeline round trips (operation: pipeline)",
+    ("operation", "outcome"),
+    buckets=REDIS_BUCKETS,
+)
+UPSTREAM_RETRIES = metrics.counter(
+    "code_execution_upstream_retries",
+    "Upstream calls retried after a transient failure",
+    ("compiler",),
+)
+WEBHOOKS_RECEIVED = metrics.counter(
+    "code_execution_webhooks",
+    "Result webhooks received, by how they were taken in (queued, inline, invalid)",
+    ("outcome",),
+)
+WEBSOCKET_CONNECTIONS = metrics.gauge(
+    "code_execution_websocket_connections",
+    "Open WebSocket connections held by this worker",
+)
+JOB_QUEUE_LENGTH = metrics.gauge(
+    "code_execution_job_queue_length",
+    "Jobs in the execution queue stream (waiting or running)",
+)
+JOB_QUEUE_PENDING = metrics.gauge(
+    "code_execution_job_queue_pending",
+    "Jobs delivered to a worker and not yet acknowledged",
+)
+JOB_QUEUE_LAG = metrics.gauge(
+    "code_execution_job_queue_lag_seconds",
+    "Age of the oldest unfinished job in the execution queue",
+)
+WEBHOOK_QUEUE_LENGTH = metrics.gauge(
+    "code_execution_webhook_queue_length",
+    "Result webhooks in the queue stream not yet applied",
+)
+WEBHOOK_QUEUE_PENDING = metrics.gauge(
+    "code_execution_webhook_queue_pending",
+    "Result webhooks delivered to a consumer and not yet acknowledged",
+)
+WEBHOOK_QUEUE_LAG = metrics.gauge(
+    "code_execution_webhook_queue_lag_seconds",
+    "Age of the oldest result webhook not yet applied",
+)
@@ -1,5 +1,6 @@
 from .health import router as health_router
 from .code_execution import router as code_execution_router
 from .content_ml_helper import router as content_ml_helper_router
+from .metrics import router as metrics_router
 
-__all__ = ["health_router", "code_execution_router", "content_ml_helper_router"]
+__all__ = ["health_router", "code_execution_router", "content_ml_helper_router", "metrics_router"]
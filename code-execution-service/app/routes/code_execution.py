@@ -1,6 +1,10 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Header, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 from typing import Dict, Any, Optional
 from datetime import datetime
+import hashlib
+import time
+import uuid
 
 from ..schemas import (
     CodeSubmissionRequest,
@@ -8,12 +12,18 @@ from ..schemas import (
     ExecutionStatusResponse,
     ImmediateExecutionResponse,
     ExecutionListSummaryResponse,
-    ExecutionSummary,
+    BatchExecutionRequest,
+    BatchExecutionResponse,
 )
 from ..services.code_execution import code_execution_service
 from ..services.websocket import websocket_manager
-from ..database import redis_manager
+from ..services.rate_limiter import rate_limiter
+from ..services.output_stream import output_streamer
+from ..services.webhook_queue import webhook_queue
+from ..database import redis_manager, TERMINAL_STATUSES
+from ..codec import codec
 from ..config import settings
+from ..metrics import WEBHOOKS_RECEIVED
 
 router = APIRouter()
 
@@ -24,22 +34,75 @@ user = {
 }
 
 
+def json_response(content: Any) -> Response:
+    """Serialize once with the configured codec instead of rebuilding and re-dumping response models"""
+    return Response(content=codec.dumps_bytes(content), media_type="application/json")
+
+
+def model_fields(model, data: Dict[str, Any]) -> Dict[str, Any]:
+    """A stored record cut down to a response model's declared fields, defaults filled in.
+    A record missing a required field is an error, not a response; in debug the result
+    is also validated against the model."""
+    missing = [name for name, field in model.model_fields.items() if field.is_required() and name not in data]
+    if missing:
+        raise ValueError(f"{model.__name__}: record is missing required fields {missing}")
+    fields = {
+        name: data[name] if name in data else field.get_default(call_default_factory=True)
+        for name, field in model.model_fields.items()
+    }
+    if settings.debug:
+        model.model_validate(fields)
+    return fields
+
+
+def summary_item(execution: Dict[str, Any]) -> Dict[str, Any]:
+    """One ExecutionSummary from a stored summary record"""
+    return {
+        "execution_id": execution.get("execution_id", ""),
+        "user_id": execution.get("user_id", ""),
+        "language": execution.get("language", ""),
+        "status": execution.get("status", "unknown"),
+        "created_at": execution.get("created_at", ""),
+        "completed_at": execution.get("completed_at"),
+        "execution_time": execution.get("execution_time"),
+        "has_output": bool(execution.get("has_output")),
+        "has_error": bool(execution.get("has_error"))
+    }
+
+
+async def admit_execution(user_id: str, cost: int = 1) -> str:
+    """Apply admission control; returns the reserved execution_id or raises 429"""
+    execution_id = str(uuid.uuid4())
+    decision = await rate_limiter.admit(user_id, execution_id, cost=cost)
+    if not decision["allowed"]:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many executions ({decision['reason']}). Retry after {decision['retry_after']} seconds.",
+            headers={"Retry-After": str(decision["retry_after"])},
+        )
+    return execution_id
+
+
 @router.post("/execute", response_model=CodeSubmissionResponse)
 async def submit_code_execution(
     submission: CodeSubmissionRequest,
 ):
     """Submit code for execution"""
+    execution_id = await admit_execution(user["uid"])
     try:
-        execution_id = await code_execution_service.submit_code_execution(
+        result = await code_execution_service.submit_code_execution(
             code=submission.code,
             language=submission.language,
             input_data=submission.input_data,
             user_id=user["uid"],
+            execution_id=execution_id,
         )
+        execution_id = result["execution_id"]
 
         return CodeSubmissionResponse(
             execution_id=execution_id,
-            status="pending",
+            status=result["status"],
+            cached=result["cached"],
             message=f"Code submitted for execution. Use execution_id: {execution_id} to track progress.",
         )
 
@@ -52,10 +115,11 @@ async def submit_code_execution(
 @router.get("/status/{execution_id}", response_model=ExecutionStatusResponse)
 async def get_execution_status(
     execution_id: str,
+    full_output: bool = Query(default=False, description="Include output beyond the inline prefix (see output_chunks)"),
 ):
     """Get execution status and results"""
 
-    execution_data = await code_execution_service.get_execution_status(execution_id)
+    execution_data = await code_execution_service.get_execution_status(execution_id, full_output=full_output)
 
     if not execution_data:
         raise HTTPException(status_code=404, detail="Execution not found")
@@ -64,73 +128,173 @@ async def get_execution_status(
     if execution_data.get("user_id") != user["uid"]:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    return ExecutionStatusResponse(**execution_data)
+    return json_response(model_fields(ExecutionStatusResponse, execution_data))
 
 
-@router.post("/webhook/{tmp}")
-async def webhook_execution_result(tmp: str, result_data: Dict[str, Any]):
-    """Webhook endpoint to receive execution results from third-party API"""
+def format_sse(event_id: Optional[str], event: Dict[str, str]) -> str:
+    """One Server-Sent Event; the event type is the output stream (stdout, stderr, truncated, end)"""
+    payload = {key: value for key, value in event.items() if key != "type"}
+    id_line = f"id: {event_id}\n" if event_id else ""
+    return f"{id_line}event: {event['type']}\ndata: {codec.dumps(payload)}\n\n"
 
-    print(f"Received webhook for execution: {tmp} with data: {result_data}")
 
-    extra_params = result_data.get("extra_params", {})
-    if "execution_id" not in extra_params:
-        raise HTTPException(
-            status_code=400, detail="Missing execution_id in extra_params"
-        )
-    execution_id = extra_params["execution_id"]
-    try:
-        # example: {'output': '', 'cpu': '0.05', 'memory': '9400', 'status': 'error', 'error': "line 1, in <module>\n    import pandas as pd\nModuleNotFoundError: No module named 'pandas'\n", 'extra_params': ''}
-        # Parse the webhook result
-        execution_result = {
-            "output": result_data.get("output", ""),
-            "error": result_data.get("error", ""),
-            "execution_time": result_data.get("cpu", ""),
-            "memory_usage": result_data.get("memory", ""),
-        }
-
-        # Determine status based on result
-        raw_status = result_data.get("status", "").lower()
-        
-        # Map API status to our internal status
-        if raw_status == "success":
-            status = "completed"
-        elif raw_status == "error":
-            status = "error"
-        else:
-            # For any other status, default to completed if we have output, error if we have error
-            if execution_result.get("error"):
-                status = "error"
-            else:
-                status = "completed"
-        
-        print(f"Webhook processing execution {execution_id}: raw_status={raw_status}, mapped_status={status}, has_output={bool(execution_result.get('output'))}, has_error={bool(execution_result.get('error'))}")
+@router.get("/stream/{execution_id}")
+async def stream_execution_output(
+    execution_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Header(default=None, description="Resume after this event id (sent by EventSource on reconnect)")
+):
+    """Stream stdout/stderr as Server-Sent Events while the execution runs, ending with an 'end' event"""
+    execution_data = await code_execution_service.get_execution_status(execution_id)
 
-        # Update execution status in Redis
-        from ..database import redis_manager
+    if not execution_data:
+        raise HTTPException(status_code=404, detail="Execution not found")
 
-        update_success = await redis_manager.update_execution_status(
-            execution_id,
-            status,
-            output=execution_result.get("output", ""),
-            error_output=execution_result.get("error", ""),
-            execution_time=execution_result.get("execution_time", ""),
-            memory_usage=execution_result.get("memory_usage", ""),
-            completed_at=datetime.utcnow().isoformat(),
-        )
-        
-        print(f"Redis update success for execution {execution_id}: {update_success}")
+    # Verify user owns this execution
+    if execution_data.get("user_id") != user["uid"]:
+        raise HTTPException(status_code=403, detail="Access denied")
 
-        # Get execution data to find user_id for WebSocket notification
+    finished = execution_data.get("status") in TERMINAL_STATUSES
+    if not settings.output_streaming_enabled and not finished:
+        raise HTTPException(status_code=404, detail="Output streaming is disabled")
+
+    def stored_result_events(data: Dict[str, Any]):
+        """Events rebuilt from the stored record (ids 0-1, 0-2, ...), for executions without a stream"""
+        events = output_streamer.result_events(data.get("output"), data.get("error_output"), data.get("status"))
+        resumed = int(last_event_id[2:]) if last_event_id and last_event_id.startswith("0-") and last_event_id[2:].isdigit() else 0
+        return [(f"0-{index}", event) for index, event in enumerate(events, 1) if index > resumed]
+
+    async def event_source():
+        if finished and not await output_streamer.exists(execution_id):
+            # Finished before streaming existed (or the stream expired): replay the stored result
+            stored = await code_execution_service.get_execution_status(execution_id, full_output=True)
+            for event_id, event in stored_result_events(stored or execution_data):
+                yield format_sse(event_id, event)
+            return
+
+        idle_after_finish = 0
+        async for item in output_streamer.follow(execution_id, last_event_id or "0-0"):
+            if await request.is_disconnected():
+                return
+            if item is not None:
+                yield format_sse(*item)
+                continue
+
+            yield ": keep-alive\n\n"
+            # Stop following executions that vanished or finished without an end event
+            current = await code_execution_service.get_execution_status(execution_id)
+            if not current:
+                return
+            idle_after_finish = idle_after_finish + 1 if current.get("status") in TERMINAL_STATUSES else 0
+            if idle_after_finish >= 2:
+                yield format_sse(None, {"type": "end", "status": current["status"]})
+                return
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws/{execution_id}")
+async def execution_updates_socket(
+    websocket: WebSocket,
+    execution_id: str,
+    last_event_id: Optional[str] = None
+):
+    """Real-time updates for one execution (or batch_id): status updates, output
+    events and batch case results, delivered from whichever worker produces them.
+    
+    On connect a snapshot of the execution record is sent (then only changed fields,
+    see WebSocketManager), plus output after last_event_id when given. Clients may
+    send {"type": "resync"} for a fresh snapshot, {"type": "resume", "last_event_id": ...}
+    to replay missed output, or {"type": "ping"}.
+    """
+    await websocket.accept()
+    user_id = user["uid"]
+    
+    # Subscribe before reading the record: an update published in between is then
+    # delivered after the snapshot instead of being lost
+    await websocket_manager.connect(websocket, user_id, execution_id)
+    try:
         execution_data = await code_execution_service.get_execution_status(execution_id)
+        if execution_data and execution_data.get("user_id") != user_id:
+            await websocket_manager.disconnect(user_id, execution_id, websocket, code=1008, reason="Access denied")
+            return
         if execution_data:
-            user_id = execution_data.get("user_id")
-            if user_id:
-                # Send WebSocket update to user
-                await websocket_manager.send_execution_update(
-                    user_id, execution_id, execution_data
-                )
+            websocket_manager.send_execution_snapshot(user_id, execution_id, execution_data)
+        if last_event_id is not None:
+            await websocket_manager.replay_output(user_id, execution_id, last_event_id)
+        
+        while True:
+            try:
+                message = codec.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue
+            if message.get("type") == "resync":
+                execution_data = await code_execution_service.get_execution_status(execution_id)
+                if execution_data:
+                    websocket_manager.send_execution_snapshot(user_id, execution_id, execution_data)
+            elif message.get("type") == "resume":
+                await websocket_manager.replay_output(user_id, execution_id, message.get("last_event_id") or "0-0")
+            elif message.get("type") == "ping":
+                websocket_manager.send_local(user_id, execution_id, {"type": "pong"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await websocket_manager.disconnect(user_id, execution_id, websocket)
+
 
+@router.post("/webhook/{tmp}")
+async def webhook_execution_result(tmp: str, request: Request):
+    """Webhook endpoint to receive execution results from third-party API.
+    
+    The payload is validated and appended to the webhook queue, and the provider
+    gets its 200 at once; consumers apply results in batches (inline if the queue
+    is disabled or unavailable). Each result is applied by one atomic Redis
+    operation that also enforces the status transition. Redelivered callbacks
+    (same payload digest) are acknowledged without repeating any work.
+    """
+    received_at = time.time()
+    body = await request.body()
+    try:
+        result_data = codec.loads(body)
+    except ValueError:
+        WEBHOOKS_RECEIVED.inc(outcome="invalid")
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+
+    extra_params = result_data.get("extra_params") if isinstance(result_data, dict) else None
+    if not isinstance(extra_params, dict) or "execution_id" not in extra_params:
+        WEBHOOKS_RECEIVED.inc(outcome="invalid")
+        raise HTTPException(
+            status_code=400, detail="Missing execution_id in extra_params"
+        )
+    execution_id = extra_params["execution_id"]
+    digest = hashlib.sha1(body).hexdigest()
+
+    if webhook_queue.running:
+        try:
+            # Acknowledge right away; the webhook consumers apply it
+            await webhook_queue.enqueue(execution_id, body, digest)
+            WEBHOOKS_RECEIVED.inc(outcome="queued")
+            return {"status": "success", "message": "Execution result queued"}
+        except Exception as e:
+            # Fall back to applying it inline if the queue is unavailable
+            print(f"Webhook queue enqueue error for execution {execution_id}: {e}")
+
+    WEBHOOKS_RECEIVED.inc(outcome="inline")
+    try:
+        status, result_fields = code_execution_service.parse_webhook_result(result_data, received_at=received_at)
+        outcome = (await code_execution_service.apply_webhook_results(
+            [(execution_id, status, digest, result_fields)], [received_at]
+        ))[0]
+        print(f"Webhook for execution {execution_id}: mapped_status={status}, {len(body)} bytes, {outcome}")
+
+        if outcome == "duplicate":
+            return {"status": "success", "message": "Duplicate delivery ignored"}
         return {"status": "success", "message": "Execution result received"}
 
     except Exception as e:
@@ -151,9 +315,10 @@ async def webhook_execution_result(tmp: str, result_data: Dict[str, Any]):
 async def execute_code_immediate(
     submission: CodeSubmissionRequest,
     timeout: int = Query(default=60, ge=10, le=300, description="Timeout in seconds (10-300)"),
-    poll_interval: float = Query(default=1.0, ge=0.5, le=5.0, description="Polling interval in seconds (0.5-5.0)")
+    poll_interval: float = Query(default=1.0, ge=0.5, le=5.0, description="Fallback polling interval in seconds (0.5-5.0); results are pushed on completion")
 ):
-    """Execute code immediately and wait for result with polling (no webhook required)"""
+    """Execute code immediately and wait for the result (woken on completion, polling as fallback)"""
+    execution_id = await admit_execution(user["uid"])
     try:
         result = await code_execution_service.execute_code_immediate(
             code=submission.code,
@@ -161,7 +326,8 @@ async def execute_code_immediate(
             input_data=submission.input_data,
             user_id=user["uid"],
             timeout_seconds=timeout,
-            poll_interval=poll_interval
+            poll_interval=poll_interval,
+            execution_id=execution_id
         )
 
         return ImmediateExecutionResponse(**result)
@@ -172,10 +338,57 @@ async def execute_code_immediate(
         )
 
 
+@router.post("/batch", response_model=BatchExecutionResponse)
+async def execute_batch(
+    batch: BatchExecutionRequest,
+    timeout: int = Query(default=60, ge=10, le=300, description="Per-case timeout in seconds (10-300)")
+):
+    """Run one program against many test cases and return an aggregated verdict.
+    
+    Each finished case is also pushed to WebSocket subscribers of the batch_id.
+    """
+    if not batch.test_cases:
+        raise HTTPException(status_code=400, detail="At least one test case is required")
+    if len(batch.test_cases) > settings.batch_max_cases:
+        raise HTTPException(
+            status_code=400, detail=f"Too many test cases (max {settings.batch_max_cases})"
+        )
+    
+    # One in-flight slot for the batch, but every case costs a token: each is an upstream execution
+    batch_id = await admit_execution(user["uid"], cost=len(batch.test_cases))
+    
+    async def notify_case(case_result: Dict[str, Any]):
+        await websocket_manager.send_batch_case_update(user["uid"], batch_id, case_result)
+    
+    try:
+        result = await code_execution_service.execute_batch(
+            code=batch.code,
+            language=batch.language,
+            test_cases=[test_case.model_dump() for test_case in batch.test_cases],
+            user_id=user["uid"],
+            batch_id=batch_id,
+            timeout_seconds=timeout,
+            stop_on_failure=batch.stop_on_failure,
+            max_concurrency=batch.max_concurrency,
+            on_case_complete=notify_case
+        )
+        return BatchExecutionResponse(**result)
+    
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Batch execution failed: {str(e)}"
+        )
+    finally:
+        await rate_limiter.release(user["uid"], batch_id)
+
+
 @router.get("/list", response_model=ExecutionListSummaryResponse)
 async def list_executions(
     limit: int = Query(default=50, ge=1, le=500, description="Maximum number of executions to return"),
-    user_id: Optional[str] = Query(default=None, description="Filter by user ID (admin only in production)")
+    user_id: Optional[str] = Query(default=None, description="Filter by user ID (admin only in production)"),
+    before: Optional[float] = Query(default=None, description="Pagination cursor: next_cursor from the previous page")
 ):
     """List executions from Redis database"""
     try:
@@ -188,35 +401,21 @@ async def list_executions(
         
         # Get executions
         if user_id:
-            executions_data = await redis_manager.list_executions_by_user(user_id, limit)
+            executions_data, next_cursor = await redis_manager.list_executions_by_user(user_id, limit, before)
         else:
             # In production, default to current user's executions
             if not settings.debug:
-                executions_data = await redis_manager.list_executions_by_user(user["uid"], limit)
+                executions_data, next_cursor = await redis_manager.list_executions_by_user(user["uid"], limit, before)
             else:
-                executions_data = await redis_manager.list_all_executions(limit)
+                executions_data, next_cursor = await redis_manager.list_all_executions(limit, before)
         
-        # Convert to summary format
-        executions_summary = []
-        for execution in executions_data:
-            summary = ExecutionSummary(
-                execution_id=execution.get("execution_id", ""),
-                user_id=execution.get("user_id", ""),
-                language=execution.get("language", ""),
-                status=execution.get("status", "unknown"),
-                created_at=execution.get("created_at", ""),
-                completed_at=execution.get("completed_at"),
-                execution_time=execution.get("execution_time"),
-                has_output=bool(execution.get("output")),
-                has_error=bool(execution.get("error_output"))
-            )
-            executions_summary.append(summary)
-
-        return ExecutionListSummaryResponse(
-            executions=executions_summary,
-            total_count=len(executions_summary),
-            limit=limit
-        )
+        executions_summary = [summary_item(execution) for execution in executions_data]
+        return json_response({
+            "executions": executions_summary,
+            "total_count": len(executions_summary),
+            "limit": limit,
+            "next_cursor": next_cursor
+        })
 
     except HTTPException:
         raise
@@ -228,7 +427,8 @@ async def list_executions(
 
 @router.get("/list/all", response_model=ExecutionListSummaryResponse)
 async def list_all_executions_admin(
-    limit: int = Query(default=100, ge=1, le=1000, description="Maximum number of executions to return")
+    limit: int = Query(default=100, ge=1, le=1000, description="Maximum number of executions to return"),
+    before: Optional[float] = Query(default=None, description="Pagination cursor: next_cursor from the previous page")
 ):
     """List all executions (development/admin only)"""
     if not settings.debug:
@@ -238,29 +438,15 @@ async def list_all_executions_admin(
         )
     
     try:
-        executions_data = await redis_manager.list_all_executions(limit)
+        executions_data, next_cursor = await redis_manager.list_all_executions(limit, before)
         
-        # Convert to summary format
-        executions_summary = []
-        for execution in executions_data:
-            summary = ExecutionSummary(
-                execution_id=execution.get("execution_id", ""),
-                user_id=execution.get("user_id", ""),
-                language=execution.get("language", ""),
-                status=execution.get("status", "unknown"),
-                created_at=execution.get("created_at", ""),
-                completed_at=execution.get("completed_at"),
-                execution_time=execution.get("execution_time"),
-                has_output=bool(execution.get("output")),
-                has_error=bool(execution.get("error_output"))
-            )
-            executions_summary.append(summary)
-
-        return ExecutionListSummaryResponse(
-            executions=executions_summary,
-            total_count=len(executions_summary),
-            limit=limit
-        )
+        executions_summary = [summary_item(execution) for execution in executions_data]
+        return json_response({
+            "executions": executions_summary,
+            "total_count": len(executions_summary),
+            "limit": limit,
+            "next_cursor": next_cursor
+        })
 
     except Exception as e:
         raise HTTPException(
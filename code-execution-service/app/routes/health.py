@@ -22,18 +22,74 @@ async def readiness_check():
     # Check Redis connection
     try:
         from ..database import redis_manager
+        from ..services.circuit_breaker import upstream_circuit_breaker
         redis_client = await redis_manager.get_redis()
         await redis_client.ping()
         
+        # Upstream circuit state is reported but does not fail readiness
         return HealthResponse(
             status="ready",
             timestamp=datetime.utcnow().isoformat(),
             service="Code Execution Service",
-            version="1.0.0"
+            version="1.0.0",
+            checks={
+                "redis": "ok",
+                "upstream_circuit": await upstream_circuit_breaker.get_state(),
+            }
         )
-    except Exception as e:        return HealthResponse(
+    except Exception as e:
+        return HealthResponse(
             status=f"not ready: {str(e)}",
             timestamp=datetime.utcnow().isoformat(),
             service="Code Execution Service",
             version="1.0.0"
         )
+
+
+@router.get("/pool")
+async def upstream_pool_stats():
+    """Upstream HTTP connection pool statistics"""
+    from ..services.code_execution import code_execution_service
+    return code_execution_service.get_pool_stats()
+
+
+@router.get("/result-cache")
+async def result_cache_stats():
+    """Result cache hit/miss counters"""
+    from ..services.code_execution import code_execution_service
+    return await code_execution_service.get_cache_stats()
+
+
+@router.get("/queue")
+async def job_queue_stats():
+    """Submission job queue depth and wait statistics"""
+    from ..services.code_execution import code_execution_service
+    return await code_execution_service.get_queue_stats()
+
+
+@router.get("/webhook-queue")
+async def webhook_queue_stats():
+    """Webhook queue depth, lag and batch statistics"""
+    from ..services.code_execution import code_execution_service
+    return await code_execution_service.get_webhook_queue_stats()
+
+
+@router.get("/rate-limit")
+async def rate_limit_stats():
+    """Admission control rejection counters and limits"""
+    from ..services.rate_limiter import rate_limiter
+    return await rate_limiter.get_stats()
+
+
+@router.get("/backends")
+async def execution_backend_stats():
+    """Execution backend statistics"""
+    from ..services.code_execution import code_execution_service
+    return code_execution_service.get_backend_stats()
+
+
+@router.get("/websockets")
+async def websocket_stats():
+    """WebSocket connections held by this worker and pub/sub fan-out counters"""
+    from ..services.websocket import websocket_manager
+    return websocket_manager.get_stats()
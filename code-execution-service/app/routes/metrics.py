@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from ..metrics import metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    """Counters and latency histograms of this worker in the Prometheus text format"""
+    await metrics.collect()
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional
 
@@ -13,6 +13,7 @@ class CodeSubmissionRequest(BaseModel):
 class CodeSubmissionResponse(BaseModel):
     execution_id: str
     status: str = "pending"
+    cached: bool = False
     message: str = "Code submitted for execution"
 
 
@@ -30,6 +31,12 @@ class ExecutionStatusResponse(BaseModel):
     created_at: str
     updated_at: Optional[str] = None
     completed_at: Optional[str] = None
+    cached: bool = False
+    shared_with: Optional[str] = None  # execution whose upstream run produced this result
+    queue_wait_time: Optional[float] = None  # seconds spent in the job queue
+    # Set when the output continues past the inline prefix: {"key", "count", "length"}; pass full_output=true
+    output_chunks: Optional[dict] = None
+    error_output_chunks: Optional[dict] = None
 
 
 class ImmediateExecutionResponse(BaseModel):
@@ -39,9 +46,49 @@ class ImmediateExecutionResponse(BaseModel):
     error_output: Optional[str] = None
     execution_time: Optional[str] = None
     memory_usage: Optional[str] = None
+    cached: bool = False
     message: str
 
 
+class BatchTestCase(BaseModel):
+    input_data: str = ""
+    expected_output: Optional[str] = None  # omit to run without grading
+
+
+class BatchExecutionRequest(BaseModel):
+    code: str
+    language: str
+    test_cases: list[BatchTestCase]
+    stop_on_failure: bool = False
+    max_concurrency: Optional[int] = Field(default=None, ge=1, le=32)
+
+
+class BatchCaseResult(BaseModel):
+    index: int
+    execution_id: Optional[str] = None
+    status: str  # completed, error, timeout, skipped
+    passed: bool
+    output: Optional[str] = None
+    error_output: Optional[str] = None
+    expected_output: Optional[str] = None
+    execution_time: Optional[str] = None
+    memory_usage: Optional[str] = None
+    duration_ms: Optional[float] = None
+    cached: bool = False
+    message: Optional[str] = None
+
+
+class BatchExecutionResponse(BaseModel):
+    batch_id: str
+    verdict: str  # accepted, wrong_answer, error, timeout
+    total_cases: int
+    passed_cases: int
+    failed_cases: int
+    skipped_cases: int
+    duration_ms: float
+    results: list[BatchCaseResult]
+
+
 class ExecutionListResponse(BaseModel):
     executions: list[ExecutionStatusResponse]
     total_count: int
@@ -64,15 +111,29 @@ class ExecutionListSummaryResponse(BaseModel):
     executions: list[ExecutionSummary]
     total_count: int
     limit: int
+    next_cursor: Optional[float] = None  # pass as `before` to fetch the next page
 
 
 # WebSocket message schemas
 class WebSocketMessage(BaseModel):
-    type: str  # execution_update, broadcast, error
+    type: str  # execution_snapshot, batch_case_update, broadcast, error
     execution_id: Optional[str] = None
     data: dict
 
 
+class ExecutionSnapshotMessage(WebSocketMessage):
+    type: str = "execution_snapshot"
+    version: int
+
+
+class ExecutionUpdateMessage(BaseModel):
+    type: str = "execution_update"
+    execution_id: str
+    base_version: int  # the version these changes apply on top of
+    version: int
+    changes: dict  # only the fields that changed
+
+
 # Firebase user schema
 class FirebaseUser(BaseModel):
     uid: str
@@ -87,3 +148,4 @@ class HealthResponse(BaseModel):
     timestamp: str
     service: str = "Code Execution Service"
     version: str = "1.0.0"
+    checks: Optional[dict] = None
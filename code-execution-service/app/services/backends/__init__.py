@@ -0,0 +1,5 @@
+from .base import ExecutionBackend
+from .http_api import HttpApiBackend
+from .local_sandbox import LocalSandboxBackend
+
+__all__ = ["ExecutionBackend", "HttpApiBackend", "LocalSandboxBackend"]
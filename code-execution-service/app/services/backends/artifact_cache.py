@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List
+
+from ...config import settings
+
+
+META_FILE = "meta.json"
+
+
+class ArtifactCache:
+    """On-disk cache of compilation results, keyed by source, compiler and command.
+
+    Each entry is a directory holding the files the compiler produced plus
+    meta.json with the compile run (exit code, stderr, timings), so compile
+    errors are cached as well. Entries are evicted least-recently-used once the
+    total size exceeds artifact_cache_max_mb. Concurrent compiles of the same key
+    in this process wait for the first one instead of compiling again.
+
+    Cached artifacts are run by later submissions, so the directory must be private
+    to the service: it is created 0700 and refused if anyone else can write to it.
+    Only regular files are stored; symlinks a compile leaves behind are skipped.
+    """
+
+    def __init__(self):
+        self.root = os.path.expanduser(settings.artifact_cache_dir)
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._lock_users: Dict[str, int] = {}
+        self._loaded = False
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def make_key(source: str, compiler: str, command: List[str]) -> str:
+        """Content address of one compilation"""
+        payload = json.dumps([compiler, command, source])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _ensure_root(self):
+        os.makedirs(self.root, mode=0o700, exist_ok=True)
+        info = os.lstat(self.root)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.geteuid() or info.st_mode & 0o022:
+            raise PermissionError(f"Artifact cache directory {self.root} is not private to this service")
+
+    def _load(self):
+        """Index existing entries, oldest first, so the LRU survives restarts"""
+        self._ensure_root()
+        entries = []
+        for key in os.listdir(self.root):
+            path = os.path.join(self.root, key)
+            if key.startswith(".") or not os.path.isfile(os.path.join(path, META_FILE)):
+                continue
+            entries.append((os.path.getmtime(path), key, self._dir_size(path)))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._loaded = True
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+    def lock(self, key: str) -> asyncio.Lock:
+        """Per-key lock so one compile serves every concurrent run of the same program;
+        every call must be paired with release_lock(key)"""
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        return self._locks[key]
+
+    def release_lock(self, key: str):
+        """Drop the lock once nobody holds or waits for it"""
+        users = self._lock_users.get(key, 0) - 1
+        if users > 0:
+            self._lock_users[key] = users
+            return
+        self._lock_users.pop(key, None)
+        self._locks.pop(key, None)
+
+    async def restore(self, key: str, destination: str) -> Optional[Dict[str, Any]]:
+        """Copy a cached entry's artifacts into destination; returns the compile run or None"""
+        if not settings.artifact_cache_enabled:
+            return None
+        if not self._loaded:
+            try:
+                await asyncio.to_thread(self._load)
+            except OSError as e:
+                print(f"Artifact cache unavailable: {e}")
+                return None
+        path = os.path.join(self.root, key)
+        try:
+            meta = await asyncio.to_thread(self._copy_out, path, destination)
+        except (OSError, ValueError):
+            # Missing, or evicted by another process meanwhile
+            self._forget(key)
+            self._misses += 1
+            return None
+
+        if key not in self._entries:
+            self._entries[key] = await asyncio.to_thread(self._dir_size, path)
+            self._total_bytes += self._entries[key]
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return meta["compile"]
+
+    @staticmethod
+    def _copy_out(path: str, destination: str) -> Dict[str, Any]:
+        with open(os.path.join(path, META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+        for name in meta["files"]:
+            shutil.copy2(os.path.join(path, name), os.path.join(destination, name))
+        os.utime(path)
+        return meta
+
+    async def store(self, key: str, scratch: str, exclude: List[str], compiled: Dict[str, Any]):
+        """Save the files a compile produced in scratch (plus its result) under key"""
+        if not settings.artifact_cache_enabled:
+            return
+        try:
+            size = await asyncio.to_thread(self._copy_in, key, scratch, exclude, compiled)
+        except OSError as e:
+            print(f"Artifact cache store error: {e}")
+            return
+        if size is None:
+            return
+        self._entries[key] = size
+        self._total_bytes += size
+        await self._evict()
+
+    @staticmethod
+    def _copy_regular(source: str, target: str) -> bool:
+        """Copy source if it is a regular file (never through a symlink), keeping its mode"""
+        try:
+            source_fd = os.open(source, os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK)
+        except OSError:
+            return False
+        with open(source_fd, "rb") as source_file:
+            mode = os.fstat(source_fd).st_mode
+            if not stat.S_ISREG(mode):
+                return False
+            target_fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, stat.S_IMODE(mode) & 0o755)
+            with open(target_fd, "wb") as target_file:
+                shutil.copyfileobj(source_file, target_file)
+        return True
+
+    def _copy_in(self, key: str, scratch: str, exclude: List[str], compiled: Dict[str, Any]) -> Optional[int]:
+        self._ensure_root()
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.root)
+        try:
+            files = []
+            for entry in os.scandir(scratch):
+                if entry.name in exclude or entry.name.startswith(".") or not entry.is_file(follow_symlinks=False):
+                    continue
+                if self._copy_regular(entry.path, os.path.join(staging, entry.name)):
+                    files.append(entry.name)
+            with open(os.path.join(staging, META_FILE), "w") as meta_file:
+                json.dump({"files": files, "compile": compiled}, meta_file)
+            size = self._dir_size(staging)
+            try:
+                os.rename(staging, os.path.join(self.root, key))
+            except OSError:
+                # Another process stored the same key first
+                return None
+            return size
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _forget(self, key: str):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    async def _evict(self):
+        """Drop least-recently-used entries until the cache fits its byte budget"""
+        max_bytes = settings.artifact_cache_max_mb * 1024 * 1024
+        while self._total_bytes > max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._evictions += 1
+            await asyncio.to_thread(shutil.rmtree, os.path.join(self.root, key), True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "enabled": settings.artifact_cache_enabled,
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": settings.artifact_cache_max_mb * 1024 * 1024,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "evictions": self._evictions,
+        }
@@ -0,0 +1,44 @@
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+
+# Receives (stream, text) with stream "stdout" or "stderr" while a program runs
+OutputCallback = Callable[[str, str], Awaitable[None]]
+
+
+class ExecutionBackend:
+    """Interface for services that actually run submitted code.
+    
+    execute() returns either {"status": "waiting", "message": ...} when the result
+    will arrive later through the webhook, or a finished result shaped like the
+    webhook payload: {"status": "completed" | "error", "output", "error_output",
+    "execution_time", "memory_usage"}, optionally with "cacheable": False when the
+    result depends on more than the submission (e.g. a wall-clock timeout on a busy
+    host). Backends that see output as it is produced pass it to on_output as well.
+    """
+    
+    name = "base"
+    
+    async def start(self):
+        """Acquire long-lived resources (called from the app lifespan hook)"""
+    
+    async def close(self):
+        """Release long-lived resources"""
+    
+    def supports(self, compiler: str) -> bool:
+        """Whether this backend can run the given compiler"""
+        raise NotImplementedError
+    
+    async def execute(
+        self,
+        execution_id: str,
+        code: str,
+        compiler: str,
+        input_data: str,
+        on_output: Optional[OutputCallback] = None
+    ) -> Dict[str, Any]:
+        """Run (or submit) one execution"""
+        raise NotImplementedError
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Backend-specific statistics"""
+        return {}
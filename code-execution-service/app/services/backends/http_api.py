@@ -0,0 +1,190 @@
+import asyncio
+import random
+import time
+import httpx
+from typing import Dict, Any, Optional
+
+from ...codec import codec
+from ...config import settings
+from ...metrics import UPSTREAM_REQUEST_LATENCY, UPSTREAM_RETRIES
+from ..http_client import upstream_http_client
+from ..circuit_breaker import upstream_circuit_breaker
+from .base import ExecutionBackend, OutputCallback
+
+
+# Failures before the request went out: the upstream never saw it
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Upstream responses refusing the request before processing it, so retrying is safe.
+# Gateway errors (502/504) are not among them: the submission may have been accepted
+# behind the gateway, and a retry would run (and bill) it twice, each with a webhook.
+NOT_PROCESSED_STATUS_CODES = (503,)
+
+
+def was_not_processed(error: Exception) -> bool:
+    """Whether a failed call certainly did not submit anything upstream"""
+    if isinstance(error, NOT_SENT_ERRORS):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+        return status_code < 500 or status_code in NOT_PROCESSED_STATUS_CODES
+    return False
+
+
+class HttpApiBackend(ExecutionBackend):
+    """Third-party HTTP execution API; results arrive inline or via the webhook"""
+    
+    name = "http"
+    
+    def __init__(self):
+        self.api_url = settings.code_execution_api_url
+        self.api_key = settings.code_execution_api_key
+        self.headers = {
+            "Accept": "*/*",
+            "Authorization": self.api_key,
+            "Content-Type": "application/json"
+        }
+        self.http_client = upstream_http_client
+    
+    async def start(self):
+        """Open the shared upstream HTTP client"""
+        await self.http_client.start()
+    
+    async def close(self):
+        """Close the shared upstream HTTP client"""
+        await self.http_client.close()
+    
+    def supports(self, compiler: str) -> bool:
+        return True
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Upstream HTTP connection pool statistics"""
+        return self.http_client.get_pool_stats()
+    
+    async def execute(
+        self,
+        execution_id: str,
+        code: str,
+        compiler: str,
+        input_data: str,
+        on_output: Optional[OutputCallback] = None
+    ) -> Dict[str, Any]:
+        """Submit code to the third-party API (output arrives whole through the webhook)"""
+        # Prepare request body based on third-party API requirements
+        body = {
+            "code": code,
+            "input": input_data,
+            "compiler": compiler,
+            "extra_params": {
+                "execution_id": execution_id,
+            }
+        }
+        
+        response = await self._post_upstream(body)
+        result = response.text.strip()
+        
+        # Check if response is simple "Ok" confirmation
+        if result.lower() in ["ok", "success", "submitted"]:
+            return {
+                "status": "waiting",
+                "message": "Code submitted successfully. Waiting for execution results via webhook."
+            }
+        
+        # If we get actual execution results immediately, parse them
+        try:
+            execution_result = self._parse_execution_result(codec.loads(result))
+            return {
+                "status": "completed",
+                "output": execution_result.get("output", ""),
+                "error_output": execution_result.get("error", ""),
+                "execution_time": execution_result.get("execution_time", ""),
+                "memory_usage": execution_result.get("memory_usage", ""),
+            }
+        except ValueError:
+            # If it's not JSON, treat as plain text output
+            return {"status": "completed", "output": result}
+    
+    async def _post_upstream(self, body: Dict[str, Any]) -> httpx.Response:
+        """POST to the third-party API behind the circuit breaker, retrying failures that
+        certainly submitted nothing (connect errors, 503) with bounded, jittered backoff
+        (or the upstream's Retry-After, if it fits within upstream_retry_max_delay)"""
+        probe = await upstream_circuit_breaker.before_call()
+        payload = codec.dumps_bytes(body)
+        compiler = body["compiler"]
+        attempt = 0
+        
+        while True:
+            started = time.perf_counter()
+            try:
+                # Each attempt is timed, labeled by HTTP status ("error" if no response)
+                with UPSTREAM_REQUEST_LATENCY.time(compiler=compiler) as timer:
+                    response = await self.http_client.post(
+                        self.api_url,
+                        headers=self.headers,
+                        content=payload
+                    )
+                    timer.set(outcome=str(response.status_code))
+                response.raise_for_status()
+            except httpx.PoolTimeout:
+                # Our own connection pool is exhausted; the upstream is not at fault,
+                # so this is neither retried nor counted by the shared breaker
+                await upstream_circuit_breaker.release_probe(probe)
+                raise
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.HTTPStatusError) as e:
+                retryable = was_not_processed(e) and (
+                    not isinstance(e, httpx.HTTPStatusError) or e.response.status_code in NOT_PROCESSED_STATUS_CODES
+                )
+                retry_after = self._retry_after(e)
+                if retry_after is not None and retry_after > settings.upstream_retry_max_delay:
+                    retryable = False
+                if retryable and attempt < settings.upstream_max_retries and not probe:
+                    if retry_after is None:
+                        # Full jitter: sleep uniformly up to the capped exponential delay
+                        delay = min(settings.upstream_retry_max_delay, settings.upstream_retry_base_delay * (2 ** attempt))
+                        retry_after = random.uniform(0, delay)
+                    attempt += 1
+                    UPSTREAM_RETRIES.inc(compiler=compiler)
+                    print(f"Upstream call failed ({e}); retry {attempt}/{settings.upstream_max_retries}")
+                    await asyncio.sleep(retry_after)
+                    continue
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500:
+                    # Client errors mean the upstream is up; they don't trip the breaker
+                    await upstream_circuit_breaker.record_success(probe)
+                else:
+                    await upstream_circuit_breaker.record_failure(probe)
+                raise
+            except Exception:
+                await upstream_circuit_breaker.record_failure(probe)
+                raise
+            
+            # Successful but slow calls still count against the breaker
+            if time.perf_counter() - started > settings.circuit_slow_call_threshold:
+                await upstream_circuit_breaker.record_failure(probe)
+            else:
+                await upstream_circuit_breaker.record_success(probe)
+            return response
+    
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        """Seconds from a Retry-After header (delay form only), if the response had one"""
+        if not isinstance(error, httpx.HTTPStatusError):
+            return None
+        try:
+            return max(float(error.response.headers.get("Retry-After", "")), 0.0)
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def may_have_submitted(error: Exception) -> bool:
+        """Whether a failed call may still have reached the upstream (so its result can
+        arrive by webhook): the request was sent but the response was lost, cut short or
+        replaced by a gateway error"""
+        return isinstance(error, (httpx.TransportError, httpx.HTTPStatusError)) and not was_not_processed(error)
+    
+    def _parse_execution_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Parse the execution result from third-party API"""
+        return {
+            "output": result.get("output", ""),
+            "error": result.get("error", ""),
+            "execution_time": result.get("cpuTime", ""),
+            "memory_usage": result.get("memory", "")
+        }
@@ -0,0 +1,440 @@
+import asyncio
+import codecs
+import json
+import os
+import pathlib
+import shutil
+import signal
+import sys
+import tempfile
+from typing import Dict, Any, Optional, List
+
+from ...config import settings
+from .base import ExecutionBackend, OutputCallback
+from .artifact_cache import ArtifactCache
+from .python_pool import WarmPythonPool, PoolExhaustedError
+from .workspace import create_workspace, remove_workspace
+
+
+LAUNCHER_PATH = str(pathlib.Path(__file__).with_name("sandbox_launcher.py"))
+
+# Private mount table (for the jail), no network, private PID/IPC/UTS spaces
+NAMESPACE_PREFIX = ["unshare", "--mount", "--net", "--pid", "--ipc", "--uts", "--fork"]
+# Without real root the namespaces are owned by a user namespace; the launcher still
+# drops to the sandbox uid inside it, so submissions never run as (mapped) root
+USER_NAMESPACE_FLAGS = ["--user", "--map-root-user"]
+
+# Run through the whole launcher at start-up: must be unprivileged (no uid 0, no
+# capabilities), unable to see the host filesystem (the launcher itself) or write the
+# toolchain, and able to use /sandbox
+ISOLATION_PROBE = [
+    "sh", "-c",
+    'test "$(id -u)" != 0 && grep -q "^CapEff:[[:space:]]*0*$" /proc/self/status && test ! -e "$1"'
+    ' && touch probe && ! touch /usr/.probe 2>/dev/null',
+    "probe", LAUNCHER_PATH,
+]
+
+# The same checks through a warm Python worker, whose children run submissions without
+# an exec, plus a chroot escape attempt (which needs CAP_SYS_CHROOT)
+POOL_ISOLATION_PROBE = f'''
+import os
+status = dict(line.split(":", 1) for line in open("/proc/self/status") if ":" in line)
+assert os.getuid() != 0, "runs as root"
+assert not any(int(status[name], 16) for name in ("CapInh", "CapPrm", "CapEff", "CapBnd", "CapAmb")), "capabilities left"
+assert not os.path.exists({LAUNCHER_PATH!r}), "host filesystem visible"
+try:
+    os.chroot("/tmp")
+except PermissionError:
+    pass
+else:
+    raise AssertionError("chroot allowed")
+open("probe", "w").close()
+try:
+    open("/usr/.probe", "w")
+except OSError:
+    pass
+else:
+    raise AssertionError("toolchain writable")
+'''
+
+# How each compiler (as named by CodeExecutionService._get_compiler_name) runs locally.
+# JVM reserves far more address space than it uses, so it is bounded by -Xmx instead.
+LOCAL_LANGUAGE_SPECS: Dict[str, Dict[str, Any]] = {
+    "python-3.9.7": {"source": "main.py", "run": ["python3", "-I", "-B", "main.py"]},
+    "python-2.7.18": {"source": "main.py", "run": ["python2", "-B", "main.py"]},
+    "gcc-4.9": {"source": "main.c", "compile": ["gcc", "-O2", "-o", "main", "main.c", "-lm"], "run": ["./main"]},
+    "g++-4.9": {"source": "main.cpp", "compile": ["g++", "-O2", "-o", "main", "main.cpp"], "run": ["./main"]},
+    "openjdk-11": {
+        "source": "Main.java",
+        "compile": ["javac", "-J-Xmx256m", "Main.java"],
+        "run": ["java", "-Xmx256m", "-Xss64m", "Main"],
+        "limit_address_space": False,
+    },
+    "php-8.1": {"source": "main.php", "run": ["php", "main.php"]},
+    "ruby-3.0.2": {"source": "main.rb", "run": ["ruby", "main.rb"]},
+    "haskell-9.2.7": {"source": "main.hs", "compile": ["ghc", "-O", "-o", "main", "main.hs"], "run": ["./main"]},
+}
+
+# Compiler served by the warm interpreter pool instead of a cold start per run
+POOLED_COMPILER = "python-3.9.7"
+
+
+class LocalSandboxBackend(ExecutionBackend):
+    """Runs submissions in local subprocesses under rlimits (CPU, memory, file size,
+    processes), a wall-clock timeout and an output cap, isolated in mount/net/PID
+    namespaces: each run sees a read-only toolchain, its own scratch directory on
+    tmpfs and nothing else of the host, as a dedicated unprivileged uid. If that
+    isolation does not work on this host the backend refuses to run (supports()
+    is False) unless local_sandbox_allow_unsafe is set. Results are reported
+    synchronously in the same shape as the webhook (CPU seconds and peak RSS in KB
+    from rusage).
+    Python 3 runs are dispatched to a pool of warm interpreters when enabled, and
+    compiled languages reuse cached artifacts so each program compiles once."""
+
+    name = "local"
+
+    def __init__(self):
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._namespace_prefix: Optional[List[str]] = None
+        self._jail: Optional[Dict[str, Any]] = None
+        self._isolated = False
+        self._available: Dict[str, bool] = {}
+        self._executions = 0
+        self._failures = 0
+        self._timeouts = 0
+        self._compilations = 0
+        self.python_pool = WarmPythonPool()
+        self.artifact_cache = ArtifactCache()
+
+    async def start(self):
+        """Check that the jail actually isolates runs on this host (only when routed here)"""
+        self._namespace_prefix = []
+        routed = settings.default_execution_backend == self.name or self.name in settings.execution_backend_routes.values()
+        if not routed:
+            return
+
+        reason = await self._probe_isolation()
+        if reason is None:
+            print(f"Local sandbox: isolated runs as uid {settings.local_sandbox_uid} ({self._jail['identity']})")
+        elif settings.local_sandbox_allow_unsafe:
+            self._namespace_prefix, self._jail = [], None
+            print(f"Local sandbox: NOT ISOLATED ({reason}); running with rlimits only (local_sandbox_allow_unsafe)")
+        else:
+            print(f"Local sandbox: isolation unavailable ({reason}); refusing to run submissions locally")
+            return
+
+        # Only keep warm interpreters around when Python is actually routed here
+        if settings.python_pool_enabled and not self.python_pool.started and self.supports(POOLED_COMPILER):
+            await self.python_pool.start(self._namespace_prefix, self._jail)
+            if self._jail and self.python_pool.started:
+                reason = await self._probe_pool()
+                if reason is not None:
+                    print(f"Warm Python pool: isolation probe failed ({reason}); using cold starts")
+                    await self.python_pool.stop()
+
+    async def _probe_pool(self) -> Optional[str]:
+        """Run POOL_ISOLATION_PROBE on a warm worker; returns why it failed, or None"""
+        try:
+            probe = await self.python_pool.run(
+                POOL_ISOLATION_PROBE,
+                "",
+                cpu_seconds=5,
+                wall_seconds=10,
+                memory_bytes=settings.local_sandbox_memory_mb * 1024 * 1024,
+                output_limit=settings.local_sandbox_output_limit,
+                max_processes=settings.local_sandbox_max_processes,
+            )
+        except Exception as e:
+            return str(e)
+        if probe["exit_code"] == 0:
+            return None
+        return probe["stderr"].strip().splitlines()[-1] if probe["stderr"].strip() else f"exit code {probe['exit_code']}"
+
+    async def _probe_isolation(self) -> Optional[str]:
+        """Run ISOLATION_PROBE in the jail; returns why isolation is unavailable, or None"""
+        if not settings.local_sandbox_use_namespaces:
+            return "local_sandbox_use_namespaces is off"
+        if not shutil.which(NAMESPACE_PREFIX[0]):
+            return f"{NAMESPACE_PREFIX[0]} not found"
+        root = os.geteuid() == 0
+        self._namespace_prefix = NAMESPACE_PREFIX[:1] + ([] if root else USER_NAMESPACE_FLAGS) + NAMESPACE_PREFIX[1:]
+        self._jail = {
+            "readonly_paths": settings.local_sandbox_readonly_paths,
+            "tmp_mb": settings.local_sandbox_tmp_mb,
+            "uid": settings.local_sandbox_uid,
+            "gid": settings.local_sandbox_gid,
+            "identity": "setuid" if root else "userns",
+        }
+        scratch, jail = create_workspace("probe-", self._jail)
+        try:
+            probe = await self.run_sandboxed(ISOLATION_PROBE, scratch, b"", jail=jail, wall_seconds=10)
+        finally:
+            remove_workspace(scratch, jail)
+        if probe["exit_code"] == 0:
+            self._isolated = True
+            return None
+        return probe["stderr"].strip() or f"probe exited with code {probe['exit_code']}"
+
+    @property
+    def usable(self) -> bool:
+        return self._isolated or settings.local_sandbox_allow_unsafe
+
+    async def close(self):
+        await self.python_pool.stop()
+
+    def supports(self, compiler: str) -> bool:
+        """Supported when runs are isolated (or explicitly allowed not to be), a spec
+        exists and its toolchain is installed"""
+        if not self.usable:
+            return False
+        if compiler not in self._available:
+            spec = LOCAL_LANGUAGE_SPECS.get(compiler)
+            available = spec is not None
+            if spec:
+                tools = [spec["run"][0]] + ([spec["compile"][0]] if "compile" in spec else [])
+                available = all(tool.startswith("./") or shutil.which(tool) for tool in tools)
+            self._available[compiler] = available
+        return self._available[compiler]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "executions": self._executions,
+            "failures": self._failures,
+            "timeouts": self._timeouts,
+            "isolated": self._isolated,
+            "identity": self._jail["identity"] if self._jail else None,
+            "max_concurrency": settings.local_sandbox_max_concurrency,
+            "compilations": self._compilations,
+            "python_pool": self.python_pool.get_stats(),
+            "artifact_cache": self.artifact_cache.get_stats(),
+        }
+
+    async def execute(
+        self,
+        execution_id: str,
+        code: str,
+        compiler: str,
+        input_data: str,
+        on_output: Optional[OutputCallback] = None
+    ) -> Dict[str, Any]:
+        """Compile (if needed) and run one submission in a fresh scratch directory"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(settings.local_sandbox_max_concurrency)
+        if self._namespace_prefix is None:
+            await self.start()
+        if not self.usable:
+            raise RuntimeError("Local sandbox isolation is unavailable")
+        spec = LOCAL_LANGUAGE_SPECS[compiler]
+
+        async with self._slots:
+            scratch, jail = create_workspace(f"exec-{execution_id[:8]}-", self._jail)
+            try:
+                pathlib.Path(scratch, spec["source"]).write_text(code)
+
+                if "compile" in spec:
+                    compiled = await self._compile(spec, compiler, code, scratch, jail)
+                    if compiled["exit_code"] != 0:
+                        self._failures += 1
+                        return self._to_result(compiled, error_prefix="Compilation failed\n")
+
+                if compiler == POOLED_COMPILER and self.python_pool.started:
+                    run = await self._run_pooled(code, input_data, on_output)
+                    if run is not None:
+                        self._executions += 1
+                        return self._to_result(run)
+
+                run = await self.run_sandboxed(
+                    spec["run"],
+                    scratch,
+                    (input_data or "").encode(),
+                    jail=jail,
+                    limit_address_space=spec.get("limit_address_space", True),
+                    on_output=on_output
+                )
+                self._executions += 1
+                return self._to_result(run)
+            finally:
+                remove_workspace(scratch, jail)
+
+    async def _compile(
+        self, spec: Dict[str, Any], compiler: str, code: str, scratch: str, jail: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Compile into scratch, reusing cached artifacts (or a cached compile error)"""
+        key = self.artifact_cache.make_key(code, compiler, spec["compile"])
+        try:
+            async with self.artifact_cache.lock(key):
+                cached = await self.artifact_cache.restore(key, scratch)
+                if cached is not None:
+                    return cached
+
+                compiled = await self.run_sandboxed(
+                    spec["compile"],
+                    scratch,
+                    b"",
+                    jail=jail,
+                    cpu_seconds=settings.local_sandbox_compile_seconds,
+                    wall_seconds=settings.local_sandbox_compile_seconds * 2,
+                    limit_address_space=False,
+                    file_size_bytes=settings.local_sandbox_artifact_limit_mb * 1024 * 1024
+                )
+                self._compilations += 1
+                # A timed-out compile may just mean the host was busy; don't pin it
+                if not compiled["timed_out"]:
+                    await self.artifact_cache.store(key, scratch, [spec["source"]], compiled)
+                return compiled
+        finally:
+            self.artifact_cache.release_lock(key)
+
+    async def _run_pooled(
+        self, code: str, input_data: str, on_output: Optional[OutputCallback] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Run on a warm interpreter (in its own scratch directory); None means fall back to a cold start"""
+        try:
+            return await self.python_pool.run(
+                code,
+                input_data or "",
+                cpu_seconds=settings.local_sandbox_cpu_seconds,
+                wall_seconds=settings.local_sandbox_wall_seconds,
+                memory_bytes=settings.local_sandbox_memory_mb * 1024 * 1024,
+                output_limit=settings.local_sandbox_output_limit,
+                max_processes=settings.local_sandbox_max_processes,
+                on_output=on_output
+            )
+        except PoolExhaustedError:
+            return None
+        except Exception as e:
+            print(f"Warm Python pool error, falling back to a cold start: {e}")
+            return None
+
+    def _to_result(self, run: Dict[str, Any], error_prefix: str = "") -> Dict[str, Any]:
+        """Shape a sandboxed run like the webhook result"""
+        notes = []
+        if run["timed_out"]:
+            self._timeouts += 1
+            notes.append("Time limit exceeded")
+        if run["truncated"]:
+            notes.append(f"Output limit exceeded ({settings.local_sandbox_output_limit} bytes)")
+        if run["signal"] is not None and not run["timed_out"]:
+            notes.append(f"Killed by signal {run['signal']}")
+        elif run["exit_code"] not in (0, None) and not (run["timed_out"] or run["truncated"]):
+            notes.append(f"Process exited with code {run['exit_code']}")
+
+        error_output = error_prefix + run["stderr"]
+        if notes:
+            error_output = (error_output.rstrip("\n") + "\n" if error_output else "") + "\n".join(notes)
+
+        failed = run["exit_code"] != 0 or run["timed_out"] or run["truncated"]
+        return {
+            "status": "error" if failed else "completed",
+            "output": run["stdout"],
+            "error_output": error_output,
+            "execution_time": f"{run['cpu_time']:.3f}",
+            "memory_usage": str(run["max_rss_kb"]),
+            # Timeouts and truncation depend on host load and limits, not just the submission
+            "cacheable": not (run["timed_out"] or run["truncated"]),
+        }
+
+    async def run_sandboxed(
+        self,
+        command: List[str],
+        cwd: str,
+        stdin: bytes,
+        jail: Optional[Dict[str, Any]] = None,
+        cpu_seconds: Optional[int] = None,
+        wall_seconds: Optional[float] = None,
+        limit_address_space: bool = True,
+        file_size_bytes: Optional[int] = None,
+        on_output: Optional[OutputCallback] = None
+    ) -> Dict[str, Any]:
+        """Run one command under the launcher (in jail, the workspace jail for cwd);
+        returns output, exit status and rusage. Output is also passed to on_output as
+        it is read."""
+        # Outside the scratch directory, where the command could plant a symlink
+        rusage_fd, rusage_path = tempfile.mkstemp(prefix="rusage-", suffix=".json", dir=settings.local_sandbox_scratch_dir)
+        os.close(rusage_fd)
+        limits = {
+            "cpu_seconds": cpu_seconds or settings.local_sandbox_cpu_seconds,
+            "memory_bytes": settings.local_sandbox_memory_mb * 1024 * 1024 if limit_address_space else 0,
+            "file_size_bytes": file_size_bytes or settings.local_sandbox_output_limit,
+            "max_processes": settings.local_sandbox_max_processes,
+            "rusage_path": rusage_path,
+            "jail": jail,
+        }
+        process = await asyncio.create_subprocess_exec(
+            *self._namespace_prefix,
+            sys.executable, "-I", LAUNCHER_PATH, json.dumps(limits), "--", *command,
+            cwd=cwd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env={"PATH": os.environ.get("PATH", "/usr/bin:/bin"), "HOME": "/sandbox" if jail else cwd, "LANG": "C.UTF-8"},
+            start_new_session=True,
+        )
+
+        limit = settings.local_sandbox_output_limit
+        truncated = False
+
+        def kill():
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+        async def feed_stdin():
+            try:
+                process.stdin.write(stdin)
+                await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                process.stdin.close()
+
+        async def read_capped(stream, name: str) -> bytes:
+            nonlocal truncated
+            buffer = bytearray()
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            while True:
+                chunk = await stream.read(65536)
+                if not chunk:
+                    break
+                if len(buffer) < limit:
+                    kept = chunk[:limit - len(buffer)]
+                    buffer.extend(kept)
+                    if on_output:
+                        await on_output(name, decoder.decode(kept))
+                if len(buffer) >= limit and not truncated:
+                    truncated = True
+                    kill()
+            return bytes(buffer)
+
+        timed_out = False
+        io = asyncio.gather(feed_stdin(), read_capped(process.stdout, "stdout"), read_capped(process.stderr, "stderr"))
+        try:
+            _, stdout, stderr = await asyncio.wait_for(
+                asyncio.shield(io), timeout=wall_seconds or settings.local_sandbox_wall_seconds
+            )
+        except asyncio.TimeoutError:
+            timed_out = True
+            kill()
+            _, stdout, stderr = await io
+        exit_code = await process.wait()
+
+        report = {"cpu_time": 0.0, "max_rss_kb": 0, "signal": None}
+        try:
+            report.update(json.loads(pathlib.Path(rusage_path).read_text()))
+        except (OSError, ValueError):
+            pass
+        os.unlink(rusage_path)
+
+        if report.get("signal") == signal.SIGXCPU:
+            timed_out = True
+        return {
+            "exit_code": exit_code,
+            "signal": report.get("signal"),
+            "stdout": stdout.decode("utf-8", errors="replace"),
+            "stderr": stderr.decode("utf-8", errors="replace"),
+            "truncated": truncated,
+            "timed_out": timed_out,
+            "cpu_time": report["cpu_time"],
+            "max_rss_kb": report["max_rss_kb"],
+        }
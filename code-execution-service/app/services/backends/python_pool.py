@@ -0,0 +1,291 @@
+import asyncio
+import codecs
+import json
+import os
+import pathlib
+import shutil
+import signal
+import time
+from typing import Dict, Any, Optional, List, Set
+
+from ...config import settings
+from .base import OutputCallback
+from .workspace import create_workspace, remove_workspace, clear_directory
+
+
+WORKER_PATH = str(pathlib.Path(__file__).with_name("python_worker.py"))
+
+
+class _OutputTail:
+    """Follows the files a pooled run writes its stdout/stderr to"""
+
+    STREAMS = (("stdout", ".stdout"), ("stderr", ".stderr"))
+
+    def __init__(self, scratch: str, on_output: OutputCallback):
+        self.scratch = scratch
+        self.on_output = on_output
+        self._offsets = {name: 0 for name, _ in self.STREAMS}
+        self._decoders = {name: codecs.getincrementaldecoder("utf-8")(errors="replace") for name, _ in self.STREAMS}
+        self._stopped = asyncio.Event()
+
+    async def drain(self):
+        """Forward whatever was written since the last call"""
+        for name, filename in self.STREAMS:
+            try:
+                path = os.path.join(self.scratch, filename)
+                with open(os.open(path, os.O_RDONLY | os.O_NOFOLLOW), "rb") as output:
+                    output.seek(self._offsets[name])
+                    data = output.read()
+            except OSError:
+                continue
+            if data:
+                self._offsets[name] += len(data)
+                await self.on_output(name, self._decoders[name].decode(data))
+
+    async def follow(self):
+        """Drain periodically until stop(); never interrupted half-way through a drain"""
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=settings.output_stream_flush_interval)
+            except asyncio.TimeoutError:
+                await self.drain()
+
+    def stop(self):
+        self._stopped.set()
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no warm worker became free within python_pool_acquire_timeout"""
+
+
+class _PythonWorker:
+    """One pre-started interpreter running python_worker.py in its own scratch directory"""
+
+    def __init__(self, process: asyncio.subprocess.Process, scratch: str, jail: Optional[Dict[str, Any]]):
+        self.process = process
+        self.scratch = scratch
+        self.jail = jail
+        self.runs = 0
+        self.started_at = time.monotonic()
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    async def close(self):
+        self.kill()
+        await self.process.wait()
+        remove_workspace(self.scratch, self.jail)
+
+
+class WarmPythonPool:
+    """Pool of pre-started, sandboxed Python interpreters (forkserver-style).
+
+    Each worker is launched once under the sandbox namespaces, builds the jail
+    around its own scratch directory and forks a child per submission, so
+    dispatch skips interpreter start-up entirely. Workers are
+    recycled after python_pool_max_runs_per_worker runs, and immediately when a
+    run leaves processes behind, times out, or the worker misbehaves.
+    """
+
+    def __init__(self):
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: List[_PythonWorker] = []
+        self._tasks: Set[asyncio.Task] = set()
+        self._namespace_prefix: List[str] = []
+        self._jail: Optional[Dict[str, Any]] = None
+        self._interpreter: Optional[str] = None
+        self._runs = 0
+        self._recycled = 0
+        self._exhausted = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._dispatch_total = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._idle is not None
+
+    async def start(self, namespace_prefix: List[str], jail: Optional[Dict[str, Any]]):
+        """Pre-start python_pool_size workers"""
+        interpreter = shutil.which("python3")
+        if not interpreter:
+            print("Warm Python pool: python3 not found, pool disabled")
+            return
+        self._interpreter = os.path.realpath(interpreter)
+        # Forked children keep importing after entering the jail, so the interpreter must live in it
+        if jail and not any(
+            self._interpreter.startswith(path.rstrip("/") + "/") for path in jail["readonly_paths"]
+        ):
+            print(f"Warm Python pool: {self._interpreter} is outside the sandbox jail, pool disabled")
+            return
+        self._namespace_prefix = namespace_prefix
+        self._jail = jail
+        try:
+            workers = await asyncio.gather(*[self._spawn() for _ in range(settings.python_pool_size)])
+        except Exception as e:
+            print(f"Warm Python pool: failed to start, using cold starts ({e})")
+            await self.stop()
+            return
+        self._idle = asyncio.Queue()
+        for worker in workers:
+            self._idle.put_nowait(worker)
+        print(f"Warm Python pool started with {settings.python_pool_size} workers")
+
+    async def stop(self):
+        """Kill all workers"""
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = set()
+        for worker in self._workers:
+            await worker.close()
+        self._workers = []
+        self._idle = None
+
+    async def _spawn(self) -> _PythonWorker:
+        """Start a worker and wait until its interpreter is warm"""
+        scratch, jail = create_workspace("pool-", self._jail)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self._namespace_prefix,
+                self._interpreter, "-I", "-B", WORKER_PATH, json.dumps({"jail": jail}),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                env={"PATH": os.environ.get("PATH", "/usr/bin:/bin"), "LANG": "C.UTF-8", "HOME": "/sandbox" if jail else scratch},
+                start_new_session=True,
+                # A result line holds both streams JSON-escaped (up to 6 bytes per byte)
+                limit=settings.local_sandbox_output_limit * 12 + 65536,
+            )
+        except OSError:
+            remove_workspace(scratch, jail)
+            raise
+        worker = _PythonWorker(process, scratch, jail)
+        self._workers.append(worker)
+        try:
+            ready = await asyncio.wait_for(process.stdout.readline(), timeout=30)
+            if not json.loads(ready).get("ready"):
+                raise ValueError(f"unexpected greeting {ready!r}")
+        except (asyncio.TimeoutError, ValueError) as e:
+            self._workers.remove(worker)
+            await worker.close()
+            raise RuntimeError(f"Warm Python worker did not start: {e}")
+        return worker
+
+    async def _recycle(self, worker: _PythonWorker):
+        """Replace a worker with a fresh one (off the request path)"""
+        self._workers.remove(worker)
+        self._recycled += 1
+        try:
+            await worker.close()
+            replacement = await self._spawn()
+        except Exception as e:
+            print(f"Warm Python pool: failed to replace worker: {e}")
+            return
+        if self._idle is None:
+            await replacement.close()
+        else:
+            self._idle.put_nowait(replacement)
+
+    async def run(
+        self,
+        code: str,
+        input_data: str,
+        cpu_seconds: int,
+        wall_seconds: float,
+        memory_bytes: int,
+        output_limit: int,
+        max_processes: int,
+        on_output: Optional[OutputCallback] = None
+    ) -> Dict[str, Any]:
+        """Run one submission on a warm worker; same result shape as run_sandboxed.
+        With on_output, the run's output files are followed while it executes."""
+        wait_started = time.monotonic()
+        try:
+            worker = await asyncio.wait_for(self._idle.get(), timeout=settings.python_pool_acquire_timeout)
+        except asyncio.TimeoutError:
+            self._exhausted += 1
+            raise PoolExhaustedError("No warm Python worker available")
+        queue_wait = time.monotonic() - wait_started
+        self._queue_wait_total += queue_wait
+        self._queue_wait_max = max(self._queue_wait_max, queue_wait)
+
+        job = {
+            "code": code,
+            "scratch": worker.scratch,
+            "input_path": os.path.join(worker.scratch, ".stdin"),
+            "wall_seconds": wall_seconds,
+            "output_limit": output_limit,
+            "limits": {
+                "cpu_seconds": cpu_seconds,
+                "memory_bytes": memory_bytes,
+                "file_size_bytes": output_limit,
+                "max_processes": max_processes,
+            },
+        }
+        dispatched = time.monotonic()
+        result = None
+        tail = _OutputTail(worker.scratch, on_output) if on_output else None
+        tail_task = None
+        try:
+            # Whatever the previous run left behind goes before this one's input is written
+            clear_directory(worker.scratch)
+            input_fd = os.open(job["input_path"], os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o644)
+            with open(input_fd, "w") as input_file:
+                input_file.write(input_data)
+            tail_task = asyncio.create_task(tail.follow()) if tail else None
+            if worker.alive:
+                worker.process.stdin.write(json.dumps(job).encode() + b"\n")
+                await worker.process.stdin.drain()
+                line = await asyncio.wait_for(worker.process.stdout.readline(), timeout=wall_seconds + 5)
+                result = json.loads(line) if line else None
+        except (asyncio.TimeoutError, OSError, ValueError) as e:
+            print(f"Warm Python worker failed: {e}")
+        finally:
+            if tail_task:
+                tail.stop()
+                await asyncio.gather(tail_task, return_exceptions=True)
+                # The output files are the worker's own: read the rest before it takes another job
+                if result is not None:
+                    await asyncio.gather(tail.drain(), return_exceptions=True)
+            worker.runs += 1
+            self._runs += 1
+            self._dispatch_total += time.monotonic() - dispatched
+
+            contaminated = (
+                result is None
+                or "worker_error" in result
+                or result.get("timed_out")
+                or result.get("leftover_processes")
+            )
+            if contaminated or worker.runs >= settings.python_pool_max_runs_per_worker:
+                self._tasks.add(asyncio.create_task(self._recycle(worker)))
+                self._tasks = {task for task in self._tasks if not task.done()}
+            else:
+                self._idle.put_nowait(worker)
+
+        if result is None or "worker_error" in result:
+            raise RuntimeError(f"Warm Python worker error: {(result or {}).get('worker_error', 'no result')}")
+        result["queue_wait"] = queue_wait
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        idle = self._idle.qsize() if self._idle is not None else 0
+        return {
+            "enabled": self.started,
+            "size": settings.python_pool_size,
+            "idle": idle,
+            "busy": len(self._workers) - idle,
+            "runs": self._runs,
+            "recycled": self._recycled,
+            "exhausted": self._exhausted,
+            "max_runs_per_worker": settings.python_pool_max_runs_per_worker,
+            "avg_queue_wait_ms": round(self._queue_wait_total / self._runs * 1000, 3) if self._runs else 0.0,
+            "max_queue_wait_ms": round(self._queue_wait_max * 1000, 3),
+            "avg_dispatch_ms": round(self._dispatch_total / self._runs * 1000, 3) if self._runs else 0.0,
+        }
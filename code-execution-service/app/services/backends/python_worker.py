@@ -0,0 +1,184 @@
+"""Warm Python worker: a pre-started interpreter that runs submissions in forked children.
+
+Executed by path (not imported) so it stays independent of the app settings.
+Announces {"ready": true} once warm, then reads one JSON job per line on stdin
+and writes one JSON result per line on stdout:
+
+    job:    {"code", "scratch", "input_path", "limits": {...}, "wall_seconds", "output_limit"}
+    result: {"exit_code", "signal", "stdout", "stderr", "truncated", "timed_out",
+             "cpu_time", "max_rss_kb", "leftover_processes"}
+
+Each job runs in a fork of this process, so the interpreter and its imports are
+already warm and the worker itself never executes user code. Started with a
+'{"jail": {...}}' argument (see sandbox_launcher.py), the worker builds the jail
+around its scratch directory once and every child enters it before running.
+"""
+import json
+import os
+import select
+import signal
+import sys
+import time
+import traceback
+
+# Warm commonly used stdlib modules once; forked children inherit them
+import collections, functools, itertools, math, random, re, string  # noqa: E401,F401
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sandbox_launcher import apply_limits, build_jail, enter_jail  # noqa: E402
+
+
+def run_child(job, stdout_path, stderr_path, jail):
+    """Runs in the forked child: redirect stdio, enter the jail, apply limits, execute the code"""
+    exit_code = 0
+    try:
+        os.setsid()
+        os.chdir(job["scratch"])
+        # Opened before entering the jail; never through a symlink left in the scratch directory
+        for fd, path, flags in (
+            (0, job["input_path"], os.O_RDONLY | os.O_NOFOLLOW),
+            (1, stdout_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW),
+            (2, stderr_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW),
+        ):
+            target = os.open(path, flags, 0o644)
+            os.dup2(target, fd)
+            os.close(target)
+        if jail:
+            enter_jail(jail)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False)
+        sys.stderr = open(2, "w", closefd=False)
+        sys.argv = ["main.py"]
+        signal.signal(signal.SIGXFSZ, signal.SIG_DFL)
+        apply_limits(job["limits"])
+
+        code = compile(job["code"], "main.py", "exec")
+        exec(code, {"__name__": "__main__", "__builtins__": __builtins__})
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            sys.stderr.write(f"{e.code}\n")
+            exit_code = 1
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except BaseException:
+            pass
+        os._exit(exit_code & 0xFF)
+
+
+def wait_child(pid, wall_seconds):
+    """Wait for the child up to the wall-clock limit; returns (status, rusage, timed_out)"""
+    deadline = time.monotonic() + wall_seconds
+    pidfd = os.pidfd_open(pid) if hasattr(os, "pidfd_open") else None
+    try:
+        while True:
+            waited, status, usage = os.wait4(pid, os.WNOHANG)
+            if waited:
+                return status, usage, False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                _, status, usage = os.wait4(pid, 0)
+                return status, usage, True
+            if pidfd is not None:
+                select.select([pidfd], [], [], remaining)
+            else:
+                time.sleep(min(remaining, 0.001))
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+
+
+def reap_leftovers(pgid, jail):
+    """Kill anything the submission left running in its process group (in a jail, where
+    this worker is init of its PID namespace, anything at all) and reap orphans
+    re-parented to this worker; returns how many were found"""
+    found = 0
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+        found += 1
+    except ProcessLookupError:
+        pass
+    if jail:
+        try:
+            os.kill(-1, signal.SIGKILL)
+            found += 1
+        except ProcessLookupError:
+            pass
+    while True:
+        try:
+            waited, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if not waited:
+            break
+        found += 1
+    return found
+
+
+def read_limited(path, limit):
+    try:
+        with open(os.open(path, os.O_RDONLY | os.O_NOFOLLOW), "rb") as output:
+            data = output.read(limit + 1)
+    except OSError:
+        return "", False
+    return data[:limit].decode("utf-8", errors="replace"), len(data) > limit
+
+
+def handle(job, jail):
+    stdout_path = os.path.join(job["scratch"], ".stdout")
+    stderr_path = os.path.join(job["scratch"], ".stderr")
+
+    pid = os.fork()
+    if pid == 0:
+        run_child(job, stdout_path, stderr_path, jail)
+
+    status, usage, timed_out = wait_child(pid, job["wall_seconds"])
+    leftovers = reap_leftovers(pid, jail)
+    limit = job["output_limit"]
+    stdout, stdout_truncated = read_limited(stdout_path, limit)
+    stderr, stderr_truncated = read_limited(stderr_path, limit)
+    signal_number = os.WTERMSIG(status) if os.WIFSIGNALED(status) else None
+
+    return {
+        "exit_code": os.WEXITSTATUS(status) if os.WIFEXITED(status) else -(signal_number or 0),
+        "signal": signal_number,
+        "stdout": stdout,
+        "stderr": stderr,
+        "truncated": stdout_truncated or stderr_truncated or signal_number == signal.SIGXFSZ,
+        "timed_out": timed_out or signal_number == signal.SIGXCPU,
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        "max_rss_kb": usage.ru_maxrss,
+        "leftover_processes": leftovers,
+    }
+
+
+def main():
+    config = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
+    jail = config.get("jail")
+    if jail:
+        build_jail(jail)
+    sys.stdout.write(json.dumps({"ready": True}) + "\n")
+    sys.stdout.flush()
+    for line in sys.stdin:
+        try:
+            result = handle(json.loads(line), jail)
+        except Exception as e:
+            result = {"worker_error": f"{type(e).__name__}: {e}"}
+        sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
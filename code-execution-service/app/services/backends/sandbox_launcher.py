@@ -0,0 +1,228 @@
+"""Sandbox launcher: builds the filesystem jail, applies resource limits, runs one
+command as the sandbox identity and reports rusage.
+
+Executed by path (not imported) so it stays independent of the app settings:
+
+    python sandbox_launcher.py '<config json>' -- <command> [args...]
+
+stdin/stdout/stderr are inherited by the command. On exit the command's CPU
+time, peak RSS and exit status are written as JSON to config["rusage_path"].
+
+With config["jail"] ({"root", "scratch", "readonly_paths", "tmp_mb", "uid", "gid",
+"identity"}) the launcher must run as root of fresh mount/PID/network namespaces
+(see LocalSandboxBackend). The command then sees only the read-only toolchain
+paths, its scratch directory at /sandbox and private /tmp, /dev and /proc, and
+runs as the unprivileged uid: set with setuid() when the service is real root
+("setuid"), or through a nested user namespace mapping that uid onto the
+namespace root otherwise ("userns"). Either way every capability (bounding set
+included) is dropped and no_new_privs set before anything else runs, which
+matters for python_worker.py: it reuses build_jail() and enter_jail() and then
+runs the submission in the same process, without an exec.
+"""
+import ctypes
+import json
+import os
+import resource
+import signal
+import sys
+
+
+SANDBOX_DIR = "/sandbox"
+DEVICES = ("null", "zero", "random", "urandom")
+
+MS_RDONLY = 0x1
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_REMOUNT = 0x20
+MS_NOATIME = 0x400
+MS_NODIRATIME = 0x800
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+MS_RELATIME = 0x200000
+ST_RELATIME = 0x1000
+CLONE_NEWUSER = 0x10000000
+PR_CAPBSET_DROP = 24
+PR_SET_NO_NEW_PRIVS = 38
+LINUX_CAPABILITY_VERSION_3 = 0x20080522
+CAPABILITY_FIELDS = ("CapInh", "CapPrm", "CapEff", "CapBnd", "CapAmb")
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+def _call(function, *args):
+    if function(*args) != 0:
+        error = ctypes.get_errno()
+        raise OSError(error, f"{function.__name__}{args}: {os.strerror(error)}")
+
+
+def mount(source, target, fstype=None, flags=0, data=None):
+    encode = lambda value: value.encode() if value is not None else None  # noqa: E731
+    _call(_libc.mount, encode(source), encode(target), encode(fstype), ctypes.c_ulong(flags), encode(data))
+
+
+def bind_readonly(source, target):
+    """Bind source onto target read-only, keeping the flags the kernel locks in user namespaces"""
+    mount(source, target, flags=MS_BIND | MS_REC)
+    current = os.statvfs(source).f_flag
+    flags = MS_BIND | MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV
+    flags |= current & (MS_NOEXEC | MS_NOATIME | MS_NODIRATIME)
+    if current & ST_RELATIME:
+        flags |= MS_RELATIME
+    mount(None, target, flags=flags)
+
+
+def build_jail(jail):
+    """Assemble the jail's root (a small tmpfs) at jail["root"]; needs namespace root"""
+    root = jail["root"]
+    mount(None, "/", flags=MS_REC | MS_PRIVATE)
+    mount("tmpfs", root, "tmpfs", MS_NOSUID | MS_NODEV, "size=1m,mode=0755")
+
+    for path in jail["readonly_paths"]:
+        if not os.path.lexists(path):
+            continue
+        target = root + path
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.islink(path):
+            os.symlink(os.readlink(path), target)
+            continue
+        if os.path.isdir(path):
+            os.makedirs(target, exist_ok=True)
+        else:
+            open(target, "w").close()
+        bind_readonly(path, target)
+
+    sandbox = root + SANDBOX_DIR
+    os.makedirs(sandbox)
+    mount(jail["scratch"], sandbox, flags=MS_BIND)
+    mount(None, sandbox, flags=MS_BIND | MS_REMOUNT | MS_NOSUID | MS_NODEV)
+
+    os.makedirs(root + "/tmp")
+    mount("tmpfs", root + "/tmp", "tmpfs", MS_NOSUID | MS_NODEV, f"size={int(jail['tmp_mb'])}m,mode=1777")
+
+    os.makedirs(root + "/dev")
+    mount("tmpfs", root + "/dev", "tmpfs", MS_NOSUID | MS_NOEXEC, "size=64k,mode=0755")
+    for device in DEVICES:
+        open(f"{root}/dev/{device}", "w").close()
+        mount(f"/dev/{device}", f"{root}/dev/{device}", flags=MS_BIND)
+
+    os.makedirs(root + "/proc")
+    mount("proc", root + "/proc", "proc", MS_NOSUID | MS_NODEV | MS_NOEXEC)
+
+    # Nothing but the mounts above is writable
+    mount(None, root, flags=MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV)
+
+
+class _CapHeader(ctypes.Structure):
+    _fields_ = [("version", ctypes.c_uint32), ("pid", ctypes.c_int)]
+
+
+class _CapData(ctypes.Structure):
+    _fields_ = [("effective", ctypes.c_uint32), ("permitted", ctypes.c_uint32), ("inheritable", ctypes.c_uint32)]
+
+
+def drop_bounding_set():
+    """Remove every capability from the bounding set (needs CAP_SETPCAP, so before setuid)"""
+    with open("/proc/sys/kernel/cap_last_cap") as last_cap:
+        for capability in range(int(last_cap.read()) + 1):
+            _call(_libc.prctl, PR_CAPBSET_DROP, ctypes.c_ulong(capability), ctypes.c_ulong(0), ctypes.c_ulong(0), ctypes.c_ulong(0))
+
+
+def drop_capabilities():
+    """Clear the effective/permitted/inheritable sets (ambient follows), set no_new_privs
+    and verify from /proc that nothing is left"""
+    header = _CapHeader(LINUX_CAPABILITY_VERSION_3, 0)
+    data = (_CapData * 2)()
+    _call(_libc.capset, ctypes.byref(header), data)
+    _call(_libc.prctl, PR_SET_NO_NEW_PRIVS, ctypes.c_ulong(1), ctypes.c_ulong(0), ctypes.c_ulong(0), ctypes.c_ulong(0))
+    with open("/proc/self/status") as status:
+        fields = dict(line.split(":", 1) for line in status if ":" in line)
+    left = {name: fields[name].strip() for name in CAPABILITY_FIELDS if int(fields.get(name, "0"), 16)}
+    if left:
+        raise OSError(f"capabilities left after dropping them: {left}")
+
+
+def enter_jail(jail):
+    """Switch to the jail root as the unprivileged sandbox uid/gid with no capabilities
+    (safe to run untrusted code in this very process afterwards)"""
+    uid, gid = int(jail["uid"]), int(jail["gid"])
+    if jail["identity"] == "setuid":
+        os.chroot(jail["root"])
+        os.chdir(SANDBOX_DIR)
+        drop_bounding_set()
+        os.setgroups([])
+        os.setgid(gid)
+        os.setuid(uid)
+        drop_capabilities()
+        return
+    # Namespace root is the service's own uid: map the sandbox uid onto it in a child user
+    # namespace (created before chroot, which the kernel requires) and chroot from there.
+    # Creating the namespace grants a full capability set in it, which must not survive.
+    _call(_libc.unshare, CLONE_NEWUSER)
+    for name, content in (("setgroups", "deny"), ("uid_map", f"{uid} 0 1"), ("gid_map", f"{gid} 0 1")):
+        with open(f"/proc/self/{name}", "w") as mapping:
+            mapping.write(content)
+    os.chroot(jail["root"])
+    os.chdir(SANDBOX_DIR)
+    drop_bounding_set()
+    drop_capabilities()
+
+
+def apply_limits(limits):
+    if limits.get("cpu_seconds"):
+        cpu = int(limits["cpu_seconds"])
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    if limits.get("memory_bytes"):
+        memory = int(limits["memory_bytes"])
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    if limits.get("file_size_bytes"):
+        size = int(limits["file_size_bytes"])
+        resource.setrlimit(resource.RLIMIT_FSIZE, (size, size))
+    if limits.get("max_processes"):
+        processes = int(limits["max_processes"])
+        resource.setrlimit(resource.RLIMIT_NPROC, (processes, processes))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+
+def main():
+    limits = json.loads(sys.argv[1])
+    command = sys.argv[sys.argv.index("--") + 1:]
+    jail = limits.get("jail")
+
+    if jail:
+        try:
+            build_jail(jail)
+        except OSError as e:
+            sys.stderr.write(f"sandbox: failed to build the jail: {e}\n")
+            sys.exit(125)
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            if jail:
+                enter_jail(jail)
+            apply_limits(limits)
+            os.execvp(command[0], command)
+        except Exception as e:
+            sys.stderr.write(f"sandbox: failed to start {command[0]}: {e}\n")
+        os._exit(127)
+
+    _, status, usage = os.wait4(pid, 0)
+    report = {
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        "max_rss_kb": usage.ru_maxrss,
+        "exit_code": os.WEXITSTATUS(status) if os.WIFEXITED(status) else None,
+        "signal": os.WTERMSIG(status) if os.WIFSIGNALED(status) else None,
+    }
+    with open(limits["rusage_path"], "w") as report_file:
+        json.dump(report, report_file)
+
+    if report["signal"] is not None:
+        sys.exit(128 + report["signal"])
+    sys.exit(report["exit_code"])
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+    main()
@@ -0,0 +1,36 @@
+import os
+import shutil
+import tempfile
+from typing import Dict, Any, Optional, Tuple
+
+from ...config import settings
+
+
+def create_workspace(prefix: str, jail: Optional[Dict[str, Any]]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Create a scratch directory for sandboxed runs; returns it with the jail config for it
+    (the base jail plus an empty sibling directory the jail root is mounted on), or None
+    when running without isolation"""
+    scratch = tempfile.mkdtemp(prefix=prefix, dir=settings.local_sandbox_scratch_dir)
+    if jail is None:
+        return scratch, None
+    root = scratch + ".jail"
+    os.mkdir(root, 0o700)
+    if jail["identity"] == "setuid":
+        os.chown(scratch, jail["uid"], jail["gid"])
+    return scratch, {**jail, "root": root, "scratch": scratch}
+
+
+def remove_workspace(scratch: str, jail: Optional[Dict[str, Any]]):
+    shutil.rmtree(scratch, ignore_errors=True)
+    if jail is not None:
+        # The jail's mounts lived in the run's own mount namespace; only the empty mountpoint is left
+        shutil.rmtree(jail["root"], ignore_errors=True)
+
+
+def clear_directory(path: str):
+    """Remove everything in path without following symlinks a submission may have left"""
+    for entry in os.scandir(path):
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            os.unlink(entry.path)
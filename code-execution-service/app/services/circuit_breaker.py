@@ -0,0 +1,128 @@
+import time
+import uuid
+from typing import Dict, Any
+
+from ..config import settings
+from ..database import redis_manager
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open"""
+
+
+class CircuitBreaker:
+    """Circuit breaker whose state lives in Redis so every worker trips together.
+
+    closed:    calls pass; failures (errors or slow calls) are counted over a sliding
+               window of the last circuit_failure_window seconds (a sorted set of
+               failure timestamps) and the circuit opens at circuit_failure_threshold.
+    open:      calls fail fast until circuit_open_seconds have elapsed.
+    half_open: one probe call at a time is let through; success closes the
+               circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state_key = f"circuit:{name}:state"
+        self.cooldown_key = f"circuit:{name}:cooldown"
+        self.failures_key = f"circuit:{name}:failure_times"
+        self.probe_key = f"circuit:{name}:probe"
+
+    async def before_call(self) -> bool:
+        """Admit a call or raise CircuitOpenError; returns True if the call is a probe"""
+        try:
+            redis_client = await redis_manager.get_redis()
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(self.state_key)
+                pipe.exists(self.cooldown_key)
+                state, cooling_down = await pipe.execute()
+        except Exception as e:
+            # Fail open: without Redis we cannot share state, so let calls through
+            print(f"Circuit breaker {self.name} state error: {e}")
+            return False
+
+        if state != "open":
+            return False
+        if cooling_down:
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+
+        # Half-open: only one probe in flight across all workers
+        probe_ms = int(settings.upstream_read_timeout * 1000) + 1000
+        try:
+            acquired = await redis_client.set(self.probe_key, "1", nx=True, px=probe_ms)
+        except Exception as e:
+            print(f"Circuit breaker {self.name} probe error: {e}")
+            return False
+        if acquired:
+            return True
+        raise CircuitOpenError(f"Circuit '{self.name}' is half-open; probe in progress")
+
+    async def record_success(self, probe: bool):
+        """Close the circuit after a successful probe"""
+        if not probe:
+            return
+        try:
+            redis_client = await redis_manager.get_redis()
+            await redis_client.delete(self.state_key, self.failures_key, self.probe_key)
+            print(f"Circuit '{self.name}' closed")
+        except Exception as e:
+            print(f"Circuit breaker {self.name} record error: {e}")
+
+    async def release_probe(self, probe: bool):
+        """Give up a probe without an outcome (the call never reached the upstream)"""
+        if not probe:
+            return
+        try:
+            redis_client = await redis_manager.get_redis()
+            await redis_client.delete(self.probe_key)
+        except Exception as e:
+            print(f"Circuit breaker {self.name} record error: {e}")
+
+    async def record_failure(self, probe: bool):
+        """Count a failure; open the circuit at the threshold or when a probe fails"""
+        try:
+            redis_client = await redis_manager.get_redis()
+            if not probe:
+                now = time.time()
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    pipe.zremrangebyscore(self.failures_key, "-inf", now - settings.circuit_failure_window)
+                    pipe.zadd(self.failures_key, {uuid.uuid4().hex: now})
+                    pipe.zcard(self.failures_key)
+                    pipe.expire(self.failures_key, settings.circuit_failure_window)
+                    _, _, failures, _ = await pipe.execute()
+                if failures < settings.circuit_failure_threshold:
+                    return
+
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.set(self.state_key, "open")
+                pipe.set(self.cooldown_key, "1", ex=settings.circuit_open_seconds)
+                pipe.delete(self.failures_key, self.probe_key)
+                await pipe.execute()
+            print(f"Circuit '{self.name}' opened for {settings.circuit_open_seconds}s")
+        except Exception as e:
+            print(f"Circuit breaker {self.name} record error: {e}")
+
+    async def get_state(self) -> Dict[str, Any]:
+        """Current breaker state for health reporting"""
+        redis_client = await redis_manager.get_redis()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.get(self.state_key)
+            pipe.ttl(self.cooldown_key)
+            pipe.zcount(self.failures_key, time.time() - settings.circuit_failure_window, "+inf")
+            state, cooldown_ttl, failures = await pipe.execute()
+
+        if state != "open":
+            current = "closed"
+        elif cooldown_ttl and cooldown_ttl > 0:
+            current = "open"
+        else:
+            current = "half_open"
+        return {
+            "state": current,
+            "recent_failures": int(failures or 0),
+            "retry_in_seconds": max(cooldown_ttl or 0, 0) if current == "open" else 0,
+        }
+
+
+# Circuit breaker guarding the third-party execution API
+upstream_circuit_breaker = CircuitBreaker("upstream")
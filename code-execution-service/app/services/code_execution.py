@@ -1,58 +1,95 @@
-import httpx
-import json
-import uuid
 import asyncio
+import time
+import uuid
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
 
+from ..codec import codec
 from ..config import settings
-from ..database import redis_manager
+from ..database import redis_manager, TERMINAL_STATUSES, TRANSPORT_ERROR_SOURCE
+from ..metrics import (
+    SUBMISSION_LATENCY, IMMEDIATE_POLLS, IMMEDIATE_WAIT, WEBHOOK_TO_COMPLETION
+)
+from .result_cache import result_cache
+from .job_queue import job_queue
+from .webhook_queue import webhook_queue
+from .output_stream import output_streamer
+from .websocket import websocket_manager
+from .circuit_breaker import CircuitOpenError
+from .backends import ExecutionBackend, HttpApiBackend, LocalSandboxBackend
 
 
 class CodeExecutionService:
-    """Service for executing code using third-party API"""
+    """Service for executing code through pluggable backends (third-party API or local sandbox)"""
     
     def __init__(self):
-        self.api_url = settings.code_execution_api_url
-        self.api_key = settings.code_execution_api_key
-        self.headers = {
-            "Accept": "*/*",
-            "Authorization": self.api_key,
-            "Content-Type": "application/json"
+        self.backends: Dict[str, ExecutionBackend] = {
+            HttpApiBackend.name: HttpApiBackend(),
+            LocalSandboxBackend.name: LocalSandboxBackend(),
         }
     
+    async def startup(self):
+        """Start the execution backends, the submission workers and the webhook consumers"""
+        for backend in self.backends.values():
+            await backend.start()
+        if settings.job_queue_enabled:
+            await job_queue.start(self._process_queued_execution)
+        if settings.webhook_queue_enabled:
+            await webhook_queue.start(self._process_webhook_batch)
+    
+    async def shutdown(self):
+        """Stop the submission workers and webhook consumers and release backend resources"""
+        await job_queue.stop()
+        await webhook_queue.stop()
+        for backend in self.backends.values():
+            await backend.close()
+    
+    def _get_backend(self, language: str, compiler: str) -> ExecutionBackend:
+        """Pick the backend configured for a language, falling back to the HTTP API"""
+        name = settings.execution_backend_routes.get(language.lower(), settings.default_execution_backend)
+        backend = self.backends.get(name)
+        if backend is None or not backend.supports(compiler):
+            backend = self.backends[HttpApiBackend.name]
+        return backend
+    
+    def get_backend_stats(self) -> Dict[str, Any]:
+        """Per-backend statistics"""
+        return {name: backend.get_stats() for name, backend in self.backends.items()}
+    
+    async def get_queue_stats(self) -> Dict[str, Any]:
+        """Submission queue depth and wait statistics"""
+        return await job_queue.get_stats()
+    
+    async def get_webhook_queue_stats(self) -> Dict[str, Any]:
+        """Webhook queue depth, lag and wait statistics"""
+        return await webhook_queue.get_stats()
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Upstream HTTP connection pool statistics"""
+        return self.backends[HttpApiBackend.name].get_stats()
+    
     async def submit_code_execution(
         self, 
         code: str, 
         language: str, 
         input_data: str, 
-        user_id: str
-    ) -> str:
-        """Submit code for execution and return execution_id"""
+        user_id: str,
+        execution_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Submit code for execution; returns execution_id, status and cached flag"""
         
-        execution_id = str(uuid.uuid4())
+        execution_id = execution_id or str(uuid.uuid4())
+        submission_key = self._get_submission_key(code, language, input_data)
         
-        # Store initial execution data in Redis
-        execution_data = {
-            "execution_id": execution_id,
-            "user_id": user_id,
-            "code": code,
-            "language": language,
-            "input_data": input_data,
-            "status": "pending",
-            "created_at": datetime.utcnow().isoformat(),
-            "output": None,
-            "error_output": None,
-            "execution_time": None,
-            "memory_usage": None
-        }
+        # Build initial execution data
+        execution_data = self._new_execution_data(execution_id, user_id, code, language, input_data, submission_key)
         
-        await redis_manager.set_execution_data(execution_id, execution_data)
+        # Serve from the result cache, or queue for the worker pool (or attach to an identical in-flight execution)
+        status = await self._accept_submission(execution_data, queued=settings.job_queue_enabled)
+        if status is None:
+            return {"execution_id": execution_id, "status": execution_data["status"], "cached": True}
         
-        # Execute code asynchronously        
-        await self._execute_code_async(execution_id, code, language, input_data)
-        
-        return execution_id
+        return {"execution_id": execution_id, "status": status, "cached": False}
     
     async def execute_code_immediate(
         self, 
@@ -61,75 +98,40 @@ class CodeExecutionService:
         input_data: str, 
         user_id: str,
         timeout_seconds: int = 30,
-        poll_interval: float = 1.0
+        poll_interval: float = 1.0,
+        execution_id: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Execute code and wait for result with polling (no webhook)"""
+        """Execute code and wait for the pushed completion signal (polling only as fallback)"""
         
-        execution_id = str(uuid.uuid4())
+        execution_id = execution_id or str(uuid.uuid4())
+        submission_key = self._get_submission_key(code, language, input_data)
         
-        # Store initial execution data in Redis
-        execution_data = {
-            "execution_id": execution_id,
-            "user_id": user_id,
-            "code": code,
-            "language": language,
-            "input_data": input_data,
-            "status": "pending",
-            "created_at": datetime.utcnow().isoformat(),
-            "output": None,
-            "error_output": None,
-            "execution_time": None,
-            "memory_usage": None
-        }
-        
-        await redis_manager.set_execution_data(execution_id, execution_data)
+        # Build initial execution data
+        execution_data = self._new_execution_data(execution_id, user_id, code, language, input_data, submission_key)
+        compiler = self._compiler_label(language)
         
         try:
-            # Submit code for execution
-            await self._execute_code_async(execution_id, code, language, input_data)
+            # Serve from the result cache, or submit for execution (or attach to an identical in-flight execution)
+            if await self._accept_submission(execution_data) is None:
+                return self._immediate_result(execution_data)
             
-            # Small delay to allow immediate processing
-            await asyncio.sleep(0.5)
-            
-            # Poll for results
+            # Wait for the completion signal; polling is only a fallback for missed signals
             start_time = datetime.utcnow()
             last_status = None
-            poll_count = 0
+            wait_count = 0
+            fallback_interval = max(poll_interval, settings.completion_fallback_poll_interval)
+            
+            def record_wait(outcome: str):
+                IMMEDIATE_POLLS.observe(wait_count, compiler=compiler, outcome=outcome)
+                IMMEDIATE_WAIT.observe((datetime.utcnow() - start_time).total_seconds(), compiler=compiler, outcome=outcome)
             
             while True:
-                poll_count += 1
+                wait_count += 1
                 
-                # Check if timeout exceeded
-                elapsed = (datetime.utcnow() - start_time).total_seconds()
-                print(f"Polling execution {execution_id} (poll #{poll_count}, elapsed={elapsed:.1f}s)")
-                if elapsed >= timeout_seconds:
-                    # Before timing out, check one more time
-                    final_data = await redis_manager.get_execution_data(execution_id)
-                    if final_data and final_data.get("status") in ["completed", "error"]:
-                        status = final_data.get("status")
-                        return {
-                            "execution_id": execution_id,
-                            "status": status,
-                            "output": final_data.get("output"),
-                            "error_output": final_data.get("error_output"),
-                            "execution_time": final_data.get("execution_time"),
-                            "memory_usage": final_data.get("memory_usage"),
-                            "message": "Execution completed" if status == "completed" else "Execution failed"
-                        }
-                    
-                    return {
-                        "execution_id": execution_id,
-                        "status": "timeout",
-                        "output": None,
-                        "error_output": None,
-                        "execution_time": None,
-                        "memory_usage": None,
-                        "message": f"Execution timed out after {timeout_seconds} seconds. Last status: {last_status}"
-                    }
-                
-                # Get current execution status
+                # Get current execution status (also covers results that landed before we started waiting)
                 current_data = await redis_manager.get_execution_data(execution_id)
                 if not current_data:
+                    record_wait("lost")
                     return {
                         "execution_id": execution_id,
                         "status": "error",
@@ -141,16 +143,19 @@ class CodeExecutionService:
                     }
                 
                 status = current_data.get("status", "pending")
+                elapsed = (datetime.utcnow() - start_time).total_seconds()
                 
                 # Track status changes
                 if status != last_status:
-                    print(f"Execution {execution_id} status changed: {last_status} -> {status} (poll #{poll_count}, elapsed={elapsed:.1f}s)")
+                    print(f"Execution {execution_id} status changed: {last_status} -> {status} (wait #{wait_count}, elapsed={elapsed:.1f}s)")
                     last_status = status
                 
                 # Check if execution is complete - handle both our mapped statuses and raw API statuses
                 if status in ["completed", "error", "success"]:
                     # Map success to completed for consistency
                     final_status = "completed" if status == "success" else status
+                    record_wait(final_status)
+                    current_data = await redis_manager.load_output_chunks(current_data)
                     return {
                         "execution_id": execution_id,
                         "status": final_status,
@@ -161,16 +166,24 @@ class CodeExecutionService:
                         "message": "Execution completed" if final_status == "completed" else "Execution failed"
                     }
                 
-                # Adaptive polling: shorter interval for first few polls, then longer
-                if poll_count <= 5:
-                    current_interval = min(poll_interval, 0.5)  # Fast polling initially
-                elif status == "waiting":
-                    current_interval = poll_interval  # Normal polling for waiting
-                else:
-                    current_interval = min(poll_interval * 1.5, 3.0)  # Slower for other statuses
+                # Check if timeout exceeded
+                remaining = timeout_seconds - elapsed
+                if remaining <= 0:
+                    record_wait("timeout")
+                    return {
+                        "execution_id": execution_id,
+                        "status": "timeout",
+                        "output": None,
+                        "error_output": None,
+                        "execution_time": None,
+                        "memory_usage": None,
+                        "message": f"Execution timed out after {timeout_seconds} seconds. Last status: {last_status}"
+                    }
                 
-                # Wait before next poll
-                await asyncio.sleep(current_interval)
+                # Block until the result is published, waking up periodically as a fallback
+                await redis_manager.wait_for_execution_completion(
+                    execution_id, min(remaining, fallback_interval)
+                )
                 
         except Exception as e:
             return {
@@ -183,79 +196,497 @@ class CodeExecutionService:
                 "message": f"Execution failed: {str(e)}"
             }
     
-    async def _execute_code_async(self, execution_id: str, code: str, language: str, input_data: str):
+    async def execute_batch(
+        self,
+        code: str,
+        language: str,
+        test_cases: List[Dict[str, Any]],
+        user_id: str,
+        batch_id: Optional[str] = None,
+        timeout_seconds: int = 30,
+        stop_on_failure: bool = False,
+        max_concurrency: Optional[int] = None,
+        on_case_complete: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """Run one program against many test cases with bounded concurrency and grade
+        each output against its expected_output. Returns an aggregated verdict."""
+        
+        # Fail fast on unsupported languages instead of once per case
+        self._get_compiler_name(language)
+        
+        batch_id = batch_id or str(uuid.uuid4())
+        # Clients may ask for less concurrency, never more than the operator's cap
+        cap = settings.batch_max_concurrency
+        semaphore = asyncio.Semaphore(min(max_concurrency or cap, cap))
+        stop_event = asyncio.Event()
+        started = time.perf_counter()
+        
+        async def run_case(index: int, test_case: Dict[str, Any]) -> Dict[str, Any]:
+            expected_output = test_case.get("expected_output")
+            async with semaphore:
+                if stop_event.is_set():
+                    case_result = {
+                        "index": index,
+                        "execution_id": None,
+                        "status": "skipped",
+                        "passed": False,
+                        "expected_output": expected_output,
+                        "message": "Skipped after an earlier test case failed"
+                    }
+                else:
+                    case_started = time.perf_counter()
+                    result = await self.execute_code_immediate(
+                        code=code,
+                        language=language,
+                        input_data=test_case.get("input_data", ""),
+                        user_id=user_id,
+                        timeout_seconds=timeout_seconds
+                    )
+                    passed = result["status"] == "completed" and (
+                        expected_output is None
+                        or self._normalize_output(result.get("output")) == self._normalize_output(expected_output)
+                    )
+                    case_result = {
+                        "index": index,
+                        **result,
+                        "passed": passed,
+                        "expected_output": expected_output,
+                        "duration_ms": round((time.perf_counter() - case_started) * 1000, 3)
+                    }
+                    if not passed and stop_on_failure:
+                        stop_event.set()
+            
+            if on_case_complete:
+                try:
+                    await on_case_complete({"batch_id": batch_id, **case_result})
+                except Exception as e:
+                    print(f"Batch {batch_id} case notification error: {e}")
+            return case_result
+        
+        results = await asyncio.gather(*[
+            run_case(index, test_case) for index, test_case in enumerate(test_cases)
+        ])
+        
+        passed_cases = sum(1 for result in results if result["passed"])
+        skipped_cases = sum(1 for result in results if result["status"] == "skipped")
+        first_failure = next((result for result in results if not result["passed"] and result["status"] != "skipped"), None)
+        if first_failure is None:
+            verdict = "accepted"
+        elif first_failure["status"] == "completed":
+            verdict = "wrong_answer"
+        else:
+            verdict = first_failure["status"]  # error or timeout
+        
+        return {
+            "batch_id": batch_id,
+            "verdict": verdict,
+            "total_cases": len(results),
+            "passed_cases": passed_cases,
+            "failed_cases": len(results) - passed_cases - skipped_cases,
+            "skipped_cases": skipped_cases,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "results": results
+        }
+    
+    @staticmethod
+    def _normalize_output(output: Optional[str]) -> str:
+        """Normalize program output for grading (line endings and trailing whitespace)"""
+        lines = (output or "").replace("\r\n", "\n").split("\n")
+        return "\n".join(line.rstrip() for line in lines).rstrip("\n")
+    
+    def _new_execution_data(
+        self,
+        execution_id: str,
+        user_id: str,
+        code: str,
+        language: str,
+        input_data: str,
+        submission_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Initial execution record stored in Redis"""
+        return {
+            "execution_id": execution_id,
+            "user_id": user_id,
+            "code": code,
+            "language": language,
+            "input_data": input_data,
+            "status": "pending",
+            "created_at": datetime.utcnow().isoformat(),
+            "output": None,
+            "error_output": None,
+            "execution_time": None,
+            "memory_usage": None,
+            "submission_key": submission_key,
+            "cached": False
+        }
+    
+    def _immediate_result(self, execution_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape a finished execution record as an immediate-execution response"""
+        status = execution_data.get("status")
+        return {
+            "execution_id": execution_data["execution_id"],
+            "status": status,
+            "output": execution_data.get("output"),
+            "error_output": execution_data.get("error_output"),
+            "execution_time": execution_data.get("execution_time"),
+            "memory_usage": execution_data.get("memory_usage"),
+            "cached": bool(execution_data.get("cached")),
+            "message": "Execution completed" if status == "completed" else "Execution failed"
+        }
+    
+    def _get_submission_key(self, code: str, language: str, input_data: str) -> Optional[str]:
+        """Content key shared by identical submissions (result cache and single-flight)"""
+        try:
+            compiler = self._get_compiler_name(language)
+        except ValueError:
+            return None
+        return result_cache.make_key(code, compiler, input_data)
+    
+    async def _accept_submission(self, execution_data: Dict[str, Any], queued: bool = False) -> Optional[str]:
+        """Answer a new submission from the result cache or dispatch it. Returns the
+        dispatch status, or None when it was served from the cache."""
+        submission_key = execution_data.get("submission_key")
+        with SUBMISSION_LATENCY.time(compiler=self._compiler_label(execution_data["language"])) as timer:
+            # Serve identical deterministic submissions from the result cache
+            cached_result = await result_cache.get(submission_key) if submission_key else None
+            if cached_result:
+                await self._complete_from_cache(execution_data, cached_result)
+                timer.set(outcome="cached")
+                return None
+            
+            status = await self._dispatch_execution(execution_data, queued=queued)
+            timer.set(outcome="attached" if status == "waiting" else "accepted")
+            return status
+    
+    async def _dispatch_execution(self, execution_data: Dict[str, Any], queued: bool = False) -> str:
+        """Store a new execution and run it upstream (inline, or via the job queue when
+        queued), or attach it to an identical in-flight execution (single-flight).
+        Returns the resulting status."""
+        execution_id = execution_data["execution_id"]
+        submission_key = execution_data.get("submission_key")
+        
+        await redis_manager.set_execution_data(execution_id, execution_data)
+        
+        if settings.single_flight_enabled and submission_key:
+            leader_id = await redis_manager.join_inflight_execution(submission_key, execution_id)
+            if leader_id:
+                # The leader's completion fans its result out to this execution
+                await self._update_status(
+                    execution_id,
+                    "waiting",
+                    user_id=execution_data.get("user_id"),
+                    shared_with=leader_id,
+                    message=f"Attached to identical in-flight execution {leader_id}."
+                )
+                print(f"Execution {execution_id} attached to in-flight execution {leader_id}")
+                return "waiting"
+        
+        if queued:
+            try:
+                await job_queue.enqueue(execution_id)
+                return "pending"
+            except Exception as e:
+                # Fall back to running inline if the queue is unavailable
+                print(f"Job queue enqueue error for execution {execution_id}: {e}")
+        
+        await self._execute_code_async(
+            execution_id,
+            execution_data["code"],
+            execution_data["language"],
+            execution_data["input_data"],
+            submission_key,
+            user_id=execution_data.get("user_id")
+        )
+        return "pending"
+    
+    async def _process_queued_execution(self, execution_id: str, queue_wait_time: float, redelivered: bool):
+        """Job queue handler: run a queued submission upstream"""
+        execution_data = await redis_manager.get_execution_data(execution_id)
+        if not execution_data:
+            print(f"Queued execution {execution_id} expired before processing")
+            return
+        
+        # A redelivered job may already have reached upstream before its worker died
+        status = execution_data.get("status")
+        allowed_statuses = ["pending", "running"] if redelivered else ["pending"]
+        if status not in allowed_statuses:
+            print(f"Skipping queued execution {execution_id} in status '{status}'")
+            return
+        
+        await self._execute_code_async(
+            execution_id,
+            execution_data["code"],
+            execution_data["language"],
+            execution_data["input_data"],
+            execution_data.get("submission_key"),
+            queue_wait_time=queue_wait_time,
+            user_id=execution_data.get("user_id")
+        )
+    
+    async def _complete_from_cache(self, execution_data: Dict[str, Any], cached_result: Dict[str, Any]):
+        """Record an execution that was answered from the result cache"""
+        now = datetime.utcnow().isoformat()
+        execution_data.update(cached_result)
+        execution_data.update({
+            "cached": True,
+            "updated_at": now,
+            "completed_at": now
+        })
+        await redis_manager.set_execution_data(execution_data["execution_id"], execution_data)
+        await self._publish_output(execution_data)
+    
+    async def _update_status(
+        self, execution_id: str, status: str, user_id: Optional[str] = None, **fields
+    ) -> int:
+        """Update an execution's status and push the changed fields, as stored, to the owner's
+        socket (output text only travels on the output stream). Returns the record's new version (0 if the update was not applied)."""
+        fields = {"updated_at": datetime.utcnow().isoformat(), **fields}
+        version = await redis_manager.update_execution_status(execution_id, status, **fields)
+        if version and user_id:
+            await websocket_manager.send_execution_update(
+                user_id, execution_id, version, redis_manager.update_changes(execution_id, {"status": status, **fields})
+            )
+        return version
+    
+    async def _publish_output(self, execution_data: Dict[str, Any], streamed: bool = False):
+        """Append a finished result to its output stream and push it to the owner's socket"""
+        events = await output_streamer.publish_result(execution_data, streamed=streamed)
+        user_id = execution_data.get("user_id")
+        if events and user_id:
+            await websocket_manager.send_output_events(user_id, execution_data["execution_id"], events)
+    
+    async def finish_execution(
+        self, execution_data: Dict[str, Any], cacheable: bool = True, streamed: bool = False
+    ) -> List[Tuple[str, str, int]]:
+        """Propagate a finished upstream result: close its output stream (streamed means
+        the output was already streamed while running), cache it and resolve every
+        execution attached to it via single-flight (notifying their owners).
+        Returns the resolved (execution_id, user_id, version) tuples."""
+        submission_key = execution_data.get("submission_key")
+        status = execution_data.get("status")
+        if status not in TERMINAL_STATUSES:
+            return []
+        await self._publish_output(execution_data, streamed=streamed)
+        if not submission_key:
+            return []
+        if execution_data.get("cached") or execution_data.get("shared_with"):
+            return []
+        
+        if cacheable:
+            await result_cache.set(submission_key, execution_data)
+        
+        if not settings.single_flight_enabled:
+            return []
+        now = datetime.utcnow().isoformat()
+        shared_fields = {
+            "output": execution_data.get("output"),
+            "error_output": execution_data.get("error_output"),
+            "execution_time": execution_data.get("execution_time"),
+            "memory_usage": execution_data.get("memory_usage"),
+            "shared_with": execution_data["execution_id"],
+            "updated_at": now,
+            "completed_at": execution_data.get("completed_at") or now
+        }
+        followers = await redis_manager.resolve_inflight_followers(
+            submission_key,
+            execution_data["execution_id"],
+            status,
+            **shared_fields
+        )
+        # Followers reference the leader's output chunks
+        changes = redis_manager.update_changes(execution_data["execution_id"], {"status": status, **shared_fields})
+        for follower_id, follower_user_id, version in followers:
+            await self._publish_output({
+                **execution_data,
+                "execution_id": follower_id,
+                "user_id": follower_user_id
+            })
+            if follower_user_id:
+                await websocket_manager.send_execution_update(
+                    follower_user_id, follower_id, version, changes
+                )
+        return followers
+    
+    @staticmethod
+    def parse_webhook_result(
+        result_data: Dict[str, Any], received_at: Optional[float] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Map a provider callback to our status and result fields"""
+        # example: {'output': '', 'cpu': '0.05', 'memory': '9400', 'status': 'error', 'error': "line 1, in <module>\n    import pandas as pd\nModuleNotFoundError: No module named 'pandas'\n", 'extra_params': ''}
+        raw_status = str(result_data.get("status") or "").lower()
+        error_output = result_data.get("error", "")
+        if raw_status == "success":
+            status = "completed"
+        elif raw_status == "error":
+            status = "error"
+        else:
+            # For any other status, default to completed if we have output, error if we have error
+            status = "error" if error_output else "completed"
+        
+        completed_at = datetime.utcfromtimestamp(received_at) if received_at else datetime.utcnow()
+        return status, {
+            "output": result_data.get("output", ""),
+            "error_output": error_output,
+            "execution_time": result_data.get("cpu", ""),
+            "memory_usage": result_data.get("memory", ""),
+            "completed_at": completed_at.isoformat(),
+        }
+    
+    async def apply_webhook_results(
+        self, deliveries: List[Tuple[str, str, str, Dict[str, Any]]], received_at: List[float]
+    ) -> List[str]:
+        """Apply provider results (execution_id, status, digest, result fields) in one Redis
+        round trip, then cache, resolve followers and notify for the applied ones
+        concurrently. received_at holds each webhook's arrival time (for the
+        webhook-to-completion metric). Returns each delivery's outcome (applied,
+        duplicate, rejected, missing)."""
+        applied_results = await redis_manager.apply_webhook_results(deliveries)
+        
+        async def finish(delivery, applied):
+            execution_id, status, _, result_fields = delivery
+            await self.finish_execution({
+                "execution_id": execution_id,
+                "user_id": applied["user_id"],
+                "submission_key": applied["submission_key"],
+                "shared_with": applied["shared_with"],
+                "status": status,
+                **result_fields
+            })
+            if applied["user_id"]:
+                await websocket_manager.send_execution_update(
+                    applied["user_id"], execution_id, applied["version"], redis_manager.update_changes(
+                        execution_id, {"status": status, "updated_at": applied["updated_at"], **result_fields}
+                    )
+                )
+        
+        finished = await asyncio.gather(*(
+            finish(delivery, applied)
+            for delivery, applied in zip(deliveries, applied_results)
+            if applied["outcome"] == "applied"
+        ), return_exceptions=True)
+        for error in finished:
+            if isinstance(error, Exception):
+                print(f"Webhook result notification error: {error}")
+        
+        now = time.time()
+        for received, applied in zip(received_at, applied_results):
+            WEBHOOK_TO_COMPLETION.observe(
+                now - received,
+                compiler=self._compiler_label(applied.get("language")) if "language" in applied else "unknown",
+                outcome=applied["outcome"]
+            )
+        return [applied["outcome"] for applied in applied_results]
+    
+    async def _process_webhook_batch(self, entries: List[Dict[str, str]]):
+        """Webhook queue handler: apply a batch of queued provider callbacks"""
+        deliveries = []
+        received_at = []
+        for entry in entries:
+            received_at.append(float(entry["received_at"]))
+            status, result_fields = self.parse_webhook_result(codec.loads(entry["body"]), received_at=received_at[-1])
+            deliveries.append((entry["execution_id"], status, entry["digest"], result_fields))
+        outcomes = await self.apply_webhook_results(deliveries, received_at)
+        counts = {outcome: outcomes.count(outcome) for outcome in set(outcomes)}
+        print(f"Applied {len(deliveries)} queued webhook results: {counts}")
+    
+    async def get_cache_stats(self) -> Dict[str, Any]:
+        """Result cache hit/miss counters"""
+        return await result_cache.get_stats()
+    
+    async def _execute_code_async(
+        self,
+        execution_id: str,
+        code: str,
+        language: str,
+        input_data: str,
+        submission_key: Optional[str] = None,
+        queue_wait_time: Optional[float] = None,
+        user_id: Optional[str] = None
+    ):
         """Execute code asynchronously"""
+        sink = None
+        if settings.output_streaming_enabled:
+            async def push_output(events):
+                if user_id:
+                    await websocket_manager.send_output_events(user_id, execution_id, events)
+            sink = output_streamer.open_sink(execution_id, on_flush=push_output)
         try:
             # Update status to running
-            await redis_manager.update_execution_status(execution_id, "running")
-            
-            # Prepare request body based on third-party API requirements
-            body = {
-                "code": code,
-                "input": input_data,
-                "compiler": self._get_compiler_name(language),
-                "extra_params": {
-                    "execution_id": execution_id,
-                }
-            }
+            running_fields = {}
+            if queue_wait_time is not None:
+                running_fields["queue_wait_time"] = round(queue_wait_time, 4)
+            await self._update_status(execution_id, "running", user_id=user_id, **running_fields)
             
+            compiler = self._get_compiler_name(language)
+            backend = self._get_backend(language, compiler)
+            try:
+                result = await backend.execute(
+                    execution_id, code, compiler, input_data,
+                    on_output=sink.write if sink else None
+                )
+            finally:
+                if sink:
+                    await sink.close()
+            status = result.pop("status")
+            cacheable = result.pop("cacheable", True)
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    self.api_url,
-                    headers=self.headers,
-                    data=json.dumps(body)
+            if status == "waiting":
+                # Update status to waiting for webhook
+                await self._update_status(
+                    execution_id, 
+                    "waiting",
+                    user_id=user_id,
+                    backend=backend.name,
+                    message=result.get("message")
                 )
-                response.raise_for_status()
-                result = response.text.strip()
-                
-                # Check if response is simple "Ok" confirmation
-                if result.lower() in ["ok", "success", "submitted"]:
-                    # Update status to waiting for webhook
-                    await redis_manager.update_execution_status(
-                        execution_id, 
-                        "waiting",
-                        message="Code submitted successfully. Waiting for execution results via webhook."
-                    )
-                    print(f"Execution {execution_id} submitted successfully. Status set to 'waiting' for webhook updates.")
-                else:
-                    # If we get actual execution results immediately, parse them
-                    try:
-                        execution_result = self._parse_execution_result(json.loads(result))
-                        await redis_manager.update_execution_status(
-                            execution_id, 
-                            "completed",
-                            output=execution_result.get("output", ""),
-                            error_output=execution_result.get("error", ""),
-                            execution_time=execution_result.get("execution_time", ""),
-                            memory_usage=execution_result.get("memory_usage", ""),
-                            completed_at=datetime.utcnow().isoformat()
-                        )
-                    except json.JSONDecodeError:
-                        # If it's not JSON, treat as plain text output
-                        await redis_manager.update_execution_status(
-                            execution_id, 
-                            "completed",
-                            output=result,
-                            completed_at=datetime.utcnow().isoformat()
-                        )
+                print(f"Execution {execution_id} submitted successfully. Status set to 'waiting' for webhook updates.")
+            else:
+                # The backend produced the result directly
+                completed_at = datetime.utcnow().isoformat()
+                updated = await self._update_status(
+                    execution_id, 
+                    status,
+                    user_id=user_id,
+                    backend=backend.name,
+                    completed_at=completed_at,
+                    **result
+                )
+                if updated:
+                    await self.finish_execution({
+                        "execution_id": execution_id,
+                        "user_id": user_id,
+                        "submission_key": submission_key,
+                        "status": status,
+                        "completed_at": completed_at,
+                        **result
+                    }, cacheable=cacheable, streamed=bool(sink and sink.streamed))
                 
         except Exception as e:
             # Update status to error
-            await redis_manager.update_execution_status(
+            error_output = str(e)
+            if isinstance(e, CircuitOpenError):
+                error_output = f"Execution service temporarily unavailable, please retry shortly ({e})"
+            # The upstream may have received the code anyway; its webhook result then replaces this error
+            source_fields = {"error_source": TRANSPORT_ERROR_SOURCE} if HttpApiBackend.may_have_submitted(e) else {}
+            completed_at = datetime.utcnow().isoformat()
+            updated = await self._update_status(
                 execution_id, 
                 "error",
-                error_output=str(e),
-                completed_at=datetime.utcnow().isoformat()
-            )
-        except Exception as e:
-            # Update status to error
-            await redis_manager.update_execution_status(
-                execution_id, 
-                "error",
-                error_output=str(e),
-                completed_at=datetime.utcnow().isoformat()
+                user_id=user_id,
+                error_output=error_output,
+                completed_at=completed_at,
+                **source_fields
             )
+            if updated:
+                # Attached executions share the failure; it is not cached
+                await self.finish_execution({
+                    "execution_id": execution_id,
+                    "user_id": user_id,
+                    "submission_key": submission_key,
+                    "status": "error",
+                    "error_output": error_output,
+                    "completed_at": completed_at
+                }, cacheable=False)
     
     def _get_compiler_name(self, language: str) -> str:
         """Map language to compiler name for third-party API"""
@@ -286,18 +717,16 @@ class CodeExecutionService:
         
         return compiler
     
-    def _parse_execution_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
-        """Parse the execution result from third-party API"""
-        return {
-            "output": result.get("output", ""),
-            "error": result.get("error", ""),
-            "execution_time": result.get("cpuTime", ""),
-            "memory_usage": result.get("memory", "")
-        }
+    def _compiler_label(self, language: Optional[str]) -> str:
+        """Metrics label for a language: its compiler, or "unsupported" (keeps label values bounded)"""
+        try:
+            return self._get_compiler_name(language or "")
+        except ValueError:
+            return "unsupported"
     
-    async def get_execution_status(self, execution_id: str) -> Dict[str, Any]:
-        """Get execution status and results"""
-        return await redis_manager.get_execution_data(execution_id)
+    async def get_execution_status(self, execution_id: str, full_output: bool = False) -> Dict[str, Any]:
+        """Get execution status and results (long output is cut at the inline prefix unless full_output)"""
+        return await redis_manager.get_execution_data(execution_id, full_output=full_output)
 
 
 # Global code execution service instance
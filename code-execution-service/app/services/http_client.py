@@ -0,0 +1,96 @@
+import asyncio
+import time
+import httpx
+from typing import Optional, Dict, Any
+
+from ..config import settings
+
+
+class UpstreamHTTPClient:
+    """Long-lived, pooled HTTP client for the third-party execution API"""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        # Gate requests on our own semaphore so pool wait time is measurable
+        self._slots = asyncio.Semaphore(settings.upstream_max_connections)
+        self._in_use = 0
+        self._total_requests = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+
+    async def start(self):
+        """Create the shared client (called from the app lifespan hook)"""
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            http2=settings.upstream_http2,
+            limits=httpx.Limits(
+                max_connections=settings.upstream_max_connections,
+                max_keepalive_connections=settings.upstream_max_keepalive_connections,
+                keepalive_expiry=settings.upstream_keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.upstream_connect_timeout,
+                read=settings.upstream_read_timeout,
+                write=settings.upstream_write_timeout,
+                pool=settings.upstream_pool_timeout,
+            ),
+        )
+
+    async def close(self):
+        """Close the shared client and release pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_client(self) -> httpx.AsyncClient:
+        """Get the shared client, creating it lazily outside the lifespan hook"""
+        if self._client is None:
+            await self.start()
+        return self._client
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        """POST through the shared pool, tracking pool wait and usage.
+        Raises httpx.PoolTimeout when no slot frees up within upstream_pool_timeout."""
+        client = await self.get_client()
+
+        wait_start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=settings.upstream_pool_timeout)
+        except asyncio.TimeoutError:
+            raise httpx.PoolTimeout("Timed out waiting for an upstream connection slot")
+        wait_time = time.perf_counter() - wait_start
+
+        self._in_use += 1
+        self._total_requests += 1
+        self._total_wait_time += wait_time
+        self._max_wait_time = max(self._max_wait_time, wait_time)
+        try:
+            return await client.post(url, **kwargs)
+        finally:
+            self._in_use -= 1
+            self._slots.release()
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Pool statistics used to size the upstream connection limits"""
+        connections = []
+        if self._client is not None:
+            pool = getattr(self._client._transport, "_pool", None)
+            connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for conn in connections if conn.is_idle())
+
+        return {
+            "max_connections": settings.upstream_max_connections,
+            "max_keepalive_connections": settings.upstream_max_keepalive_connections,
+            "http2": settings.upstream_http2,
+            "in_use": self._in_use,
+            "open_connections": len(connections),
+            "idle_connections": idle,
+            "total_requests": self._total_requests,
+            "avg_wait_time_ms": round(self._total_wait_time / self._total_requests * 1000, 3) if self._total_requests else 0.0,
+            "max_wait_time_ms": round(self._max_wait_time * 1000, 3),
+        }
+
+
+# Global upstream HTTP client instance
+upstream_http_client = UpstreamHTTPClient()
@@ -0,0 +1,227 @@
+import asyncio
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+
+from ..config import settings
+from ..database import redis_manager
+from ..metrics import metrics, JOB_QUEUE_LENGTH, JOB_QUEUE_PENDING, JOB_QUEUE_LAG
+
+
+# Handler invoked for each job: (execution_id, queue_wait_seconds, redelivered)
+JobHandler = Callable[[str, float, bool], Awaitable[None]]
+
+
+class ExecutionJobQueue:
+    """Durable submission queue on a Redis Stream, drained by a pool of async workers.
+
+    Workers read through a consumer group, so every worker process shares the
+    stream. While a job runs, its worker re-claims the entry every third of
+    job_queue_claim_idle_ms, so only entries of a crashed or stalled worker go
+    idle long enough to be reclaimed and processed again.
+    """
+
+    STREAM_KEY = "executions:jobs"
+    GROUP_NAME = "execution-workers"
+
+    def __init__(self):
+        self._handler: Optional[JobHandler] = None
+        self._tasks: List[asyncio.Task] = []
+        self._group_ready = False
+        self._consumer_prefix = f"{socket.gethostname()}-{os.getpid()}"
+        self._processed = 0
+        self._reclaimed = 0
+        self._failed = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+        # Last successfully read depth and lag, reported by the queue gauges
+        self.sampled: Dict[str, float] = {"length": 0, "pending": 0, "lag_seconds": 0.0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self, handler: JobHandler):
+        """Start the worker pool (the workers create the consumer group, so this does not need Redis)"""
+        if self._tasks:
+            return
+        self._handler = handler
+        self._group_ready = False
+
+        for index in range(settings.job_queue_workers):
+            consumer = f"{self._consumer_prefix}-{index}"
+            self._tasks.append(asyncio.create_task(self._worker(consumer)))
+        self._tasks.append(asyncio.create_task(self._reclaimer(f"{self._consumer_prefix}-reclaimer")))
+        print(f"Job queue started with {settings.job_queue_workers} workers")
+
+    async def stop(self):
+        """Stop the worker pool; unacknowledged jobs stay pending for reclaim"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _ensure_group(self, redis_client):
+        """Create the stream and consumer group unless already done; retried by the
+        workers until Redis is reachable, and again after a NOGROUP error (Redis lost them)"""
+        if self._group_ready:
+            return
+        try:
+            await redis_client.xgroup_create(self.STREAM_KEY, self.GROUP_NAME, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    async def enqueue(self, execution_id: str) -> str:
+        """Append a submission to the stream; returns the stream entry id"""
+        redis_client = await redis_manager.get_redis()
+        return await redis_client.xadd(
+            self.STREAM_KEY,
+            {"execution_id": execution_id, "enqueued_at": repr(time.time())},
+            maxlen=settings.job_queue_maxlen,
+            approximate=True,
+        )
+
+    async def _worker(self, consumer: str):
+        """Read new entries for this consumer and process them one at a time"""
+        while True:
+            try:
+                redis_client = await redis_manager.get_redis()
+                await self._ensure_group(redis_client)
+                response = await redis_client.xreadgroup(
+                    self.GROUP_NAME,
+                    consumer,
+                    {self.STREAM_KEY: ">"},
+                    count=1,
+                    block=settings.job_queue_block_ms,
+                )
+                for _, entries in response or []:
+                    for entry_id, fields in entries:
+                        await self._process(consumer, entry_id, fields, redelivered=False)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if "NOGROUP" in str(e):
+                    self._group_ready = False
+                print(f"Job queue worker {consumer} error: {e}")
+                await asyncio.sleep(1)
+
+    async def _reclaimer(self, consumer: str):
+        """Periodically claim entries whose worker stalled or crashed"""
+        while True:
+            try:
+                await asyncio.sleep(settings.job_queue_claim_idle_ms / 1000)
+                redis_client = await redis_manager.get_redis()
+                await self._ensure_group(redis_client)
+                start_id = "0-0"
+                while True:
+                    result = await redis_client.xautoclaim(
+                        self.STREAM_KEY,
+                        self.GROUP_NAME,
+                        consumer,
+                        min_idle_time=settings.job_queue_claim_idle_ms,
+                        start_id=start_id,
+                        count=50,
+                    )
+                    start_id, entries = result[0], result[1]
+                    for entry_id, fields in entries:
+                        if fields:
+                            self._reclaimed += 1
+                            await self._process(consumer, entry_id, fields, redelivered=True)
+                        else:
+                            # Entry was trimmed from the stream; just acknowledge it
+                            await redis_client.xack(self.STREAM_KEY, self.GROUP_NAME, entry_id)
+                    if start_id in ("0-0", b"0-0"):
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if "NOGROUP" in str(e):
+                    self._group_ready = False
+                print(f"Job queue reclaimer error: {e}")
+
+    async def _heartbeat(self, consumer: str, entry_id: str):
+        """Keep a running job's entry claimed (idle time reset) so it is not redelivered"""
+        interval = settings.job_queue_claim_idle_ms / 3000
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                redis_client = await redis_manager.get_redis()
+                pending = await redis_client.xpending_range(
+                    self.STREAM_KEY, self.GROUP_NAME, min=entry_id, max=entry_id, count=1
+                )
+                if not pending or pending[0]["consumer"] != consumer:
+                    print(f"Job queue entry {entry_id} is no longer owned by {consumer}")
+                    return
+                await redis_client.xclaim(
+                    self.STREAM_KEY, self.GROUP_NAME, consumer,
+                    min_idle_time=0, message_ids=[entry_id], justid=True
+                )
+            except Exception as e:
+                print(f"Job queue heartbeat error for entry {entry_id}: {e}")
+
+    async def _process(self, consumer: str, entry_id: str, fields: Dict[str, str], redelivered: bool):
+        """Run the handler for one entry (keeping the entry claimed meanwhile) and acknowledge it"""
+        execution_id = fields.get("execution_id")
+        wait_time = max(time.time() - float(fields.get("enqueued_at", time.time())), 0.0)
+        self._total_wait_time += wait_time
+        self._max_wait_time = max(self._max_wait_time, wait_time)
+
+        heartbeat = asyncio.create_task(self._heartbeat(consumer, entry_id))
+        try:
+            if execution_id:
+                await self._handler(execution_id, wait_time, redelivered)
+            self._processed += 1
+        except Exception as e:
+            self._failed += 1
+            print(f"Job queue handler error for execution {execution_id}: {e}")
+        finally:
+            heartbeat.cancel()
+
+        redis_client = await redis_manager.get_redis()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.xack(self.STREAM_KEY, self.GROUP_NAME, entry_id)
+            pipe.xdel(self.STREAM_KEY, entry_id)
+            await pipe.execute()
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, pending entries, lag (age of the oldest unfinished job) and queue wait statistics"""
+        length = pending = 0
+        lag_seconds = 0.0
+        try:
+            redis_client = await redis_manager.get_redis()
+            length = await redis_client.xlen(self.STREAM_KEY)
+            summary = await redis_client.xpending(self.STREAM_KEY, self.GROUP_NAME)
+            pending = summary.get("pending", 0) if summary else 0
+            # Finished jobs are deleted, so the first entry is the oldest one still queued or running
+            oldest = await redis_client.xrange(self.STREAM_KEY, count=1)
+            if oldest:
+                lag_seconds = max(time.time() - int(oldest[0][0].split("-")[0]) / 1000, 0.0)
+            self.sampled = {"length": length, "pending": pending, "lag_seconds": lag_seconds}
+        except Exception as e:
+            print(f"Job queue stats error: {e}")
+
+        handled = self._processed + self._failed
+        return {
+            "enabled": settings.job_queue_enabled,
+            "running": self.running,
+            "workers": settings.job_queue_workers,
+            "length": length,
+            "pending": pending,
+            "lag_seconds": round(lag_seconds, 3),
+            "processed": self._processed,
+            "failed": self._failed,
+            "reclaimed": self._reclaimed,
+            "avg_wait_time_ms": round(self._total_wait_time / handled * 1000, 3) if handled else 0.0,
+            "max_wait_time_ms": round(self._max_wait_time * 1000, 3),
+        }
+
+
+# Global job queue instance
+job_queue = ExecutionJobQueue()
+metrics.add_collector(job_queue.get_stats)
+JOB_QUEUE_LENGTH.set_function(lambda: job_queue.sampled["length"])
+JOB_QUEUE_PENDING.set_function(lambda: job_queue.sampled["pending"])
+JOB_QUEUE_LAG.set_function(lambda: job_queue.sampled["lag_seconds"])
@@ -0,0 +1,188 @@
+import asyncio
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable, AsyncIterator
+
+from ..config import settings
+from ..database import redis_manager, TERMINAL_STATUSES
+
+
+# (event id, {"type": "stdout" | "stderr" | "truncated" | "end", "data" | "status": ...})
+OutputEvent = Tuple[str, Dict[str, str]]
+
+
+class OutputStreamer:
+    """Per-execution output streams in Redis (executions:output:{id}).
+
+    Backends that produce output incrementally append stdout/stderr chunks while
+    the program runs; results that arrive whole (webhook, cache, single-flight)
+    are appended at completion. Every stream ends with an "end" event carrying
+    the final status. Stream entry ids double as resumable offsets
+    (SSE Last-Event-ID). Buffered output per execution is capped at
+    output_stream_max_bytes, after which a single "truncated" event is written.
+    """
+
+    KEY_PREFIX = "executions:output:"
+
+    def key(self, execution_id: str) -> str:
+        return f"{self.KEY_PREFIX}{execution_id}"
+
+    async def append(self, execution_id: str, events: List[Dict[str, str]]) -> List[OutputEvent]:
+        """Append events in one round trip; returns them with their stream ids"""
+        if not events:
+            return []
+        try:
+            redis_client = await redis_manager.get_redis()
+            key = self.key(execution_id)
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for event in events:
+                    pipe.xadd(key, event)
+                pipe.expire(key, settings.execution_ttl)
+                results = await pipe.execute()
+            return list(zip(results[:-1], events))
+        except Exception as e:
+            print(f"Output stream append error for execution {execution_id}: {e}")
+            return []
+
+    async def exists(self, execution_id: str) -> bool:
+        redis_client = await redis_manager.get_redis()
+        return bool(await redis_client.exists(self.key(execution_id)))
+
+    async def read(self, execution_id: str, after_id: str = "0-0", block_ms: Optional[int] = None) -> List[OutputEvent]:
+        """Events after after_id, optionally blocking until one arrives"""
+        redis_client = await redis_manager.get_redis()
+        response = await redis_client.xread({self.key(execution_id): after_id}, block=block_ms)
+        if not response:
+            return []
+        return [(event_id, fields) for event_id, fields in response[0][1]]
+
+    async def follow(self, execution_id: str, after_id: str = "0-0") -> AsyncIterator[Optional[OutputEvent]]:
+        """Yield events from after_id until the end event; yields None on each idle block (heartbeat)"""
+        while True:
+            events = await self.read(execution_id, after_id, block_ms=settings.output_stream_block_ms)
+            if not events:
+                yield None
+                continue
+            for event in events:
+                after_id = event[0]
+                yield event
+                if event[1].get("type") == "end":
+                    return
+
+    def result_events(
+        self, output: Optional[str], error_output: Optional[str], status: str, streamed: bool = False
+    ) -> List[Dict[str, str]]:
+        """Events for a result that arrived whole: bounded output chunks, then the end event"""
+        events = []
+        if not streamed:
+            budget = settings.output_stream_max_bytes
+            chunk_size = settings.output_stream_chunk_bytes
+            for stream, text in (("stdout", output or ""), ("stderr", error_output or "")):
+                truncated = len(text) > budget
+                text = text[:budget]
+                budget -= len(text)
+                events.extend(
+                    {"type": stream, "data": text[start:start + chunk_size]}
+                    for start in range(0, len(text), chunk_size)
+                )
+                if truncated:
+                    events.append({"type": "truncated", "data": ""})
+                    break
+        events.append({"type": "end", "status": status})
+        return events
+
+    async def publish_result(
+        self, execution_data: Dict[str, Any], streamed: bool = False
+    ) -> List[OutputEvent]:
+        """Append a finished execution's output (unless it was already streamed) and the end event"""
+        if not settings.output_streaming_enabled or execution_data.get("status") not in TERMINAL_STATUSES:
+            return []
+        events = self.result_events(
+            execution_data.get("output"),
+            execution_data.get("error_output"),
+            execution_data["status"],
+            streamed=streamed
+        )
+        return await self.append(execution_data["execution_id"], events)
+
+    def open_sink(
+        self,
+        execution_id: str,
+        on_flush: Optional[Callable[[List[OutputEvent]], Awaitable[None]]] = None
+    ) -> "OutputSink":
+        return OutputSink(self, execution_id, on_flush)
+
+
+class OutputSink:
+    """Buffers a running program's output and appends it to its stream in chunks,
+    flushing when output_stream_chunk_bytes accumulate or every
+    output_stream_flush_interval seconds, whichever comes first."""
+
+    def __init__(
+        self,
+        streamer: OutputStreamer,
+        execution_id: str,
+        on_flush: Optional[Callable[[List[OutputEvent]], Awaitable[None]]] = None
+    ):
+        self.streamer = streamer
+        self.execution_id = execution_id
+        self.on_flush = on_flush
+        self.streamed = False
+        self._pending: List[Dict[str, str]] = []
+        self._pending_bytes = 0
+        self._total_bytes = 0
+        self._truncated = False
+        self._ticker: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def write(self, stream: str, text: str):
+        """Backend callback: buffer a piece of stdout/stderr"""
+        if not text or self._truncated:
+            return
+        remaining = settings.output_stream_max_bytes - self._total_bytes
+        if len(text) > remaining:
+            text = text[:remaining]
+            self._truncated = True
+        self._total_bytes += len(text)
+
+        if text:
+            if self._pending and self._pending[-1]["type"] == stream:
+                self._pending[-1]["data"] += text
+            else:
+                self._pending.append({"type": stream, "data": text})
+            self._pending_bytes += len(text)
+        if self._truncated:
+            self._pending.append({"type": "truncated", "data": ""})
+
+        if self._pending_bytes >= settings.output_stream_chunk_bytes or self._truncated:
+            await self.flush()
+        elif self._ticker is None:
+            self._ticker = asyncio.create_task(self._tick())
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(settings.output_stream_flush_interval)
+            # Shielded so close() cannot cancel an append half-way
+            await asyncio.shield(self.flush())
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            events, self._pending, self._pending_bytes = self._pending, [], 0
+            appended = await self.streamer.append(self.execution_id, events)
+            self.streamed = True
+        if appended and self.on_flush:
+            try:
+                await self.on_flush(appended)
+            except Exception as e:
+                print(f"Output stream notification error for execution {self.execution_id}: {e}")
+
+    async def close(self):
+        """Stop the flush timer and write whatever is still buffered"""
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        await self.flush()
+
+
+# Global output streamer instance
+output_streamer = OutputStreamer()
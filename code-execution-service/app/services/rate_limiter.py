@@ -0,0 +1,145 @@
+import math
+import time
+from typing import Dict, Any
+
+from ..config import settings
+from ..database import redis_manager
+
+
+# Token buckets (per user + global) and per-user concurrency cap, checked atomically.
+# KEYS: [user bucket, global bucket, user in-flight set]
+# ARGV: [now, user_rate/s, user_burst, global_rate/s, global_burst, max_inflight, slot_deadline, execution_id, cost]
+# A request costing more than a bucket's burst is admitted from a full bucket and leaves it
+# in debt (negative tokens) until refilled.
+# Returns {1} if admitted, or {0, reason, retry_after_ms}
+ADMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+
+local function refill(key, rate, burst)
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    return math.min(burst, tokens + math.max(0, now - ts) * rate)
+end
+
+local user_rate, user_burst = tonumber(ARGV[2]), tonumber(ARGV[3])
+local global_rate, global_burst = tonumber(ARGV[4]), tonumber(ARGV[5])
+local cost = tonumber(ARGV[9])
+local user_tokens = refill(KEYS[1], user_rate, user_burst)
+local global_tokens = refill(KEYS[2], global_rate, global_burst)
+local user_need = math.min(cost, user_burst)
+local global_need = math.min(cost, global_burst)
+
+if user_tokens < user_need then
+    return {0, 'user_rate', math.ceil((user_need - user_tokens) / user_rate * 1000)}
+end
+if global_tokens < global_need then
+    return {0, 'global_rate', math.ceil((global_need - global_tokens) / global_rate * 1000)}
+end
+
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+if redis.call('ZCARD', KEYS[3]) >= tonumber(ARGV[6]) then
+    -- a slot frees at the latest when the oldest one reaches its deadline
+    local oldest = redis.call('ZRANGE', KEYS[3], 0, 0, 'WITHSCORES')
+    return {0, 'user_concurrency', math.ceil((tonumber(oldest[2]) - now) * 1000)}
+end
+
+-- Buckets expire once they would have refilled completely
+redis.call('HSET', KEYS[1], 'tokens', user_tokens - cost, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil((user_burst - user_tokens + cost) / user_rate) + 1)
+redis.call('HSET', KEYS[2], 'tokens', global_tokens - cost, 'ts', now)
+redis.call('EXPIRE', KEYS[2], math.ceil((global_burst - global_tokens + cost) / global_rate) + 1)
+redis.call('ZADD', KEYS[3], ARGV[7], ARGV[8])
+redis.call('EXPIRE', KEYS[3], math.ceil(ARGV[7] - now) + 1)
+return {1}
+"""
+
+
+class RateLimiter:
+    """Redis-backed admission control for execution submissions.
+
+    Combines a per-user and a global token bucket with a cap on each user's
+    concurrently in-flight executions. The in-flight set is released by the
+    execution record scripts in database.py when an execution finishes.
+    """
+
+    STATS_KEY = "ratelimit:stats"
+
+    def __init__(self):
+        self._admit_script = None
+
+    async def admit(self, user_id: str, execution_id: str, cost: int = 1) -> Dict[str, Any]:
+        """Try to admit a new execution that takes cost tokens (e.g. one per batch test
+        case) and one in-flight slot; returns allowed, reason and retry_after (seconds)"""
+        if not settings.rate_limit_enabled:
+            return {"allowed": True, "reason": None, "retry_after": 0}
+        try:
+            redis_client = await redis_manager.get_redis()
+            if self._admit_script is None:
+                self._admit_script = redis_client.register_script(ADMIT_SCRIPT)
+
+            now = time.time()
+            result = await self._admit_script(
+                keys=[
+                    f"ratelimit:user:{user_id}",
+                    "ratelimit:global",
+                    f"executions:inflight:{user_id}",
+                ],
+                args=[
+                    now,
+                    settings.user_rate_limit_per_minute / 60,
+                    settings.user_rate_limit_burst,
+                    settings.global_rate_limit_per_minute / 60,
+                    settings.global_rate_limit_burst,
+                    settings.max_concurrent_executions_per_user,
+                    now + settings.inflight_slot_ttl,
+                    execution_id,
+                    cost,
+                ],
+                client=redis_client,
+            )
+            if int(result[0]) == 1:
+                return {"allowed": True, "reason": None, "retry_after": 0}
+
+            reason = result[1]
+            await redis_client.hincrby(self.STATS_KEY, reason, 1)
+            return {
+                "allowed": False,
+                "reason": reason,
+                "retry_after": max(1, math.ceil(int(result[2]) / 1000)),
+            }
+        except Exception as e:
+            # Fail open: admission control must not take the service down with Redis
+            print(f"Rate limiter error: {e}")
+            return {"allowed": True, "reason": None, "retry_after": 0}
+
+    async def release(self, user_id: str, execution_id: str):
+        """Free an in-flight slot that is not tied to an execution record (e.g. a batch)"""
+        try:
+            redis_client = await redis_manager.get_redis()
+            await redis_client.zrem(f"executions:inflight:{user_id}", execution_id)
+        except Exception as e:
+            print(f"Rate limiter release error: {e}")
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Rejection counters by reason, plus the configured limits"""
+        try:
+            redis_client = await redis_manager.get_redis()
+            rejections = await redis_client.hgetall(self.STATS_KEY)
+        except Exception as e:
+            print(f"Rate limiter stats error: {e}")
+            rejections = {}
+
+        return {
+            "enabled": settings.rate_limit_enabled,
+            "rejections": {reason: int(count) for reason, count in rejections.items()},
+            "user_rate_limit_per_minute": settings.user_rate_limit_per_minute,
+            "user_rate_limit_burst": settings.user_rate_limit_burst,
+            "global_rate_limit_per_minute": settings.global_rate_limit_per_minute,
+            "global_rate_limit_burst": settings.global_rate_limit_burst,
+            "max_concurrent_executions_per_user": settings.max_concurrent_executions_per_user,
+        }
+
+
+# Global rate limiter instance
+rate_limiter = RateLimiter()
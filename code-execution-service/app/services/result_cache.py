@@ -0,0 +1,113 @@
+import hashlib
+import time
+from typing import Optional, Dict, Any
+
+from ..config import settings
+from ..database import redis_manager
+
+
+# Result fields copied into / out of the cache
+CACHED_FIELDS = ("status", "output", "error_output", "execution_time", "memory_usage")
+
+
+class ResultCache:
+    """Content-addressed cache of execution results for deterministic re-runs.
+
+    Keyed by a hash of (normalized code, compiler, input). Entries expire after
+    result_cache_ttl and the least recently used ones are evicted once the cache
+    holds more than result_cache_max_entries.
+    """
+
+    KEY_PREFIX = "result_cache:"
+    LRU_KEY = "result_cache:lru"
+    STATS_KEY = "result_cache:stats"
+
+    @property
+    def enabled(self) -> bool:
+        return settings.result_cache_enabled
+
+    @staticmethod
+    def normalize_code(code: str) -> str:
+        """Normalize line endings and trailing whitespace so cosmetic edits still hit"""
+        return code.replace("\r\n", "\n").replace("\r", "\n").rstrip()
+
+    def make_key(self, code: str, compiler: str, input_data: str) -> str:
+        """Content hash identifying a submission"""
+        digest = hashlib.sha256()
+        for part in (compiler, self.normalize_code(code), input_data or ""):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    async def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached result, counting hits and misses"""
+        if not self.enabled:
+            return None
+        try:
+            redis_client = await redis_manager.get_redis()
+            data = await redis_client.get(f"{self.KEY_PREFIX}{cache_key}")
+            async with redis_client.pipeline(transaction=False) as pipe:
+                if data:
+                    pipe.zadd(self.LRU_KEY, {cache_key: time.time()})
+                    pipe.hincrby(self.STATS_KEY, "hits", 1)
+                else:
+                    pipe.hincrby(self.STATS_KEY, "misses", 1)
+                await pipe.execute()
+            return redis_manager.decode_value(data) if data else None
+        except Exception as e:
+            print(f"Result cache get error: {e}")
+            return None
+
+    async def set(self, cache_key: str, result: Dict[str, Any]) -> bool:
+        """Store a finished result and evict least recently used entries over the bound"""
+        if not self.enabled:
+            return False
+        try:
+            redis_client = await redis_manager.get_redis()
+            entry = {field: result.get(field) for field in CACHED_FIELDS}
+            now = time.time()
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.setex(f"{self.KEY_PREFIX}{cache_key}", settings.result_cache_ttl, redis_manager.encode_value(entry))
+                pipe.zadd(self.LRU_KEY, {cache_key: now})
+                # Drop LRU entries whose cached value has certainly expired
+                pipe.zremrangebyscore(self.LRU_KEY, "-inf", now - settings.result_cache_ttl)
+                pipe.zcard(self.LRU_KEY)
+                results = await pipe.execute()
+
+            overflow = results[-1] - settings.result_cache_max_entries
+            if overflow > 0:
+                evicted = await redis_client.zpopmin(self.LRU_KEY, overflow)
+                if evicted:
+                    await redis_client.delete(*[f"{self.KEY_PREFIX}{key}" for key, _ in evicted])
+                    await redis_client.hincrby(self.STATS_KEY, "evictions", len(evicted))
+            return True
+        except Exception as e:
+            print(f"Result cache set error: {e}")
+            return False
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        try:
+            redis_client = await redis_manager.get_redis()
+            stats = await redis_client.hgetall(self.STATS_KEY)
+            size = await redis_client.zcard(self.LRU_KEY)
+        except Exception as e:
+            print(f"Result cache stats error: {e}")
+            stats, size = {}, 0
+
+        hits = int(stats.get("hits", 0))
+        misses = int(stats.get("misses", 0))
+        return {
+            "enabled": self.enabled,
+            "hits": hits,
+            "misses": misses,
+            "evictions": int(stats.get("evictions", 0)),
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "size": size,
+            "max_entries": settings.result_cache_max_entries,
+            "ttl": settings.result_cache_ttl,
+        }
+
+
+# Global result cache instance
+result_cache = ResultCache()
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
+
+from ..config import settings
+from ..database import redis_manager
+from ..metrics import metrics, WEBHOOK_QUEUE_LENGTH, WEBHOOK_QUEUE_PENDING, WEBHOOK_QUEUE_LAG
+
+
+# Handler invoked with a batch of queued callbacks
+# (entry fields: execution_id, body, digest, received_at)
+WebhookBatchHandler = Callable[[List[Dict[str, str]]], Awaitable[None]]
+
+
+class WebhookQueue:
+    """Durable queue of provider callbacks on a Redis Stream.
+
+    /webhook only validates and appends the raw payload, so the provider gets its
+    200 without waiting on our processing. A pool of consumers (one consumer
+    group shared by every worker process) applies the results in batches.
+    Entries of a batch that failed stay pending and are reclaimed after
+    webhook_queue_claim_idle_ms; re-applying them is safe because already
+    applied deliveries are recognized as duplicates.
+    """
+
+    STREAM_KEY = "executions:webhooks"
+    GROUP_NAME = "webhook-workers"
+
+    def __init__(self):
+        self._handler: Optional[WebhookBatchHandler] = None
+        self._tasks: List[asyncio.Task] = []
+        self._group_ready = False
+        self._consumer_prefix = f"{socket.gethostname()}-{os.getpid()}"
+        self._enqueued = 0
+        self._processed = 0
+        self._failed = 0
+        self._reclaimed = 0
+        self._batches = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+        # Last successfully read depth and lag, reported by the queue gauges
+        self.sampled: Dict[str, float] = {"length": 0, "pending": 0, "lag_seconds": 0.0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self, handler: WebhookBatchHandler):
+        """Start the consumer pool (the consumers create the consumer group, so this does not need Redis)"""
+        if self._tasks:
+            return
+        self._handler = handler
+        self._group_ready = False
+
+        for index in range(settings.webhook_queue_workers):
+            consumer = f"{self._consumer_prefix}-webhook-{index}"
+            self._tasks.append(asyncio.create_task(self._worker(consumer)))
+        self._tasks.append(asyncio.create_task(self._reclaimer(f"{self._consumer_prefix}-webhook-reclaimer")))
+        print(f"Webhook queue started with {settings.webhook_queue_workers} workers")
+
+    async def stop(self):
+        """Stop the consumers; unacknowledged callbacks stay pending for reclaim"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _ensure_group(self, redis_client):
+        """Create the stream and consumer group unless already done; retried by the
+        workers until Redis is reachable, and again after a NOGROUP error (Redis lost them)"""
+        if self._group_ready:
+            return
+        try:
+            await redis_client.xgroup_create(self.STREAM_KEY, self.GROUP_NAME, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    async def enqueue(self, execution_id: str, body: bytes, digest: str) -> str:
+        """Append a raw callback payload to the stream; returns the stream entry id"""
+        redis_client = await redis_manager.get_redis()
+        entry_id = await redis_client.xadd(
+            self.STREAM_KEY,
+            {
+                "execution_id": execution_id,
+                "body": body.decode(),
+                "digest": digest,
+                "received_at": repr(time.time()),
+            },
+            maxlen=settings.webhook_queue_maxlen,
+            approximate=True,
+        )
+        self._enqueued += 1
+        return entry_id
+
+    async def _worker(self, consumer: str):
+        """Read up to webhook_queue_batch_size new callbacks and process them together"""
+        while True:
+            try:
+                redis_client = await redis_manager.get_redis()
+                await self._ensure_group(redis_client)
+                response = await redis_client.xreadgroup(
+                    self.GROUP_NAME,
+                    consumer,
+                    {self.STREAM_KEY: ">"},
+                    count=settings.webhook_queue_batch_size,
+                    block=settings.webhook_queue_block_ms,
+                )
+                for _, entries in response or []:
+                    await self._process(entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if "NOGROUP" in str(e):
+                    self._group_ready = False
+                print(f"Webhook queue worker {consumer} error: {e}")
+                await asyncio.sleep(1)
+
+    async def _reclaimer(self, consumer: str):
+        """Periodically claim callbacks whose batch failed or whose worker crashed"""
+        while True:
+            try:
+                await asyncio.sleep(settings.webhook_queue_claim_idle_ms / 1000)
+                redis_client = await redis_manager.get_redis()
+                await self._ensure_group(redis_client)
+                start_id = "0-0"
+                while True:
+                    result = await redis_client.xautoclaim(
+                        self.STREAM_KEY,
+                        self.GROUP_NAME,
+                        consumer,
+                        min_idle_time=settings.webhook_queue_claim_idle_ms,
+                        start_id=start_id,
+                        count=settings.webhook_queue_batch_size,
+                    )
+                    start_id, entries = result[0], result[1]
+                    trimmed = [entry_id for entry_id, fields in entries if not fields]
+                    if trimmed:
+                        # Entries trimmed from the stream; just acknowledge them
+                        await redis_client.xack(self.STREAM_KEY, self.GROUP_NAME, *trimmed)
+                    live = [(entry_id, fields) for entry_id, fields in entries if fields]
+                    if live:
+                        self._reclaimed += len(live)
+                        await self._process(live)
+                    if start_id in ("0-0", b"0-0"):
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if "NOGROUP" in str(e):
+                    self._group_ready = False
+                print(f"Webhook queue reclaimer error: {e}")
+
+    async def _process(self, entries: List[Tuple[str, Dict[str, str]]]):
+        """Run the handler for one batch and acknowledge it (left pending if it fails)"""
+        now = time.time()
+        for _, fields in entries:
+            wait_time = max(now - float(fields.get("received_at", now)), 0.0)
+            self._total_wait_time += wait_time
+            self._max_wait_time = max(self._max_wait_time, wait_time)
+
+        try:
+            await self._handler([fields for _, fields in entries])
+        except Exception as e:
+            self._failed += len(entries)
+            print(f"Webhook queue handler error for {len(entries)} callbacks: {e}")
+            return
+        self._processed += len(entries)
+        self._batches += 1
+
+        entry_ids = [entry_id for entry_id, _ in entries]
+        redis_client = await redis_manager.get_redis()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.xack(self.STREAM_KEY, self.GROUP_NAME, *entry_ids)
+            pipe.xdel(self.STREAM_KEY, *entry_ids)
+            await pipe.execute()
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, lag (age of the oldest unprocessed callback) and wait statistics"""
+        length = pending = 0
+        lag_seconds = 0.0
+        try:
+            redis_client = await redis_manager.get_redis()
+            length = await redis_client.xlen(self.STREAM_KEY)
+            summary = await redis_client.xpending(self.STREAM_KEY, self.GROUP_NAME)
+            pending = summary.get("pending", 0) if summary else 0
+            # Processed entries are deleted, so the first entry is the oldest one not yet applied
+            oldest = await redis_client.xrange(self.STREAM_KEY, count=1)
+            if oldest:
+                lag_seconds = max(time.time() - int(oldest[0][0].split("-")[0]) / 1000, 0.0)
+            self.sampled = {"length": length, "pending": pending, "lag_seconds": lag_seconds}
+        except Exception as e:
+            print(f"Webhook queue stats error: {e}")
+
+        handled = self._processed + self._failed
+        return {
+            "enabled": settings.webhook_queue_enabled,
+            "running": self.running,
+            "workers": settings.webhook_queue_workers,
+            "length": length,
+            "pending": pending,
+            "lag_seconds": round(lag_seconds, 3),
+            "enqueued": self._enqueued,
+            "processed": self._processed,
+            "failed": self._failed,
+            "reclaimed": self._reclaimed,
+            "avg_batch_size": round(self._processed / self._batches, 2) if self._batches else 0.0,
+            "avg_wait_time_ms": round(self._total_wait_time / handled * 1000, 3) if handled else 0.0,
+            "max_wait_time_ms": round(self._max_wait_time * 1000, 3),
+        }
+
+
+# Global webhook queue instance
+webhook_queue = WebhookQueue()
+metrics.add_collector(webhook_queue.get_stats)
+WEBHOOK_QUEUE_LENGTH.set_function(lambda: webhook_queue.sampled["length"])
+WEBHOOK_QUEUE_PENDING.set_function(lambda: webhook_queue.sampled["pending"])
+WEBHOOK_QUEUE_LAG.set_function(lambda: webhook_queue.sampled["lag_seconds"])
@@ -1,22 +1,188 @@
-import json
-import websockets
-from typing import Dict, Set
+import asyncio
+import time
+from collections import deque
+from fastapi import WebSocket
+from typing import Any, Dict, Set, List, Tuple, Optional, Deque, Union
+from ..codec import codec
+from ..config import settings
 from ..database import redis_manager
+from ..metrics import WEBSOCKET_CONNECTIONS
+from .output_stream import output_streamer
+
+
+# Message types whose queued messages are merged with newer ones instead of queueing both
+COALESCED_MESSAGE_TYPES = ("execution_update",)
+
+# Record fields that never change after submission and are left out of deltas
+STATIC_FIELDS = ("code", "input_data")
+
+
+def merge_update(queued: Dict[str, Any], update: Dict[str, Any]) -> bool:
+    """Fold a delta into the queued delta it directly follows; False if they are not contiguous"""
+    if queued["execution_id"] != update["execution_id"] or update["base_version"] != queued["version"]:
+        return False
+    queued["changes"].update(update["changes"])
+    queued["version"] = update["version"]
+    return True
+
+
+class WebSocketConnection:
+    """One client socket with a bounded outbound queue drained by its own writer task.
+    
+    Enqueueing never blocks. A queued execution update absorbs a newer one that
+    directly follows it (merged changes, newest version). When the queue is full
+    the connection is either closed (policy "disconnect"; clients reconnect and
+    resync) or its oldest message is dropped (policy "drop_oldest").
+    """
+    
+    def __init__(self, websocket: WebSocket, user_id: str, execution_id: str, on_close):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.execution_id = execution_id
+        self._on_close = on_close
+        # [message type, text, or the message itself for coalesced types until it is sent]
+        self._pending: Deque[List[Union[str, Dict, None]]] = deque()
+        self._wakeup = asyncio.Event()
+        self._writer = asyncio.create_task(self._write())
+        self.closed = False
+        self.connected_at = time.time()
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+    
+    def enqueue(self, message_type: Optional[str], payload: Union[str, Dict]):
+        """Queue a message (serialized, or a dict for coalesced types) without waiting on the network"""
+        if self.closed:
+            return
+        if message_type in COALESCED_MESSAGE_TYPES:
+            # Merge into the latest queued update, but never across a snapshot
+            for item in reversed(self._pending):
+                if item[0] == "execution_snapshot":
+                    break
+                if item[0] == message_type:
+                    if merge_update(item[1], payload):
+                        self.coalesced += 1
+                        return
+                    break
+        
+        if len(self._pending) >= settings.websocket_send_queue_size:
+            if settings.websocket_slow_consumer_policy == "drop_oldest":
+                self._pending.popleft()
+                self.dropped += 1
+            else:
+                self.dropped += len(self._pending) + 1
+                print(f"WebSocket slow consumer: user {self.user_id}, execution {self.execution_id}, closing")
+                self._shutdown()
+                asyncio.create_task(self._finish_close(code=1013, reason="Client too slow"))
+                return
+        
+        self._pending.append([message_type, payload])
+        self.max_depth = max(self.max_depth, len(self._pending))
+        self._wakeup.set()
+    
+    async def _write(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                _, payload = self._pending.popleft()
+                text = payload if isinstance(payload, str) else codec.dumps(payload)
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(text), timeout=settings.websocket_send_timeout)
+                    self.sent += 1
+                except Exception as e:
+                    print(f"Error sending WebSocket message to user {self.user_id}: {e}")
+                    self._shutdown()
+                    asyncio.create_task(self._finish_close(code=1011, reason="Send failed"))
+                    return
+    
+    async def close(self, code: int = 1000, reason: str = ""):
+        """Stop the writer, close the socket (unless the client already left) and unregister it"""
+        if self.closed:
+            return
+        self._shutdown()
+        await self._finish_close(code, reason)
+    
+    def _shutdown(self):
+        """Synchronously stop accepting and writing messages"""
+        self.closed = True
+        self._pending.clear()
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+    
+    async def _finish_close(self, code: int = 1000, reason: str = ""):
+        if code != 1000:
+            try:
+                await asyncio.wait_for(self.websocket.close(code=code, reason=reason), timeout=settings.websocket_send_timeout)
+            except Exception:
+                pass
+        await self._on_close(self)
+    
+    def get_stats(self) -> Dict:
+        return {
+            "user_id": self.user_id,
+            "execution_id": self.execution_id,
+            "queue_depth": len(self._pending),
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "connected_seconds": round(time.time() - self.connected_at, 1),
+        }
 
 
 class WebSocketManager:
-    """WebSocket manager for real-time execution updates"""
+    """WebSocket manager for real-time execution updates
+    
+    Updates are published to a per-user Redis channel (ws:user:{user_id}) and every
+    worker delivers them to the sockets it holds, so the worker that processes a
+    webhook does not need to be the one the user is connected to. A worker is only
+    subscribed to the channels of users with at least one local connection.
+    
+    Execution updates are deltas: {"type": "execution_update", "execution_id",
+    "base_version", "version", "changes"}, where versions are the record's version
+    counter in Redis. A socket first receives an "execution_snapshot" (the full
+    record and its version). Clients ignore updates with version <= their own and
+    send {"type": "resync"} for a fresh snapshot when base_version is ahead of it.
+    Updates to one execution published within websocket_coalesce_window seconds
+    are merged into a single frame. Frames are compressed with permessage-deflate
+    when the client offers it (uvicorn's websockets protocol, --ws-per-message-deflate).
+    """
+    
+    CHANNEL_PREFIX = "ws:user:"
     
     def __init__(self):
-        # Active WebSocket connections {user_id: {execution_id: websocket}}
-        self.connections: Dict[str, Dict[str, websockets.WebSocketServerProtocol]] = {}
+        # Active WebSocket connections {user_id: {execution_id: connection}}
+        self.connections: Dict[str, Dict[str, WebSocketConnection]] = {}
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._subscribed = asyncio.Event()
+        self._stopping = False
+        self._published = 0
+        self._delivered = 0
+        self._closed_dropped = 0
+        # Delta updates held for the coalescing window {(user_id, execution_id): update}
+        self._pending_updates: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self._coalesced_updates = 0
+    
+    def channel(self, user_id: str) -> str:
+        return f"{self.CHANNEL_PREFIX}{user_id}"
     
-    async def connect(self, websocket: websockets.WebSocketServerProtocol, user_id: str, execution_id: str):
+    async def connect(self, websocket: WebSocket, user_id: str, execution_id: str):
         """Register a new WebSocket connection"""
         if user_id not in self.connections:
             self.connections[user_id] = {}
+            await self._subscribe(user_id)
         
-        self.connections[user_id][execution_id] = websocket
+        previous = self.connections[user_id].get(execution_id)
+        self.connections[user_id][execution_id] = WebSocketConnection(
+            websocket, user_id, execution_id, self._connection_closed
+        )
+        if previous is not None:
+            # Superseded by a reconnect; closing it leaves the new registration in place
+            await previous.close()
         
         # Store connection in Redis for tracking
         connection_id = f"{user_id}_{execution_id}"
@@ -24,56 +190,238 @@ class WebSocketManager:
         
         print(f"WebSocket connected: user {user_id}, execution {execution_id}")
     
-    async def disconnect(self, user_id: str, execution_id: str):
-        """Remove WebSocket connection"""
-        if user_id in self.connections and execution_id in self.connections[user_id]:
+    async def disconnect(
+        self,
+        user_id: str,
+        execution_id: str,
+        websocket: Optional[WebSocket] = None,
+        code: int = 1000,
+        reason: str = ""
+    ):
+        """Remove WebSocket connection (only if it is still the given socket, when one is passed)"""
+        connection = self.connections.get(user_id, {}).get(execution_id)
+        if connection is not None and (websocket is None or connection.websocket is websocket):
+            await connection.close(code, reason)
+    
+    async def _connection_closed(self, connection: WebSocketConnection):
+        user_id, execution_id = connection.user_id, connection.execution_id
+        self._closed_dropped += connection.dropped
+        if self.connections.get(user_id, {}).get(execution_id) is connection:
             del self.connections[user_id][execution_id]
             
             if not self.connections[user_id]:
                 del self.connections[user_id]
+                await self._unsubscribe(user_id)
         
         print(f"WebSocket disconnected: user {user_id}, execution {execution_id}")
     
-    async def send_execution_update(self, user_id: str, execution_id: str, data: Dict):
-        """Send execution update to specific user and execution"""
-        if user_id in self.connections and execution_id in self.connections[user_id]:
-            websocket = self.connections[user_id][execution_id]
+    async def _subscribe(self, user_id: str):
+        """Start receiving a user's updates on this worker"""
+        if not settings.websocket_pubsub_enabled:
+            return
+        try:
+            if self._pubsub is None:
+                redis_client = await redis_manager.get_redis()
+                self._pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            await self._pubsub.subscribe(self.channel(user_id))
+            self._subscribed.set()
+            if self._listener is None or self._listener.done():
+                self._listener = asyncio.create_task(self._listen())
+        except Exception as e:
+            print(f"WebSocket subscribe error for user {user_id}: {e}")
+    
+    async def _unsubscribe(self, user_id: str):
+        if self._pubsub is None:
+            return
+        try:
+            await self._pubsub.unsubscribe(self.channel(user_id))
+        except Exception as e:
+            print(f"WebSocket unsubscribe error for user {user_id}: {e}")
+        if not self.connections:
+            self._subscribed.clear()
+    
+    async def _listen(self):
+        """Deliver published updates to this worker's sockets"""
+        while not self._stopping:
+            await self._subscribed.wait()
             try:
-                message = {
-                    "type": "execution_update",
-                    "execution_id": execution_id,
-                    "data": data
-                }
-                await websocket.send(json.dumps(message))
-                print(f"Sent update to user {user_id}, execution {execution_id}")
-            except websockets.exceptions.ConnectionClosed:
-                await self.disconnect(user_id, execution_id)
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                print(f"Error sending WebSocket message: {e}")
-                await self.disconnect(user_id, execution_id)
+                print(f"WebSocket pub/sub listener error: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if not message or message.get("type") != "message":
+                continue
+            
+            user_id = message["channel"][len(self.CHANNEL_PREFIX):]
+            # Payload: "<execution_id or empty for all of the user's sockets>\n<type>\n<message json>"
+            execution_id, message_type, text = message["data"].split("\n", 2)
+            self._deliver_local(user_id, execution_id or None, message_type, text)
+    
+    async def stop(self):
+        """Stop the pub/sub listener and connection writers (app shutdown)"""
+        for task in list(self._flush_tasks):
+            task.cancel()
+        for key in list(self._pending_updates):
+            await self._flush_update(key)
+        for sockets in list(self.connections.values()):
+            for connection in list(sockets.values()):
+                await connection.close()
+        if self._listener is not None:
+            # The flag matters: a cancel landing inside a pub/sub read can be swallowed
+            self._stopping = True
+            self._subscribed.set()
+            self._listener.cancel()
+            await asyncio.wait([self._listener], timeout=5)
+            self._listener = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception as e:
+                print(f"WebSocket pub/sub close error: {e}")
+            self._pubsub = None
+    
+    async def _publish(self, user_id: str, execution_id: Optional[str], message: Dict):
+        """Fan a message out to whichever workers hold the user's sockets"""
+        text = codec.dumps(message)
+        if settings.websocket_pubsub_enabled:
+            try:
+                redis_client = await redis_manager.get_redis()
+                await redis_client.publish(self.channel(user_id), f"{execution_id or ''}\n{message['type']}\n{text}")
+                self._published += 1
+                return
+            except Exception as e:
+                # Without Redis, at least reach the sockets held by this worker
+                print(f"WebSocket publish error for user {user_id}: {e}")
+        self._deliver_local(user_id, execution_id, message["type"], text)
+    
+    def _deliver_local(self, user_id: str, execution_id: Optional[str], message_type: str, text: str):
+        """Queue for this worker's sockets for one execution (or all of the user's sockets)"""
+        connections = self.connections.get(user_id, {})
+        targets = [connections.get(execution_id)] if execution_id else list(connections.values())
+        for connection in targets:
+            if connection is not None:
+                # Coalesced messages stay mutable (one copy per socket) until they are sent
+                connection.enqueue(message_type, codec.loads(text) if message_type in COALESCED_MESSAGE_TYPES else text)
+                self._delivered += 1
+    
+    def send_local(self, user_id: str, execution_id: str, message: Dict):
+        """Queue a message for one socket held by this worker (snapshots, replies)"""
+        self._deliver_local(user_id, execution_id, message["type"], codec.dumps(message))
+    
+    def send_execution_snapshot(self, user_id: str, execution_id: str, data: Dict):
+        """Queue the full record for one socket held by this worker (on connect and resync)"""
+        self.send_local(user_id, execution_id, {
+            "type": "execution_snapshot",
+            "execution_id": execution_id,
+            "version": data.get("version", 0),
+            "data": data
+        })
+    
+    async def send_execution_update(self, user_id: str, execution_id: str, version: int, changes: Dict):
+        """Send the fields changed by the write that produced version"""
+        if not version:
+            return
+        update = {
+            "type": "execution_update",
+            "execution_id": execution_id,
+            "base_version": version - 1,
+            "version": version,
+            "changes": {field: value for field, value in changes.items() if field not in STATIC_FIELDS}
+        }
+        if settings.websocket_coalesce_window <= 0:
+            await self._publish(user_id, execution_id, update)
+            return
+        
+        key = (user_id, execution_id)
+        pending = self._pending_updates.get(key)
+        if pending is not None:
+            if merge_update(pending, update):
+                self._coalesced_updates += 1
+                return
+            await self._flush_update(key)
+        self._pending_updates[key] = update
+        task = asyncio.create_task(self._flush_later(key, update))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+    
+    async def _flush_later(self, key: Tuple[str, str], update: Dict[str, Any]):
+        await asyncio.sleep(settings.websocket_coalesce_window)
+        if self._pending_updates.get(key) is update:
+            await self._flush_update(key)
+    
+    async def _flush_update(self, key: Tuple[str, str]):
+        update = self._pending_updates.pop(key, None)
+        if update is not None:
+            await self._publish(key[0], key[1], update)
+    
+    async def send_batch_case_update(self, user_id: str, batch_id: str, data: Dict):
+        """Send one finished test case to subscribers of a batch"""
+        message = {
+            "type": "batch_case_update",
+            "execution_id": batch_id,
+            "data": data
+        }
+        await self._publish(user_id, batch_id, message)
+    
+    async def send_output_events(self, user_id: str, execution_id: str, events: List[Tuple[str, Dict]]):
+        """Send streamed output events; each id is a resumable offset for replay_output"""
+        message = {
+            "type": "execution_output",
+            "execution_id": execution_id,
+            "events": [{"id": event_id, **fields} for event_id, fields in events]
+        }
+        await self._publish(user_id, execution_id, message)
+    
+    async def replay_output(self, user_id: str, execution_id: str, last_event_id: str = "0-0"):
+        """Re-send output events after last_event_id (e.g. when a client reconnects)"""
+        events = await output_streamer.read(execution_id, last_event_id or "0-0")
+        if events:
+            message = {
+                "type": "execution_output",
+                "execution_id": execution_id,
+                "events": [{"id": event_id, **fields} for event_id, fields in events]
+            }
+            # Only the reconnecting socket needs the replay
+            self.send_local(user_id, execution_id, message)
     
     async def broadcast_to_user(self, user_id: str, data: Dict):
         """Broadcast message to all connections for a user"""
-        if user_id in self.connections:
-            disconnected_executions = []
-            
-            for execution_id, websocket in self.connections[user_id].items():
-                try:
-                    message = {
-                        "type": "broadcast",
-                        "data": data
-                    }
-                    await websocket.send(json.dumps(message))
-                except websockets.exceptions.ConnectionClosed:
-                    disconnected_executions.append(execution_id)
-                except Exception as e:
-                    print(f"Error broadcasting to user {user_id}: {e}")
-                    disconnected_executions.append(execution_id)
-            
-            # Clean up disconnected connections
-            for execution_id in disconnected_executions:
-                await self.disconnect(user_id, execution_id)
+        message = {
+            "type": "broadcast",
+            "data": data
+        }
+        await self._publish(user_id, None, message)
+    
+    def connection_count(self) -> int:
+        """Open connections held by this worker"""
+        return sum(len(sockets) for sockets in self.connections.values())
+    
+    def get_stats(self) -> Dict:
+        """Local connection counts, fan-out counters and per-connection queue stats"""
+        connections = [
+            connection.get_stats()
+            for sockets in self.connections.values()
+            for connection in sockets.values()
+        ]
+        return {
+            "users": len(self.connections),
+            "connections": len(connections),
+            "pubsub_enabled": settings.websocket_pubsub_enabled,
+            "published": self._published,
+            "delivered": self._delivered,
+            "queue_size": settings.websocket_send_queue_size,
+            "slow_consumer_policy": settings.websocket_slow_consumer_policy,
+            "dropped": self._closed_dropped + sum(connection["dropped"] for connection in connections),
+            "coalesced": sum(connection["coalesced"] for connection in connections),
+            "coalesce_window": settings.websocket_coalesce_window,
+            "coalesced_updates": self._coalesced_updates,
+            "per_connection": connections,
+        }
 
 
 # Global WebSocket manager instance
 websocket_manager = WebSocketManager()
+WEBSOCKET_CONNECTIONS.set_function(websocket_manager.connection_count)
@@ -0,0 +1,121 @@
+"""Micro-benchmark of the serialization codecs on realistic execution records.
+
+Run from code-execution-service/:  python -m benchmarks.codec_benchmark [--number N]
+
+Times encode/decode of a full execution record, a summary and a 100-item list
+page for each codec (msgpack too, if installed, for comparison), the
+RedisManager field encoding path, and a list response built through Pydantic
+models versus pre-serialized by the codec.
+"""
+import argparse
+import os
+import random
+import string
+import timeit
+from datetime import datetime
+
+# Settings are required at import time; the benchmark never connects anywhere
+for name, value in {
+    "CODE_EXECUTION_REDIS_URL": "redis://localhost:6379/0",
+    "CODE_EXECUTION_API_URL": "http://localhost/run",
+    "CODE_EXECUTION_API_KEY": "benchmark",
+    "FRONTEND_SERVICE_URL": "http://localhost",
+    "CODE_EXECUTION_HOST": "0.0.0.0",
+    "CODE_EXECUTION_PORT": "8000",
+    "CODE_EXECUTION_DEBUG": "false",
+}.items():
+    os.environ.setdefault(name, value)
+
+from app import database  # noqa: E402
+from app.codec import CODECS, orjson  # noqa: E402
+from app.routes.code_execution import summary_item  # noqa: E402
+from app.schemas import ExecutionListSummaryResponse, ExecutionSummary  # noqa: E402
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def make_record(index: int, output_lines: int = 400) -> dict:
+    rng = random.Random(index)
+    code = "\n".join(
+        f"def f{i}(x):\n    return sum(range(x)) * {rng.randint(1, 99)}" for i in range(60)
+    )
+    output = "\n".join(
+        f"case {i}: " + "".join(rng.choices(string.ascii_lowercase, k=40)) for i in range(output_lines)
+    )
+    now = datetime.utcnow().isoformat()
+    return {
+        "execution_id": f"6f1c2a4e-0000-4000-8000-{index:012d}",
+        "user_id": f"user-{index % 50}",
+        "code": code,
+        "language": "python",
+        "input_data": "5\n1 2 3 4 5\n",
+        "status": "completed",
+        "created_at": now,
+        "updated_at": now,
+        "completed_at": now,
+        "output": output,
+        "error_output": "",
+        "execution_time": "0.042",
+        "memory_usage": "9400",
+        "submission_key": "%064x" % rng.getrandbits(256),
+        "cached": False,
+        "backend": "http",
+        "version": 4,
+    }
+
+
+def bench(label: str, func, number: int):
+    seconds = timeit.timeit(func, number=number)
+    print(f"  {label:<40} {seconds / number * 1e6:10.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    record = make_record(1)
+    summary = database.RedisManager._summary(record)
+    page = [database.RedisManager._summary(make_record(i, output_lines=1)) for i in range(100)]
+    samples = {"full record": record, "summary": summary, "list page (100)": page}
+
+    codecs = {name: codec_class() for name, codec_class in CODECS.items() if name != "orjson" or orjson}
+    for name, codec in codecs.items():
+        print(f"{name}:")
+        for label, value in samples.items():
+            encoded = codec.dumps_bytes(value)
+            bench(f"dumps {label} ({len(encoded)} B)", lambda: codec.dumps(value), args.number)
+            bench(f"loads {label}", lambda: codec.loads(encoded), args.number)
+
+        # The Redis hash path: one value per field, compressed when large
+        database.codec = codec
+        fields = database.RedisManager._encode_fields(record)
+        bench("RedisManager encode record", lambda: database.RedisManager._encode_fields(record), args.number)
+        bench("RedisManager decode record", lambda: database.RedisManager._decode_fields(fields), args.number)
+
+        content = {"executions": [summary_item(item) for item in page], "total_count": 100, "limit": 100}
+        bench("list response pre-serialized", lambda: codec.dumps_bytes(content), args.number)
+
+    if msgpack is not None:
+        print("msgpack (comparison only):")
+        for label, value in samples.items():
+            packed = msgpack.packb(value)
+            bench(f"packb {label} ({len(packed)} B)", lambda: msgpack.packb(value), args.number)
+            bench(f"unpackb {label}", lambda: msgpack.unpackb(packed), args.number)
+    else:
+        print("msgpack: not installed, skipped")
+
+    def pydantic_list():
+        ExecutionListSummaryResponse(
+            executions=[ExecutionSummary(**summary_item(item)) for item in page], total_count=100, limit=100
+        ).model_dump_json()
+
+    print("pydantic:")
+    bench("list response via response models", pydantic_list, args.number)
+
+
+if __name__ == "__main__":
+    main()